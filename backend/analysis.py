@@ -1,30 +1,77 @@
-from database import get_session
-from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance
+from database import get_read_session, get_async_read_session
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance, CustomerStats, DailyRevenueRollup
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from sqlalchemy import func
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
+import analytics_engine
+from analytics_engine import get_analytics_engine
+from cache import cached_analysis
+from customer_stats import new_customer_counts
 
-def analyze_inactive_customers(months=6):
+@contextmanager
+def use_session(session=None):
+    """使用调用方传入的会话；未传入时创建只读会话并在结束后关闭"""
+    if session is not None:
+        yield session
+        return
+    session = get_read_session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def _use_memory_engine(session=None):
+    """未显式传入会话且启用了内存分析引擎时，由引擎计算"""
+    return session is None and analytics_engine.is_enabled()
+
+async def run_async(analysis_func, *args):
+    """在异步会话上运行同步分析函数，数据库IO不阻塞事件循环；命中缓存时直接返回"""
+    async def compute():
+        if analytics_engine.is_enabled():
+            # 内存引擎的计算和偶尔的增量刷新放到线程池执行
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, lambda: analysis_func.func(*args))
+        async with get_async_read_session() as session:
+            return await session.run_sync(lambda sync_session: analysis_func.func(*args, session=sync_session))
+    return await analysis_func.get_or_compute_async(compute, *args)
+
+@cached_analysis('customers', 'consumption_records', 'customer_stats')
+def analyze_inactive_customers(months=6, session=None, snapshot=None):
     """分析指定月数以上不活跃顾客"""
-    session = get_session()
-    cutoff_date = datetime.now() - timedelta(days=months*30)
+    if _use_memory_engine(session):
+        results = get_analytics_engine().inactive_customers(months, snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            cutoff_date = datetime.now() - timedelta(days=months*30)
     
-    inactive_customers = session.query(Customer).filter(
-        Customer.last_visit_date < cutoff_date
-    ).all()
+            # 只查询需要的列，累计消费在同一条SQL中计算
+            inactive_customers = session.query(
+                Customer.customer_id,
+                Customer.name,
+                Customer.phone,
+                Customer.last_visit_date,
+                Customer.membership_level,
+                Customer.total_consumption
+            ).filter(
+                Customer.last_visit_date < cutoff_date
+            ).all()
     
-    results = []
-    for cust in inactive_customers:
-        results.append({
-            'customer_id': cust.customer_id,
-            'name': cust.name,
-            'phone': cust.phone,
-            'last_visit_date': cust.last_visit_date,
-            'membership_level': cust.membership_level,
-            'total_consumption': float(cust.total_consumption) if cust.total_consumption else 0
-        })
+            results = []
+            for cust in inactive_customers:
+                results.append({
+                    'customer_id': cust.customer_id,
+                    'name': cust.name,
+                    'phone': cust.phone,
+                    'last_visit_date': cust.last_visit_date,
+                    'membership_level': cust.membership_level,
+                    'total_consumption': float(cust.total_consumption) if cust.total_consumption else 0
+                })
     
-    session.close()
     return {
         'title': f'{months}个月以上不活跃顾客分析',
         'description': f'找到 {len(results)} 位{months}个月以上不活跃顾客',
@@ -32,27 +79,17 @@ def analyze_inactive_customers(months=6):
         'summary': f'共有{len(results)}位顾客{months}个月以上未到店，建议进行客户回访'
     }
 
-def analyze_new_customer_reopen():
+@cached_analysis('consumption_records', 'customer_stats')
+def analyze_new_customer_reopen(session=None, snapshot=None):
     """分析新客二开率"""
-    session = get_session()
-    
-    # 获取所有新客
-    new_customers = session.query(ConsumptionRecord.customer_id).filter(
-        ConsumptionRecord.is_new_customer == True
-    ).distinct().subquery()
-    
-    # 获取二开顾客
-    reopened_customers = session.query(ConsumptionRecord.customer_id).filter(
-        ConsumptionRecord.customer_id.in_(new_customers),
-        ConsumptionRecord.is_new_customer == False
-    ).distinct().subquery()
-    
-    # 计算二开率
-    total_new = session.query(new_customers).count()
-    total_reopened = session.query(reopened_customers).count()
+    if _use_memory_engine(session):
+        total_new, total_reopened = get_analytics_engine().new_customer_reopen(snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            # 新客与二开顾客数直接从顾客汇总表一次统计
+            total_new, total_reopened = new_customer_counts(session)
     reopen_rate = (total_reopened / total_new) * 100 if total_new > 0 else 0
     
-    session.close()
     return {
         'title': '新客二开率分析',
         'description': f'新客总数: {total_new}, 二次消费顾客数: {total_reopened}',
@@ -64,31 +101,40 @@ def analyze_new_customer_reopen():
         'summary': f'新客二开率为{reopen_rate:.2f}%，建议优化新客转化策略'
     }
 
-def analyze_vip_consumption():
+@cached_analysis('customers', 'consumption_records', 'customer_stats')
+def analyze_vip_consumption(session=None, snapshot=None):
     """分析VIP客群消费情况"""
-    session = get_session()
+    if _use_memory_engine(session):
+        results = get_analytics_engine().vip_consumption(snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            vip_customers = session.query(
+                Customer.customer_id,
+                Customer.name,
+                Customer.phone,
+                Customer.last_visit_date,
+                Customer.membership_level,
+                Customer.total_consumption
+            ).filter(
+                Customer.membership_level.in_(['黄金', '钻石'])
+            )
     
-    vip_customers = session.query(Customer).filter(
-        Customer.membership_level.in_(['黄金', '钻石'])
-    )
-    
-    results = []
-    for cust in vip_customers:
-        total = sum([c.amount for c in cust.consumptions])
-        last_visit_days = (datetime.now().date() - cust.last_visit_date).days if cust.last_visit_date else None
-        results.append({
-            'customer_id': cust.customer_id,
-            'name': cust.name,
-            'membership': cust.membership_level,
-            'total_consumption': float(total),
-            'last_visit_days': last_visit_days,
-            'phone': cust.phone
-        })
+            results = []
+            for cust in vip_customers:
+                total = cust.total_consumption or 0
+                last_visit_days = (datetime.now().date() - cust.last_visit_date).days if cust.last_visit_date else None
+                results.append({
+                    'customer_id': cust.customer_id,
+                    'name': cust.name,
+                    'membership': cust.membership_level,
+                    'total_consumption': float(total),
+                    'last_visit_days': last_visit_days,
+                    'phone': cust.phone
+                })
     
     # 按最近到店时间排序
     results.sort(key=lambda x: x['last_visit_days'] if x['last_visit_days'] else 0, reverse=True)
     
-    session.close()
     return {
         'title': 'VIP顾客消费分析',
         'description': f'共有{len(results)}位VIP顾客',
@@ -96,29 +142,31 @@ def analyze_vip_consumption():
         'summary': f'VIP顾客平均消费{sum(r["total_consumption"] for r in results)/len(results):.2f}元'
     }
 
-def analyze_unspent_balance():
+@cached_analysis('customers', 'medical_products', 'unspent_balances')
+def analyze_unspent_balance(session=None, snapshot=None):
     """分析未划扣余额"""
-    session = get_session()
-    
-    high_balance = session.query(
-        Customer.name,
-        MedicalProduct.product_name,
-        UnspentBalance.remaining_amount
-    ).join(UnspentBalance, UnspentBalance.customer_id == Customer.customer_id
-    ).join(MedicalProduct, MedicalProduct.product_id == UnspentBalance.product_id
-    ).filter(
-        UnspentBalance.remaining_amount > 5000
-    ).order_by(UnspentBalance.remaining_amount.desc()).all()
+    if _use_memory_engine(session):
+        results = get_analytics_engine().unspent_balance(5000, snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            high_balance = session.query(
+                Customer.name,
+                MedicalProduct.product_name,
+                UnspentBalance.remaining_amount
+            ).join(UnspentBalance, UnspentBalance.customer_id == Customer.customer_id
+            ).join(MedicalProduct, MedicalProduct.product_id == UnspentBalance.product_id
+            ).filter(
+                UnspentBalance.remaining_amount > 5000
+            ).order_by(UnspentBalance.remaining_amount.desc()).all()
     
-    results = []
-    for row in high_balance:
-        results.append({
-            'customer_name': row.name,
-            'product_name': row.product_name,
-            'remaining_amount': float(row.remaining_amount)
-        })
+            results = []
+            for row in high_balance:
+                results.append({
+                    'customer_name': row.name,
+                    'product_name': row.product_name,
+                    'remaining_amount': float(row.remaining_amount)
+                })
     
-    session.close()
     return {
         'title': '高未划扣余额分析',
         'description': f'未划扣余额超过5000元的客户共{len(results)}位',
@@ -126,61 +174,175 @@ def analyze_unspent_balance():
         'summary': f'总未划扣余额{sum(r["remaining_amount"] for r in results):.2f}元'
     }
 
-def analyze_department_performance():
-    """分析科室业绩表现"""
-    session = get_session()
-    
-    # 按科室统计消费金额
-    dept_stats = session.query(
-        ConsumptionRecord.department,
-        func.count(ConsumptionRecord.record_id).label('total_records'),
-        func.sum(ConsumptionRecord.amount).label('total_amount')
-    ).group_by(ConsumptionRecord.department).all()
+def _date_range_filter(query, start_date=None, end_date=None):
+    """按日期范围过滤日汇总表"""
+    if start_date is not None:
+        query = query.filter(DailyRevenueRollup.rollup_date >= start_date)
+    if end_date is not None:
+        query = query.filter(DailyRevenueRollup.rollup_date <= end_date)
+    return query
+
+def _date_range_text(start_date=None, end_date=None):
+    """日期范围的描述文字"""
+    if start_date is None and end_date is None:
+        return ''
+    return f"（{start_date or '最早'} 至 {end_date or '最近'}）"
+
+@cached_analysis('consumption_records', 'daily_revenue_rollups')
+def analyze_department_performance(start_date=None, end_date=None, session=None, snapshot=None):
+    """分析科室业绩表现（基于日汇总表，可指定日期范围）"""
+    if _use_memory_engine(session):
+        results = get_analytics_engine().department_performance(start_date, end_date, snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            # 按科室统计消费金额
+            dept_stats = _date_range_filter(session.query(
+                DailyRevenueRollup.department,
+                func.sum(DailyRevenueRollup.record_count).label('total_records'),
+                func.sum(DailyRevenueRollup.total_amount).label('total_amount')
+            ), start_date, end_date).group_by(DailyRevenueRollup.department).all()
     
-    results = []
-    for dept in dept_stats:
-        results.append({
-            'department': dept.department,
-            'total_records': dept.total_records,
-            'total_amount': float(dept.total_amount) if dept.total_amount else 0
-        })
+            results = []
+            for dept in dept_stats:
+                results.append({
+                    'department': dept.department,
+                    'total_records': dept.total_records,
+                    'total_amount': float(dept.total_amount) if dept.total_amount else 0
+                })
     
-    session.close()
     return {
         'title': '科室业绩分析',
-        'description': '各科室消费情况统计',
+        'description': f'各科室消费情况统计{_date_range_text(start_date, end_date)}',
         'data': results,
         'summary': f'总消费金额{sum(r["total_amount"] for r in results):.2f}元'
     }
 
-def analyze_product_performance():
-    """分析产品表现"""
-    session = get_session()
-    
-    # 按产品统计消费情况
-    product_stats = session.query(
-        MedicalProduct.product_name,
-        MedicalProduct.department,
-        MedicalProduct.product_type,
-        func.count(ConsumptionRecord.record_id).label('total_sales'),
-        func.sum(ConsumptionRecord.amount).label('total_revenue')
-    ).join(ConsumptionRecord, MedicalProduct.product_id == ConsumptionRecord.product_id
-    ).group_by(MedicalProduct.product_id).all()
+@cached_analysis('medical_products', 'consumption_records', 'daily_revenue_rollups')
+def analyze_product_performance(start_date=None, end_date=None, session=None, snapshot=None):
+    """分析产品表现（基于日汇总表，可指定日期范围）"""
+    if _use_memory_engine(session):
+        results = get_analytics_engine().product_performance(start_date, end_date, snapshot=snapshot)
+    else:
+        with use_session(session) as session:
+            # 按产品统计消费情况
+            product_stats = _date_range_filter(session.query(
+                MedicalProduct.product_name,
+                MedicalProduct.department,
+                MedicalProduct.product_type,
+                func.sum(DailyRevenueRollup.record_count).label('total_sales'),
+                func.sum(DailyRevenueRollup.total_amount).label('total_revenue')
+            ).join(DailyRevenueRollup, MedicalProduct.product_id == DailyRevenueRollup.product_id
+            ), start_date, end_date).group_by(MedicalProduct.product_id).all()
     
-    results = []
-    for product in product_stats:
-        results.append({
-            'product_name': product.product_name,
-            'department': product.department,
-            'product_type': product.product_type,
-            'total_sales': product.total_sales,
-            'total_revenue': float(product.total_revenue) if product.total_revenue else 0
-        })
+            results = []
+            for product in product_stats:
+                results.append({
+                    'product_name': product.product_name,
+                    'department': product.department,
+                    'product_type': product.product_type,
+                    'total_sales': product.total_sales,
+                    'total_revenue': float(product.total_revenue) if product.total_revenue else 0
+                })
     
-    session.close()
     return {
         'title': '产品表现分析',
-        'description': '各产品销售情况统计',
+        'description': f'各产品销售情况统计{_date_range_text(start_date, end_date)}',
         'data': results,
         'summary': f'总销售额{sum(r["total_revenue"] for r in results):.2f}元'
-    } 
\ No newline at end of file
+    }
+
+# 异步版本：供FastAPI异步接口调用
+async def analyze_inactive_customers_async(months=6):
+    """异步分析指定月数以上不活跃顾客"""
+    return await run_async(analyze_inactive_customers, months)
+
+async def analyze_new_customer_reopen_async():
+    """异步分析新客二开率"""
+    return await run_async(analyze_new_customer_reopen)
+
+async def analyze_vip_consumption_async():
+    """异步分析VIP客群消费情况"""
+    return await run_async(analyze_vip_consumption)
+
+async def analyze_unspent_balance_async():
+    """异步分析未划扣余额"""
+    return await run_async(analyze_unspent_balance)
+
+async def analyze_department_performance_async(start_date=None, end_date=None):
+    """异步分析科室业绩表现"""
+    return await run_async(analyze_department_performance, start_date, end_date)
+
+async def analyze_product_performance_async(start_date=None, end_date=None):
+    """异步分析产品表现"""
+    return await run_async(analyze_product_performance, start_date, end_date)
+
+# 组合分析接口可选的分析项：名称 -> (分析函数, 参数名)
+ANALYSES = {
+    'inactive_customers': (analyze_inactive_customers, ('months',)),
+    'new_customer_reopen': (analyze_new_customer_reopen, ()),
+    'vip_consumption': (analyze_vip_consumption, ()),
+    'unspent_balance': (analyze_unspent_balance, ()),
+    'department_performance': (analyze_department_performance, ('start_date', 'end_date')),
+    'product_performance': (analyze_product_performance, ('start_date', 'end_date')),
+}
+
+# 组合分析的最大并发数
+ANALYSIS_MAX_WORKERS = int(os.getenv('ANALYSIS_MAX_WORKERS', '4'))
+
+_analysis_executor = None
+
+def _get_analysis_executor():
+    """组合分析使用的有界线程池"""
+    global _analysis_executor
+    if _analysis_executor is None:
+        _analysis_executor = ThreadPoolExecutor(max_workers=ANALYSIS_MAX_WORKERS, thread_name_prefix='analysis')
+    return _analysis_executor
+
+async def _gather_timed(calls, run):
+    """并发执行各分析，返回 名称 -> (结果, 耗时毫秒)"""
+    async def timed(func, args):
+        start = time.perf_counter()
+        result = await run(func, args)
+        return result, round((time.perf_counter() - start) * 1000, 2)
+    names = list(calls)
+    outcomes = await asyncio.gather(*(timed(*calls[name]) for name in names))
+    return dict(zip(names, outcomes))
+
+async def run_analyses_async(names=None, months=6, start_date=None, end_date=None):
+    """并发运行多个分析（经过分析缓存），并附带各分析耗时
+    最大并发数为 ANALYSIS_MAX_WORKERS；内存引擎模式下未命中缓存的分析共用同一快照计算
+    """
+    names = list(names or ANALYSES)
+    unknown = [name for name in names if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f"未知的分析项: {', '.join(unknown)}")
+
+    params = {'months': months, 'start_date': start_date, 'end_date': end_date}
+    calls = {}
+    for name in names:
+        analysis_func, arg_names = ANALYSES[name]
+        calls[name] = (analysis_func, tuple(params[arg] for arg in arg_names))
+
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = _get_analysis_executor()
+    snapshot = None
+    if analytics_engine.is_enabled():
+        # 内存引擎：所有分析共用同一个不可变快照
+        snapshot = await loop.run_in_executor(executor, get_analytics_engine().snapshot)
+
+    async def run(analysis_func, args):
+        # 先查缓存；未命中时在有界线程池中计算，SQL模式下每个分析使用各自的只读会话并行查询
+        if snapshot is not None:
+            compute = lambda: analysis_func.func(*args, snapshot=snapshot)
+        else:
+            compute = lambda: analysis_func.func(*args)
+        return await analysis_func.get_or_compute_async(lambda: loop.run_in_executor(executor, compute), *args)
+
+    outcomes = await _gather_timed(calls, run)
+
+    return {
+        'results': {name: result for name, (result, _) in outcomes.items()},
+        'timings': {name: elapsed for name, (_, elapsed) in outcomes.items()},
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,449 @@
+"""
+内存分析引擎：把事实表加载为紧凑的NumPy列数组，用向量化分组/掩码完成 analyze_* 计算
+通过环境变量 ANALYSIS_ENGINE=numpy 启用；消费、划扣记录和未划扣余额按自增ID高水位增量加载，
+行数或最大ID与“只追加”不符（删除、乱序提交）时整表重载，并每隔 ANALYSIS_ENGINE_FULL_RELOAD_SECONDS 整表重载一次（覆盖原地更新）；
+顾客、品项只在本进程写入过该表或其行数/最大ID变化时重载
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+import numpy as np
+from sqlalchemy import select, func
+
+from database import get_read_session
+from models import Customer, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance
+
+# 每批从数据库读取的行数
+FETCH_BATCH_SIZE = 100000
+
+# 引擎加载的数据表；其他表的写入不影响引擎
+ENGINE_TABLES = frozenset({
+    'consumption_records', 'write_off_records', 'unspent_balances', 'customers', 'medical_products',
+})
+
+def is_enabled():
+    """是否启用内存分析引擎"""
+    return os.getenv('ANALYSIS_ENGINE', 'sql').lower() == 'numpy'
+
+class DictionaryEncoder:
+    """字典编码：把科室、会员等级等低基数字符串映射为整数编码（编码在刷新之间保持稳定）"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, values):
+        """按去重后的取值分配编码，再通过逆索引一次映射回整列"""
+        values = np.asarray(values, dtype=object)
+        # None 不能与字符串比较排序，单独编码
+        missing = np.equal(values, None)
+        codes = np.empty(len(values), dtype=np.int16)
+        if missing.any():
+            codes[missing] = self._code_for(None)
+        present = ~missing
+        uniques, inverse = np.unique(values[present], return_inverse=True)
+        codes[present] = np.array([self._code_for(value) for value in uniques], dtype=np.int16)[inverse]
+        return codes
+
+    def _code_for(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code_of(self, value):
+        """返回取值对应的编码，未出现过时返回 -1"""
+        return self._codes.get(value, -1)
+
+    def decode(self, code):
+        return self.values[code]
+
+def _to_dates(values):
+    return np.asarray(values, dtype='datetime64[D]')
+
+def _to_floats(values):
+    # None 转为 NaN
+    return np.asarray(values, dtype=np.float64)
+
+def _load_rows(session, stmt, dtypes):
+    """分批读取查询结果，按列转换为NumPy数组；dtypes 与查询列一一对应，数值列直接从行迭代构造"""
+    rows = []
+    result = session.execute(stmt.execution_options(yield_per=FETCH_BATCH_SIZE))
+    for partition in result.partitions():
+        rows.extend(partition)
+    columns = []
+    for i, dtype in enumerate(dtypes):
+        values = map(itemgetter(i), rows)
+        if dtype in (np.int64, bool):
+            columns.append(np.fromiter(values, dtype=dtype, count=len(rows)))
+        else:
+            columns.append(np.array(list(values), dtype=dtype))
+    return columns
+
+def _table_state(session, id_column):
+    """(行数, 最大ID)"""
+    count, max_id = session.execute(select(func.count(), func.max(id_column))).one()
+    return count, max_id or 0
+
+class Snapshot:
+    """某一时刻的只读列数组集合；刷新时整体替换，计算期间始终看到一致的数据"""
+
+    def __init__(self, **arrays):
+        self.__dict__.update(arrays)
+
+    def replace(self, **arrays):
+        values = dict(self.__dict__)
+        values.update(arrays)
+        return Snapshot(**values)
+
+class AnalyticsEngine:
+    """向量化分析引擎"""
+
+    def __init__(self, refresh_seconds=None, full_reload_seconds=None):
+        if refresh_seconds is None:
+            refresh_seconds = int(os.getenv('ANALYSIS_ENGINE_REFRESH_SECONDS', '30'))
+        if full_reload_seconds is None:
+            full_reload_seconds = int(os.getenv('ANALYSIS_ENGINE_FULL_RELOAD_SECONDS', '600'))
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.departments = DictionaryEncoder()
+        self.memberships = DictionaryEncoder()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshed_at = 0.0
+        self._full_loaded_at = 0.0
+        # 本进程写入过、下次分析前需要刷新的表
+        self._stale_tables = set(ENGINE_TABLES)
+        self._stale_lock = threading.Lock()
+
+    # ---------- 数据加载 ----------
+
+    @staticmethod
+    def _empty_consumptions():
+        return dict(
+            consumption_max_id=0,
+            c_customer_id=np.empty(0, dtype=np.int64),
+            c_date=np.empty(0, dtype='datetime64[D]'),
+            c_amount=np.empty(0, dtype=np.float64),
+            c_department=np.empty(0, dtype=np.int16),
+            c_is_new=np.empty(0, dtype=bool),
+            c_product_id=np.empty(0, dtype=np.int64),
+        )
+
+    @staticmethod
+    def _empty_write_offs():
+        return dict(
+            write_off_max_id=0,
+            w_customer_id=np.empty(0, dtype=np.int64),
+            w_amount=np.empty(0, dtype=np.float64),
+        )
+
+    @staticmethod
+    def _empty_balances():
+        return dict(
+            balance_max_id=0,
+            b_customer_id=np.empty(0, dtype=np.int64),
+            b_product_id=np.empty(0, dtype=np.int64),
+            b_remaining=np.empty(0, dtype=np.float64),
+        )
+
+    def _empty_snapshot(self):
+        return Snapshot(
+            **self._empty_consumptions(), **self._empty_write_offs(), **self._empty_balances(),
+            customer_state=None, product_state=None,
+        )
+
+    def _load_consumptions(self, session, snapshot, full=False):
+        """增量加载新消费记录；表的行数与“已加载 + 新增”不符或最大ID变小时，说明有删除或乱序提交，整表重载"""
+        count, max_id = _table_state(session, ConsumptionRecord.record_id)
+        if full or max_id < snapshot.consumption_max_id:
+            snapshot, full = snapshot.replace(**self._empty_consumptions()), True
+        (record_id, customer_id, consume_date, amount, department, is_new, product_id) = _load_rows(session, select(
+            ConsumptionRecord.record_id,
+            ConsumptionRecord.customer_id,
+            ConsumptionRecord.consume_date,
+            ConsumptionRecord.amount,
+            ConsumptionRecord.department,
+            ConsumptionRecord.is_new_customer,
+            ConsumptionRecord.product_id,
+        ).where(ConsumptionRecord.record_id > snapshot.consumption_max_id).order_by(ConsumptionRecord.record_id),
+            (np.int64, np.int64, 'datetime64[D]', np.float64, object, bool, np.int64))
+        if not full and len(snapshot.c_amount) + len(record_id) != count:
+            return self._load_consumptions(session, snapshot, full=True)
+        if not len(record_id):
+            return snapshot
+        return snapshot.replace(
+            consumption_max_id=int(record_id[-1]),
+            c_customer_id=np.concatenate([snapshot.c_customer_id, customer_id]),
+            c_date=np.concatenate([snapshot.c_date, consume_date]),
+            c_amount=np.concatenate([snapshot.c_amount, amount]),
+            c_department=np.concatenate([snapshot.c_department, self.departments.encode(department)]),
+            c_is_new=np.concatenate([snapshot.c_is_new, is_new]),
+            c_product_id=np.concatenate([snapshot.c_product_id, product_id]),
+        )
+
+    def _load_write_offs(self, session, snapshot, full=False):
+        """增量加载新划扣记录，规则同消费记录"""
+        count, max_id = _table_state(session, WriteOffRecord.write_off_id)
+        if full or max_id < snapshot.write_off_max_id:
+            snapshot, full = snapshot.replace(**self._empty_write_offs()), True
+        (write_off_id, customer_id, amount) = _load_rows(session, select(
+            WriteOffRecord.write_off_id,
+            WriteOffRecord.customer_id,
+            WriteOffRecord.amount,
+        ).where(WriteOffRecord.write_off_id > snapshot.write_off_max_id).order_by(WriteOffRecord.write_off_id),
+            (np.int64, np.int64, np.float64))
+        if not full and len(snapshot.w_amount) + len(write_off_id) != count:
+            return self._load_write_offs(session, snapshot, full=True)
+        if not len(write_off_id):
+            return snapshot
+        return snapshot.replace(
+            write_off_max_id=int(write_off_id[-1]),
+            w_customer_id=np.concatenate([snapshot.w_customer_id, customer_id]),
+            w_amount=np.concatenate([snapshot.w_amount, amount]),
+        )
+
+    def _load_balances(self, session, snapshot, full=False):
+        """增量加载新的未划扣余额（接口只新增余额），规则同消费记录；原地更新由定期整表重载覆盖"""
+        count, max_id = _table_state(session, UnspentBalance.balance_id)
+        if full or max_id < snapshot.balance_max_id:
+            snapshot, full = snapshot.replace(**self._empty_balances()), True
+        (balance_id, customer_id, product_id, total, spent) = _load_rows(session, select(
+            UnspentBalance.balance_id,
+            UnspentBalance.customer_id,
+            UnspentBalance.product_id,
+            UnspentBalance.total_amount,
+            UnspentBalance.spent_amount,
+        ).where(UnspentBalance.balance_id > snapshot.balance_max_id).order_by(UnspentBalance.balance_id),
+            (np.int64, np.int64, np.int64, np.float64, np.float64))
+        if not full and len(snapshot.b_remaining) + len(balance_id) != count:
+            return self._load_balances(session, snapshot, full=True)
+        if not len(balance_id):
+            return snapshot
+        return snapshot.replace(
+            balance_max_id=int(balance_id[-1]),
+            b_customer_id=np.concatenate([snapshot.b_customer_id, customer_id]),
+            b_product_id=np.concatenate([snapshot.b_product_id, product_id]),
+            b_remaining=np.concatenate([snapshot.b_remaining, total - spent]),
+        )
+
+    def _load_customers(self, session, snapshot, stale=False):
+        """重载顾客（会被原地更新，无法按高水位增量加载）；未写入过且行数/最大ID未变时沿用上次的数组"""
+        state = _table_state(session, Customer.customer_id)
+        if not stale and state == snapshot.customer_state:
+            return snapshot
+        (customer_id, name, phone, last_visit_date, membership_level) = _load_rows(session, select(
+            Customer.customer_id,
+            Customer.name,
+            Customer.phone,
+            Customer.last_visit_date,
+            Customer.membership_level,
+        ).order_by(Customer.customer_id), (np.int64, object, object, 'datetime64[D]', object))
+        return snapshot.replace(
+            customer_state=state,
+            cust_id=customer_id,
+            cust_name=name,
+            cust_phone=phone,
+            cust_last_visit=last_visit_date,
+            cust_membership=self.memberships.encode(membership_level),
+        )
+
+    def _load_products(self, session, snapshot, stale=False):
+        """重载品项，规则同顾客"""
+        state = _table_state(session, MedicalProduct.product_id)
+        if not stale and state == snapshot.product_state:
+            return snapshot
+        (product_id, product_name, product_department, product_type) = _load_rows(session, select(
+            MedicalProduct.product_id,
+            MedicalProduct.product_name,
+            MedicalProduct.department,
+            MedicalProduct.product_type,
+        ).order_by(MedicalProduct.product_id), (np.int64, object, object, object))
+        return snapshot.replace(
+            product_state=state,
+            prod_id=product_id,
+            prod_name=product_name,
+            prod_department=product_department,
+            prod_type=product_type,
+        )
+
+    def refresh(self, full=False):
+        """增量刷新：新的消费/划扣/余额记录追加到数组末尾，顾客和品项按需重载；full=True 或超过整表重载间隔时全部重载"""
+        with self._lock:
+            with self._stale_lock:
+                stale, self._stale_tables = self._stale_tables, set()
+            now = time.monotonic()
+            full = full or self._snapshot is None or now - self._full_loaded_at > self.full_reload_seconds
+            snapshot = self._empty_snapshot() if full else self._snapshot
+            session = get_read_session()
+            try:
+                snapshot = self._load_consumptions(session, snapshot, full)
+                snapshot = self._load_write_offs(session, snapshot, full)
+                snapshot = self._load_balances(session, snapshot, full)
+                snapshot = self._load_customers(session, snapshot, full or 'customers' in stale)
+                snapshot = self._load_products(session, snapshot, full or 'medical_products' in stale)
+            except Exception:
+                with self._stale_lock:
+                    self._stale_tables |= stale
+                raise
+            finally:
+                session.close()
+            self._snapshot = snapshot
+            self._refreshed_at = now
+            if full:
+                self._full_loaded_at = now
+        return snapshot
+
+    def mark_stale(self, *tables):
+        """数据写入后标记相应的表（未指定时为全部表）已过期，下次分析前刷新"""
+        tables = ENGINE_TABLES.intersection(tables) if tables else ENGINE_TABLES
+        if tables:
+            with self._stale_lock:
+                self._stale_tables |= tables
+
+    def snapshot(self):
+        """获取当前快照，有表过期或超过刷新间隔时先刷新"""
+        snapshot = self._snapshot
+        if snapshot is None or self._stale_tables or time.monotonic() - self._refreshed_at > self.refresh_seconds:
+            snapshot = self.refresh()
+        return snapshot
+
+    # ---------- 向量化计算 ----------
+
+    @staticmethod
+    def _index_of(sorted_ids, ids):
+        """把ID映射为有序ID数组中的位置，不存在的返回 -1"""
+        positions = np.searchsorted(sorted_ids, ids)
+        positions = np.minimum(positions, max(len(sorted_ids) - 1, 0))
+        found = (sorted_ids[positions] == ids) if len(sorted_ids) else np.zeros(len(ids), dtype=bool)
+        return np.where(found, positions, -1)
+
+    def _customer_totals(self, snapshot):
+        """每位顾客的累计消费（与顾客数组对齐）"""
+        idx = self._index_of(snapshot.cust_id, snapshot.c_customer_id)
+        valid = idx >= 0
+        return np.bincount(idx[valid], weights=snapshot.c_amount[valid], minlength=len(snapshot.cust_id))
+
+    def inactive_customers(self, months=6, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        cutoff = np.datetime64((datetime.now() - timedelta(days=months * 30)).date(), 'D')
+        mask = ~np.isnat(snapshot.cust_last_visit) & (snapshot.cust_last_visit <= cutoff)
+        totals = self._customer_totals(snapshot)
+        results = []
+        for i in np.flatnonzero(mask):
+            results.append({
+                'customer_id': int(snapshot.cust_id[i]),
+                'name': snapshot.cust_name[i],
+                'phone': snapshot.cust_phone[i],
+                'last_visit_date': snapshot.cust_last_visit[i].item(),
+                'membership_level': self.memberships.decode(snapshot.cust_membership[i]),
+                'total_consumption': float(totals[i]),
+            })
+        return results
+
+    def new_customer_reopen(self, snapshot=None):
+        """返回 (新客数, 二开顾客数)"""
+        snapshot = snapshot or self.snapshot()
+        idx = self._index_of(snapshot.cust_id, snapshot.c_customer_id)
+        valid = idx >= 0
+        n = len(snapshot.cust_id)
+        new_counts = np.bincount(idx[valid & snapshot.c_is_new], minlength=n)
+        returning_counts = np.bincount(idx[valid & ~snapshot.c_is_new], minlength=n)
+        has_new = new_counts > 0
+        return int(has_new.sum()), int((has_new & (returning_counts > 0)).sum())
+
+    def vip_consumption(self, levels=('黄金', '钻石'), snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        codes = [self.memberships.code_of(level) for level in levels]
+        mask = np.isin(snapshot.cust_membership, codes)
+        totals = self._customer_totals(snapshot)
+        today = np.datetime64(datetime.now().date(), 'D')
+        days = (today - snapshot.cust_last_visit).astype('timedelta64[D]').astype(np.int64)
+        results = []
+        for i in np.flatnonzero(mask):
+            has_visit = not np.isnat(snapshot.cust_last_visit[i])
+            results.append({
+                'customer_id': int(snapshot.cust_id[i]),
+                'name': snapshot.cust_name[i],
+                'membership': self.memberships.decode(snapshot.cust_membership[i]),
+                'total_consumption': float(totals[i]),
+                'last_visit_days': int(days[i]) if has_visit else None,
+                'phone': snapshot.cust_phone[i],
+            })
+        return results
+
+    def unspent_balance(self, threshold=5000, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        cust_idx = self._index_of(snapshot.cust_id, snapshot.b_customer_id)
+        prod_idx = self._index_of(snapshot.prod_id, snapshot.b_product_id)
+        # NaN（已划扣金额为空）与阈值比较为False，与SQL中NULL的语义一致
+        with np.errstate(invalid='ignore'):
+            mask = (snapshot.b_remaining > threshold) & (cust_idx >= 0) & (prod_idx >= 0)
+        selected = np.flatnonzero(mask)
+        selected = selected[np.argsort(-snapshot.b_remaining[selected], kind='stable')]
+        return [{
+            'customer_name': snapshot.cust_name[cust_idx[i]],
+            'product_name': snapshot.prod_name[prod_idx[i]],
+            'remaining_amount': float(snapshot.b_remaining[i]),
+        } for i in selected]
+
+    def _date_mask(self, snapshot, start_date=None, end_date=None):
+        mask = np.ones(len(snapshot.c_date), dtype=bool)
+        if start_date is not None:
+            mask &= snapshot.c_date >= np.datetime64(start_date, 'D')
+        if end_date is not None:
+            mask &= snapshot.c_date <= np.datetime64(end_date, 'D')
+        return mask
+
+    def department_performance(self, start_date=None, end_date=None, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        mask = self._date_mask(snapshot, start_date, end_date)
+        n = len(self.departments.values)
+        counts = np.bincount(snapshot.c_department[mask], minlength=n)
+        amounts = np.bincount(snapshot.c_department[mask], weights=snapshot.c_amount[mask], minlength=n)
+        results = [{
+            'department': self.departments.decode(code),
+            'total_records': int(counts[code]),
+            'total_amount': float(amounts[code]),
+        } for code in range(n) if counts[code] > 0]
+        results.sort(key=lambda r: r['department'])
+        return results
+
+    def product_performance(self, start_date=None, end_date=None, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        mask = self._date_mask(snapshot, start_date, end_date)
+        idx = self._index_of(snapshot.prod_id, snapshot.c_product_id)
+        mask &= idx >= 0
+        n = len(snapshot.prod_id)
+        counts = np.bincount(idx[mask], minlength=n)
+        revenue = np.bincount(idx[mask], weights=snapshot.c_amount[mask], minlength=n)
+        return [{
+            'product_name': snapshot.prod_name[i],
+            'department': snapshot.prod_department[i],
+            'product_type': snapshot.prod_type[i],
+            'total_sales': int(counts[i]),
+            'total_revenue': float(revenue[i]),
+        } for i in np.flatnonzero(counts)]
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_analytics_engine():
+    """获取进程内共享的分析引擎"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = AnalyticsEngine()
+    return _engine
+
+def mark_stale(*tables):
+    """通知引擎这些表的数据已变更（未创建引擎时无操作）"""
+    if _engine is not None:
+        _engine.mark_stale(*tables)
@@ -0,0 +1,175 @@
+"""
+批量写入：消费/划扣记录按批校验（字段、枚举取值、外键存在性），分块 executemany 写入
+某一块写入失败时逐行重试以定位错误行，其余行照常写入
+"""
+
+import json
+import os
+from decimal import Decimal
+from pydantic import ValidationError
+from sqlalchemy import select, insert, Enum
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord
+from customer_stats import rebuild_customer_stats
+from rollups import refresh_daily_rollups
+
+# 每个事务写入的行数
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '500'))
+# 外键检查时单条 IN 查询的最大ID数
+IN_CLAUSE_SIZE = 500
+# 写入时可能出现的数据库错误（超出整数范围等驱动错误不会被SQLAlchemy包装）
+WRITE_ERRORS = (SQLAlchemyError, OverflowError)
+
+CONSUMPTION_FOREIGN_KEYS = {
+    'customer_id': Customer.customer_id,
+    'product_id': MedicalProduct.product_id,
+    'consultant_id': Consultant.consultant_id,
+}
+
+WRITE_OFF_FOREIGN_KEYS = {
+    'customer_id': Customer.customer_id,
+    'product_id': MedicalProduct.product_id,
+    'consultant_id': Consultant.consultant_id,
+    'consume_record_id': ConsumptionRecord.record_id,
+}
+
+class BulkPayloadError(ValueError):
+    """请求体既不是JSON数组也不是NDJSON"""
+
+def _error(index, message):
+    return {'index': index, 'error': message}
+
+def _is_ndjson(request):
+    content_type = request.headers.get('content-type', '')
+    return 'ndjson' in content_type or 'jsonl' in content_type
+
+async def read_bulk_payload(request):
+    """读取JSON数组或NDJSON请求体，返回 ([(序号, 对象)], 解析错误)"""
+    items, errors = [], []
+    if not _is_ndjson(request):
+        try:
+            payload = json.loads(await request.body())
+        except ValueError as e:
+            raise BulkPayloadError(f"请求体不是有效的JSON: {e}")
+        if not isinstance(payload, list):
+            raise BulkPayloadError("请求体应为JSON数组或NDJSON")
+        return list(enumerate(payload)), errors
+
+    # NDJSON 按行流式解析，空行忽略
+    index = 0
+    buffer = b''
+
+    def parse(line):
+        nonlocal index
+        if not line.strip():
+            return
+        try:
+            items.append((index, json.loads(line)))
+        except ValueError as e:
+            errors.append(_error(index, f"JSON解析失败: {e}"))
+        index += 1
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            parse(line)
+    parse(buffer)
+    return items, errors
+
+def validate_rows(items, schema, model):
+    """用Pydantic模型逐行校验并检查枚举取值，返回 (有效行, 错误)"""
+    enums = {column.key: column.type.enums for column in model.__table__.columns if isinstance(column.type, Enum)}
+    valid, errors = [], []
+    for index, item in items:
+        if not isinstance(item, dict):
+            errors.append(_error(index, "每行必须是JSON对象"))
+            continue
+        try:
+            row = schema(**item).dict()
+        except ValidationError as e:
+            messages = [f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()]
+            errors.append(_error(index, '; '.join(messages)))
+            continue
+        invalid = [
+            f"{field}: 无效取值 {row[field]}，可选: {'/'.join(allowed)}"
+            for field, allowed in enums.items()
+            if row.get(field) is not None and row[field] not in allowed
+        ]
+        if invalid:
+            errors.append(_error(index, '; '.join(invalid)))
+            continue
+        valid.append((index, {k: float(v) if isinstance(v, Decimal) else v for k, v in row.items()}))
+    return valid, errors
+
+def check_foreign_keys(session, rows, foreign_keys):
+    """按列批量查询外键是否存在，返回 (有效行, 错误)"""
+    missing = {}
+    for field, column in foreign_keys.items():
+        ids = sorted({row[field] for _, row in rows})
+        existing = set()
+        for start in range(0, len(ids), IN_CLAUSE_SIZE):
+            existing.update(session.scalars(select(column).where(column.in_(ids[start:start + IN_CLAUSE_SIZE]))))
+        missing[field] = set(ids) - existing
+
+    valid, errors = [], []
+    for index, row in rows:
+        invalid = [f"{field}={row[field]} 不存在" for field in foreign_keys if row[field] in missing[field]]
+        if invalid:
+            errors.append(_error(index, '; '.join(invalid)))
+        else:
+            valid.append((index, row))
+    return valid, errors
+
+def refresh_after_consumption(session, rows):
+    """消费记录写入后重算涉及顾客的汇总和涉及日期的日汇总"""
+    rebuild_customer_stats(session, sorted({row['customer_id'] for row in rows}))
+    refresh_daily_rollups(session, days=sorted({row['consume_date'] for row in rows}))
+
+def refresh_after_write_off(session, rows):
+    """划扣记录写入后重算涉及顾客的汇总"""
+    rebuild_customer_stats(session, sorted({row['customer_id'] for row in rows}))
+
+def insert_rows(session, model, rows, after_insert):
+    """executemany 写入一块数据并更新汇总（不提交事务）"""
+    values = [row for _, row in rows]
+    session.execute(insert(model), values)
+    after_insert(session, values)
+
+async def bulk_insert(db, items, errors, schema, model, foreign_keys, after_insert):
+    """校验并分块写入，返回写入统计和逐行错误"""
+    received = len(items) + len(errors)
+    valid, invalid = validate_rows(items, schema, model)
+    errors = errors + invalid
+    if valid:
+        valid, invalid = await db.run_sync(check_foreign_keys, valid, foreign_keys)
+        errors += invalid
+
+    inserted = 0
+    for start in range(0, len(valid), BULK_CHUNK_SIZE):
+        chunk = valid[start:start + BULK_CHUNK_SIZE]
+        try:
+            await db.run_sync(insert_rows, model, chunk, after_insert)
+            await db.commit()
+            inserted += len(chunk)
+            continue
+        except WRITE_ERRORS:
+            await db.rollback()
+        # 整块失败时逐行写入，定位出错的行
+        for index, row in chunk:
+            try:
+                await db.run_sync(insert_rows, model, [(index, row)], after_insert)
+                await db.commit()
+                inserted += 1
+            except WRITE_ERRORS as e:
+                await db.rollback()
+                errors.append(_error(index, str(getattr(e, 'orig', None) or e)))
+
+    errors.sort(key=lambda err: err['index'])
+    return {
+        'received': received,
+        'inserted': inserted,
+        'failed': len(errors),
+        'errors': errors,
+    }
@@ -0,0 +1,152 @@
+"""
+进程内结果缓存：TTL过期 + LRU淘汰，按数据表打标签，写入时按表失效
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """线程安全的 TTL + LRU 缓存，带命中统计"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 每次失效递增；计算期间发生写入的结果不写回缓存
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, tags=(), generation=None):
+        """写入缓存；generation 与当前不一致（计算期间数据已变更）时丢弃"""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate_tags(self, *tags):
+        """删除带有任一标签的缓存项，返回删除数量"""
+        tags = set(tags)
+        with self._lock:
+            self.generation += 1
+            keys = [key for key, (_, _, entry_tags) in self._entries.items() if entry_tags & tags]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+# 按数据表失效的缓存，写入时逐个失效
+_table_caches = []
+
+def table_cache(maxsize=256, ttl=300):
+    """创建按数据表失效的缓存"""
+    cache = TTLCache(maxsize=maxsize, ttl=ttl)
+    _table_caches.append(cache)
+    return cache
+
+# 分析结果缓存
+analysis_cache = table_cache(
+    maxsize=int(os.getenv('ANALYSIS_CACHE_SIZE', '256')),
+    ttl=int(os.getenv('ANALYSIS_CACHE_TTL', '300')),
+)
+
+class CachedFunction:
+    """按函数名和参数缓存返回值；session/snapshot 参数不参与缓存键"""
+
+    UNCACHED_PARAMS = ('session', 'snapshot')
+
+    def __init__(self, func, cache, tables):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.cache = cache
+        self.tables = tuple(tables)
+        self._signature = inspect.signature(func)
+
+    def cache_key(self, *args, **kwargs):
+        bound = self._signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = tuple((name, value) for name, value in bound.arguments.items() if name not in self.UNCACHED_PARAMS)
+        return (self.func.__name__,) + params
+
+    def __call__(self, *args, **kwargs):
+        return self.get_or_compute(lambda: self.func(*args, **kwargs), *args, **kwargs)
+
+    def get_or_compute(self, compute, *args, **kwargs):
+        key = self.cache_key(*args, **kwargs)
+        found, value = self.cache.get(key)
+        if found:
+            return value
+        generation = self.cache.generation
+        value = compute()
+        self.cache.set(key, value, self.tables, generation)
+        return value
+
+    async def get_or_compute_async(self, compute, *args, **kwargs):
+        key = self.cache_key(*args, **kwargs)
+        found, value = self.cache.get(key)
+        if found:
+            return value
+        generation = self.cache.generation
+        value = await compute()
+        self.cache.set(key, value, self.tables, generation)
+        return value
+
+def cached(cache, *tables):
+    """函数缓存装饰器，结果存入 cache，tables 为结果依赖的数据表"""
+    def decorator(func):
+        return CachedFunction(func, cache, tables)
+    return decorator
+
+def cached_analysis(*tables):
+    """分析函数缓存装饰器，tables 为结果依赖的数据表"""
+    return cached(analysis_cache, *tables)
+
+def invalidate_tables(*tables):
+    """数据表发生写入后使所有缓存中依赖这些表的结果失效"""
+    return sum(cache.invalidate_tags(*tables) for cache in _table_caches)
@@ -0,0 +1,171 @@
+"""
+顾客检索：姓名子串与健康标签走 SQLite FTS5 全文索引，其余条件走普通索引
+FTS5 默认分词器把连续汉字视为一个词，因此姓名和健康标签按单字切分后写入索引，子串查询即为相邻单字的短语查询
+索引内容在写入顾客时由 Python 维护；MySQL 或不支持 FTS5 时退化为 LIKE / JSON 函数
+用法: python customer_search.py   # 全量重建检索索引
+"""
+
+from sqlalchemy import select, delete, insert, func, text, table, column, literal_column
+
+from database import get_engine, get_session
+from models import Customer
+
+SEARCH_TABLE = 'customer_search'
+
+# rowid 即 customer_id
+customer_search = table(SEARCH_TABLE, column('rowid'), column('name'), column('tags'))
+
+# 健康标签各取值之前的分隔词：不会与按单字切分的查询匹配，短语查询不会跨越两个取值
+TAG_SEPARATOR = 'tagsep'
+
+_search_enabled = None
+
+def search_enabled():
+    """是否可用FTS5检索索引（仅SQLite，且索引表已创建）"""
+    global _search_enabled
+    if _search_enabled is None:
+        engine = get_engine()
+        _search_enabled = False
+        if engine.url.get_backend_name() == 'sqlite':
+            with engine.connect() as conn:
+                _search_enabled = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': SEARCH_TABLE}
+                ).first() is not None
+    return _search_enabled
+
+def _name_tokens(name):
+    """姓名按单字切分（空白忽略）"""
+    return ' '.join(ch for ch in (name or '') if not ch.isspace())
+
+def _tag_tokens(health_tags):
+    """健康标签的每个取值按单字切分，取值之前加分隔词"""
+    if isinstance(health_tags, dict):
+        values = health_tags.values()
+    elif isinstance(health_tags, list):
+        values = health_tags
+    else:
+        values = [health_tags] if health_tags else []
+    return ' '.join(f"{TAG_SEPARATOR} {_name_tokens(str(value))}" for value in values if value not in (None, ''))
+
+def _phrase(value):
+    """FTS5 短语（双引号内的双引号需转义）"""
+    return '"' + value.replace('"', '""') + '"'
+
+def index_customers(session, customer_ids):
+    """重建指定顾客的检索索引行（需在同一事务中、顾客写入flush之后调用）"""
+    if not customer_ids or not search_enabled():
+        return
+    customer_ids = list(customer_ids)
+    session.execute(delete(customer_search).where(customer_search.c.rowid.in_(customer_ids)))
+    rows = session.execute(
+        select(Customer.customer_id, Customer.name, Customer.health_tags)
+        .where(Customer.customer_id.in_(customer_ids))
+    ).all()
+    if rows:
+        session.execute(insert(customer_search), [
+            {'rowid': customer_id, 'name': _name_tokens(name), 'tags': _tag_tokens(tags)}
+            for customer_id, name, tags in rows
+        ])
+
+def rebuild_customer_search(session):
+    """全量重建检索索引（不提交事务）"""
+    session.execute(delete(customer_search))
+    ids = session.scalars(select(Customer.customer_id).order_by(Customer.customer_id)).all()
+    for start in range(0, len(ids), 500):
+        index_customers(session, ids[start:start + 500])
+
+def ensure_customer_search():
+    """SQLite 下创建FTS5索引表；索引行数与顾客数不一致时（如首次升级或脚本直接写库后）全量重建"""
+    global _search_enabled
+    engine = get_engine()
+    if engine.url.get_backend_name() != 'sqlite':
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                "USING fts5(name, tags, tokenize='unicode61')"
+            ))
+    except Exception as e:
+        print(f"⚠️  SQLite 不支持FTS5，顾客检索使用LIKE: {e}")
+        _search_enabled = False
+        return
+    _search_enabled = True
+
+    session = get_session()
+    try:
+        indexed = session.scalar(select(func.count()).select_from(customer_search))
+        customers = session.scalar(select(func.count()).select_from(Customer))
+        # 旧版索引的健康标签整值写入，不以分隔词开头
+        legacy = session.scalar(
+            select(literal_column('1')).select_from(customer_search)
+            .where(customer_search.c.tags != '', customer_search.c.tags.not_like(f'{TAG_SEPARATOR} %')).limit(1)
+        )
+        if indexed != customers or legacy:
+            rebuild_customer_search(session)
+            session.commit()
+            print("✅ 顾客检索索引已重建")
+    finally:
+        session.close()
+
+def _phone_upper_bound(prefix):
+    """前缀区间的上界：末位字符加一"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _tag_condition(dialect, tag):
+    """任一健康标签取值包含 tag"""
+    if dialect == 'mysql':
+        pattern = '%' + tag.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return func.json_search(Customer.health_tags, 'one', pattern).is_not(None)
+    values = func.json_each(Customer.health_tags).table_valued('value')
+    return select(literal_column('1')).select_from(values).where(values.c.value.contains(tag, autoescape=True)).exists()
+
+def filter_customers(stmt, name=None, phone=None, membership_level=None, consultant_id=None,
+                     last_visit_from=None, last_visit_to=None, health_tag=None):
+    """为顾客查询追加筛选条件：姓名子串、手机号前缀、会员等级、咨询师、最近到店日期区间、健康标签子串"""
+    name = _name_tokens(name)
+    tag = _name_tokens(health_tag)
+    match = []
+    if name:
+        match.append(f"name : {_phrase(name)}")
+    if tag:
+        match.append(f"tags : {_phrase(tag)}")
+
+    if match and search_enabled():
+        stmt = stmt.where(Customer.customer_id.in_(
+            select(customer_search.c.rowid)
+            .where(literal_column(SEARCH_TABLE).op('MATCH')(' AND '.join(match)))
+        ))
+    else:
+        dialect = get_engine().dialect.name
+        if name:
+            stmt = stmt.where(Customer.name.contains(name.replace(' ', ''), autoescape=True))
+        if tag:
+            stmt = stmt.where(_tag_condition(dialect, tag.replace(' ', '')))
+
+    if phone:
+        # 前缀用区间条件，可走手机号唯一索引
+        stmt = stmt.where(Customer.phone >= phone, Customer.phone < _phone_upper_bound(phone))
+    if membership_level:
+        stmt = stmt.where(Customer.membership_level == membership_level)
+    if consultant_id is not None:
+        stmt = stmt.where(Customer.consultant_id == consultant_id)
+    if last_visit_from:
+        stmt = stmt.where(Customer.last_visit_date >= last_visit_from)
+    if last_visit_to:
+        stmt = stmt.where(Customer.last_visit_date <= last_visit_to)
+    return stmt
+
+if __name__ == "__main__":
+    ensure_customer_search()
+    session = get_session()
+    try:
+        if search_enabled():
+            rebuild_customer_search(session)
+            session.commit()
+            print("✅ 顾客检索索引已重建")
+        else:
+            print("⚠️  当前数据库不使用FTS5检索索引")
+    finally:
+        session.close()
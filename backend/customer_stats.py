@@ -0,0 +1,172 @@
+"""
+顾客汇总表维护：写入消费/划扣记录时增量更新，写入未划扣余额时重算该顾客的余额合计，支持按顾客或全量重建
+用法: python customer_stats.py   # 全量重建
+"""
+
+from sqlalchemy import select, insert, update, delete, func, case
+
+from database import get_session
+from models import Customer, ConsumptionRecord, WriteOffRecord, UnspentBalance, CustomerStats
+
+def _earlier(column, value):
+    """取列值与给定日期中较早的一个"""
+    return case((column.is_(None) | (column > value), value), else_=column)
+
+def _later(column, value):
+    """取列值与给定日期中较晚的一个"""
+    return case((column.is_(None) | (column < value), value), else_=column)
+
+def apply_consumption(session, record):
+    """消费记录写入后增量更新汇总（需在同一事务中、记录flush之后调用）"""
+    amount = float(record.amount)
+    is_new = 1 if record.is_new_customer else 0
+    result = session.execute(
+        update(CustomerStats)
+        .where(CustomerStats.customer_id == record.customer_id)
+        .values(
+            total_consumption=CustomerStats.total_consumption + amount,
+            visit_count=CustomerStats.visit_count + 1,
+            new_visit_count=CustomerStats.new_visit_count + is_new,
+            returning_visit_count=CustomerStats.returning_visit_count + (1 - is_new),
+            first_consume_date=_earlier(CustomerStats.first_consume_date, record.consume_date),
+            last_consume_date=_later(CustomerStats.last_consume_date, record.consume_date),
+        )
+    )
+    # 汇总行不存在时从明细重算该顾客（已包含本条记录）
+    if result.rowcount == 0:
+        rebuild_customer_stats(session, [record.customer_id])
+
+def apply_write_off(session, record):
+    """划扣记录写入后增量更新汇总（需在同一事务中、记录flush之后调用）"""
+    amount = float(record.amount)
+    result = session.execute(
+        update(CustomerStats)
+        .where(CustomerStats.customer_id == record.customer_id)
+        .values(
+            total_write_off=CustomerStats.total_write_off + amount,
+        )
+    )
+    if result.rowcount == 0:
+        rebuild_customer_stats(session, [record.customer_id])
+
+def apply_balance(session, record):
+    """未划扣余额写入后重算该顾客的余额合计（需在同一事务中、记录flush之后调用）"""
+    result = session.execute(
+        update(CustomerStats)
+        .where(CustomerStats.customer_id == record.customer_id)
+        .values(outstanding_balance=(
+            select(func.coalesce(func.sum(UnspentBalance.total_amount - UnspentBalance.spent_amount), 0))
+            .where(UnspentBalance.customer_id == record.customer_id)
+            .scalar_subquery()
+        ))
+    )
+    if result.rowcount == 0:
+        rebuild_customer_stats(session, [record.customer_id])
+
+def new_customer_counts(session):
+    """新客数与其中已二开的顾客数，在新客索引范围内一次统计"""
+    total_new, total_reopened = session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(case((CustomerStats.returning_visit_count > 0, 1), else_=0)), 0),
+        ).where(CustomerStats.new_visit_count > 0)
+    ).one()
+    return total_new, total_reopened
+
+def rebuild_customer_stats(session, customer_ids=None):
+    """从消费/划扣明细和未划扣余额重建汇总表；customer_ids 为空时全量重建（不提交事务）"""
+    consumption = select(
+        ConsumptionRecord.customer_id,
+        func.sum(ConsumptionRecord.amount).label('total_consumption'),
+        func.count(ConsumptionRecord.record_id).label('visit_count'),
+        func.sum(case((ConsumptionRecord.is_new_customer == True, 1), else_=0)).label('new_visit_count'),
+        func.min(ConsumptionRecord.consume_date).label('first_consume_date'),
+        func.max(ConsumptionRecord.consume_date).label('last_consume_date'),
+    ).group_by(ConsumptionRecord.customer_id)
+    write_off = select(
+        WriteOffRecord.customer_id,
+        func.sum(WriteOffRecord.amount).label('total_write_off'),
+    ).group_by(WriteOffRecord.customer_id)
+    # 未划扣余额取自余额表（总购买金额 - 已划扣金额），与消费/划扣明细无关
+    balance = select(
+        UnspentBalance.customer_id,
+        func.sum(UnspentBalance.total_amount - UnspentBalance.spent_amount).label('outstanding_balance'),
+    ).group_by(UnspentBalance.customer_id)
+
+    customers = select(Customer.customer_id)
+    if customer_ids is not None:
+        consumption = consumption.where(ConsumptionRecord.customer_id.in_(customer_ids))
+        write_off = write_off.where(WriteOffRecord.customer_id.in_(customer_ids))
+        balance = balance.where(UnspentBalance.customer_id.in_(customer_ids))
+        customers = customers.where(Customer.customer_id.in_(customer_ids))
+    consumption = consumption.subquery()
+    write_off = write_off.subquery()
+    balance = balance.subquery()
+
+    total_consumption = func.coalesce(consumption.c.total_consumption, 0)
+    visit_count = func.coalesce(consumption.c.visit_count, 0)
+    new_visit_count = func.coalesce(consumption.c.new_visit_count, 0)
+    total_write_off = func.coalesce(write_off.c.total_write_off, 0)
+    rows = select(
+        Customer.customer_id,
+        total_consumption,
+        visit_count,
+        new_visit_count,
+        visit_count - new_visit_count,
+        consumption.c.first_consume_date,
+        consumption.c.last_consume_date,
+        total_write_off,
+        func.coalesce(balance.c.outstanding_balance, 0),
+    ).select_from(Customer).outerjoin(
+        consumption, consumption.c.customer_id == Customer.customer_id
+    ).outerjoin(
+        write_off, write_off.c.customer_id == Customer.customer_id
+    ).outerjoin(
+        balance, balance.c.customer_id == Customer.customer_id
+    ).where(Customer.customer_id.in_(customers))
+
+    stats_delete = delete(CustomerStats)
+    if customer_ids is not None:
+        stats_delete = stats_delete.where(CustomerStats.customer_id.in_(customer_ids))
+    session.execute(stats_delete)
+    session.execute(insert(CustomerStats).from_select([
+        CustomerStats.customer_id,
+        CustomerStats.total_consumption,
+        CustomerStats.visit_count,
+        CustomerStats.new_visit_count,
+        CustomerStats.returning_visit_count,
+        CustomerStats.first_consume_date,
+        CustomerStats.last_consume_date,
+        CustomerStats.total_write_off,
+        CustomerStats.outstanding_balance,
+    ], rows))
+
+def _balance_drifted(session):
+    """汇总表的余额合计与余额表不一致（如旧版本按消费减划扣计算余额，或脚本直接写入余额表）"""
+    stats_total = session.scalar(select(func.coalesce(func.sum(CustomerStats.outstanding_balance), 0)))
+    balance_total = session.scalar(select(
+        func.coalesce(func.sum(UnspentBalance.total_amount - UnspentBalance.spent_amount), 0)
+    ))
+    return abs(float(stats_total) - float(balance_total)) > 0.005
+
+def ensure_customer_stats():
+    """汇总表为空但已有顾客（如首次升级或批量导入后），或余额合计与余额表不一致时执行全量重建"""
+    session = get_session()
+    try:
+        has_stats = session.query(CustomerStats.customer_id).first() is not None
+        has_customers = session.query(Customer.customer_id).first() is not None
+        if has_customers and (not has_stats or _balance_drifted(session)):
+            rebuild_customer_stats(session)
+            session.commit()
+            print("✅ 顾客汇总表已重建")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    session = get_session()
+    try:
+        rebuild_customer_stats(session)
+        session.commit()
+        print(f"✅ 顾客汇总表已重建，共 {session.query(CustomerStats).count()} 位顾客")
+    finally:
+        session.close()
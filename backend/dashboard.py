@@ -0,0 +1,43 @@
+"""
+仪表板统计：各表记录数和金额合计由 COUNT/SUM 聚合查询得到，结果进入分析缓存
+"""
+
+import hashlib
+import json
+from sqlalchemy import select, func
+
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance, CustomerStats
+from analysis import use_session, run_async
+from cache import cached_analysis
+
+@cached_analysis('customers', 'consultants', 'medical_products', 'consumption_records',
+                 'write_off_records', 'unspent_balances', 'customer_stats')
+def dashboard_stats(session=None):
+    """各表记录数，累计消费和划扣（取自顾客汇总表），以及未划扣余额（取自余额表的总购买金额 - 已划扣金额）"""
+    with use_session(session) as session:
+        counts = session.execute(select(
+            select(func.count()).select_from(Customer).scalar_subquery().label('customer_count'),
+            select(func.count()).select_from(Consultant).scalar_subquery().label('consultant_count'),
+            select(func.count()).select_from(MedicalProduct).scalar_subquery().label('product_count'),
+            select(func.count()).select_from(ConsumptionRecord).scalar_subquery().label('consumption_record_count'),
+            select(func.count()).select_from(WriteOffRecord).scalar_subquery().label('write_off_record_count'),
+            select(func.count()).select_from(UnspentBalance).scalar_subquery().label('unspent_balance_count'),
+        )).one()
+        totals = session.execute(select(
+            func.coalesce(func.sum(CustomerStats.total_consumption), 0).label('total_consumption'),
+            func.coalesce(func.sum(CustomerStats.total_write_off), 0).label('total_write_off'),
+            select(func.coalesce(func.sum(UnspentBalance.total_amount - UnspentBalance.spent_amount), 0))
+            .scalar_subquery().label('outstanding_balance'),
+        )).one()
+    stats = dict(counts._mapping)
+    stats.update({key: round(float(value), 2) for key, value in totals._mapping.items()})
+    return stats
+
+def stats_etag(stats):
+    """统计结果的弱ETag（内容哈希）"""
+    digest = hashlib.sha1(json.dumps(stats, sort_keys=True).encode('utf-8')).hexdigest()
+    return f'W/"{digest[:16]}"'
+
+async def dashboard_stats_async():
+    """异步获取仪表板统计"""
+    return await run_async(dashboard_stats)
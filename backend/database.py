@@ -1,42 +1,350 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
+import itertools
+import sqlite3
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# 数据库配置 - 使用SQLite作为默认数据库
-def get_engine():
-    """获取数据库引擎"""
+# 进程级共享的引擎与会话工厂，首次使用时创建
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+# 异步引擎（aiosqlite / aiomysql），与同步引擎指向同一数据库
+_async_engine = None
+_async_session_factory = None
+
+# 只读库（读副本）引擎，未配置时回落到主库
+_read_engines = None
+_read_session_factories = None
+_async_read_session_factories = None
+_read_counter = itertools.count()
+_replica_refresher = None
+_replica_listeners = []
+
+# 默认SQLite数据库文件位于项目根目录
+SQLITE_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "medical_cosmetics.db")
+
+# 只读连接不需要（也不能）修改日志模式
+READ_ONLY_SKIPPED_PRAGMAS = ('journal_mode', 'synchronous')
+
+# 同步驱动到异步驱动的映射
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'mysql+pymysql': 'mysql+aiomysql',
+}
+
+# SQLite 性能配置档位，通过 SQLITE_PROFILE 选择
+SQLITE_PROFILES = {
+    # 保持SQLite默认行为（回滚日志、默认缓存）
+    'default': {},
+    # 生产环境：WAL 让读写并发，NORMAL 同步在WAL下依然安全
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'temp_store': 'MEMORY',
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+    },
+}
+
+# 启动时实际生效的SQLite参数
+_sqlite_settings = {}
+
+def get_pool_options():
+    """读取连接池配置（可通过环境变量调整）"""
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '3600')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+    }
+
+def get_sqlite_profile():
+    """获取当前选择的SQLite性能配置"""
+    name = os.getenv('SQLITE_PROFILE', 'performance').lower()
+    if name not in SQLITE_PROFILES:
+        print(f"⚠️  未知的SQLite配置档位 {name}，使用 default")
+        name = 'default'
+    return name, SQLITE_PROFILES[name]
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """为连接池中的每个新连接设置PRAGMA"""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def read_sqlite_settings(engine, names):
+    """读取连接上实际生效的PRAGMA值"""
+    settings = {}
+    with engine.connect() as conn:
+        for name in names:
+            settings[name] = conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
+
+def get_sqlite_settings():
+    """返回启动时报告的SQLite参数（非SQLite时为空）"""
+    get_engine()
+    return dict(_sqlite_settings)
+
+def _build_engine():
+    """创建数据库引擎（每个进程只执行一次）"""
     # 优先使用环境变量中的MySQL配置
     db_host = os.getenv('DB_HOST')
     db_port = os.getenv('DB_PORT')
     db_name = os.getenv('DB_NAME')
     db_user = os.getenv('DB_USER')
     db_password = os.getenv('DB_PASSWORD')
-    
+
+    pool_options = get_pool_options()
+
     # 如果配置了MySQL且连接可用，使用MySQL
     if all([db_host, db_port, db_name, db_user]):
         try:
             mysql_url = f"mysql+pymysql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-            engine = create_engine(mysql_url, echo=False)
-            # 测试连接
+            engine = create_engine(mysql_url, echo=False, **pool_options)
+            # 测试连接（仅在创建引擎时执行一次）
             with engine.connect() as conn:
-                conn.execute("SELECT 1")
-            print("✅ 使用MySQL数据库")
+                conn.execute(text("SELECT 1"))
+            print(f"✅ 使用MySQL数据库 (连接池: size={pool_options['pool_size']}, overflow={pool_options['max_overflow']})")
             return engine
         except Exception as e:
             print(f"⚠️  MySQL连接失败，使用SQLite: {e}")
-    
+
     # 默认使用SQLite
     # 确保数据库文件在项目根目录
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "medical_cosmetics.db")
-    sqlite_url = f"sqlite:///{db_path}"
-    print("✅ 使用SQLite数据库")
-    return create_engine(sqlite_url, echo=False)
+    sqlite_url = f"sqlite:///{SQLITE_DB_PATH}"
+    engine = create_engine(sqlite_url, echo=False, **pool_options)
+
+    profile_name, pragmas = get_sqlite_profile()
+    apply_sqlite_pragmas(engine, pragmas)
+    _sqlite_settings.clear()
+    _sqlite_settings.update(read_sqlite_settings(
+        engine, ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout']
+    ))
+    _sqlite_settings['profile'] = profile_name
+    applied = ", ".join(f"{k}={v}" for k, v in _sqlite_settings.items() if k != 'profile')
+    print(f"✅ 使用SQLite数据库 (配置档位: {profile_name}; {applied})")
+    return engine
+
+# 数据库配置 - 使用SQLite作为默认数据库
+def get_engine():
+    """获取数据库引擎（进程内单例，惰性创建）"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _build_engine()
+    return _engine
+
+def get_session_factory():
+    """获取绑定到共享引擎的会话工厂"""
+    global _session_factory
+    if _session_factory is None:
+        engine = get_engine()
+        with _engine_lock:
+            if _session_factory is None:
+                _session_factory = sessionmaker(bind=engine)
+    return _session_factory
 
 def get_session():
     """获取数据库会话"""
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    return Session() 
\ No newline at end of file
+    return get_session_factory()()
+
+def _build_async_engine(engine, read_only=False):
+    """根据同步引擎的连接地址创建对应的异步引擎"""
+    url = engine.url.set(drivername=ASYNC_DRIVERS[engine.url.drivername])
+    async_engine = create_async_engine(
+        url, echo=False, poolclass=AsyncAdaptedQueuePool, **get_pool_options()
+    )
+    if url.get_backend_name() == 'sqlite':
+        _, pragmas = get_sqlite_profile()
+        if read_only:
+            pragmas = {name: value for name, value in pragmas.items() if name not in READ_ONLY_SKIPPED_PRAGMAS}
+        apply_sqlite_pragmas(async_engine.sync_engine, pragmas)
+    return async_engine
+
+def get_async_engine():
+    """获取异步数据库引擎（进程内单例，惰性创建）"""
+    global _async_engine
+    if _async_engine is None:
+        engine = get_engine()
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = _build_async_engine(engine)
+    return _async_engine
+
+def get_async_session():
+    """获取异步数据库会话（用法: async with get_async_session() as session）"""
+    global _async_session_factory
+    if _async_session_factory is None:
+        engine = get_async_engine()
+        with _engine_lock:
+            if _async_session_factory is None:
+                _async_session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    return _async_session_factory()
+
+def get_local_replica_path():
+    """本地SQLite只读副本路径（仅主库为SQLite时生效）"""
+    return os.getenv('SQLITE_READ_REPLICA_PATH')
+
+def get_read_urls(primary):
+    """读取只读库连接地址：DB_READ_URL、DB_READ_REPLICAS（逗号分隔）以及本地SQLite副本"""
+    urls = []
+    if os.getenv('DB_READ_URL'):
+        urls.append(os.getenv('DB_READ_URL').strip())
+    urls.extend(u.strip() for u in os.getenv('DB_READ_REPLICAS', '').split(',') if u.strip())
+
+    replica_path = get_local_replica_path()
+    if replica_path and primary.url.get_backend_name() == 'sqlite':
+        if not os.path.exists(replica_path):
+            refresh_sqlite_replica()
+        urls.append(f"sqlite:///file:{replica_path}?mode=ro&uri=true")
+    return urls
+
+def _build_read_engine(url):
+    """创建只读库引擎；SQLite副本以只读方式打开，只应用缓存相关的PRAGMA"""
+    engine = create_engine(url, echo=False, **get_pool_options())
+    if engine.url.get_backend_name() == 'sqlite':
+        _, pragmas = get_sqlite_profile()
+        apply_sqlite_pragmas(engine, {
+            name: value for name, value in pragmas.items() if name not in READ_ONLY_SKIPPED_PRAGMAS
+        })
+    return engine
+
+def get_read_engines():
+    """获取只读库引擎列表；未配置读副本时返回主库引擎"""
+    global _read_engines, _read_session_factories
+    if _read_engines is None:
+        primary = get_engine()
+        with _engine_lock:
+            if _read_engines is None:
+                urls = get_read_urls(primary)
+                if urls:
+                    engines = [_build_read_engine(url) for url in urls]
+                    print(f"✅ 只读查询路由到 {len(engines)} 个读副本")
+                else:
+                    engines = [primary]
+                _read_session_factories = [sessionmaker(bind=engine) for engine in engines]
+                _read_engines = engines
+    return _read_engines
+
+def _next_read_index(count):
+    """轮询选择读副本"""
+    return next(_read_counter) % count
+
+def get_read_session():
+    """获取只读会话（分析与查询使用，写操作请使用 get_session）"""
+    engines = get_read_engines()
+    return _read_session_factories[_next_read_index(len(engines))]()
+
+def get_async_read_session():
+    """获取异步只读会话"""
+    global _async_read_session_factories
+    engines = get_read_engines()
+    if engines[0] is get_engine():
+        return get_async_session()
+    if _async_read_session_factories is None:
+        with _engine_lock:
+            if _async_read_session_factories is None:
+                _async_read_session_factories = [
+                    async_sessionmaker(bind=_build_async_engine(engine, read_only=True), expire_on_commit=False)
+                    for engine in engines
+                ]
+    return _async_read_session_factories[_next_read_index(len(engines))]()
+
+def add_replica_listener(listener):
+    """注册本地副本刷新回调：复制开始前调用 listener()，其返回的函数（可为None）在新副本生效后调用"""
+    _replica_listeners.append(listener)
+
+def refresh_sqlite_replica():
+    """用SQLite在线备份复制主库到本地只读副本，完成后原子替换副本文件"""
+    replica_path = get_local_replica_path()
+    if not replica_path:
+        return False
+
+    # 复制开始前已提交的写入都会进入新副本
+    on_refreshed = [listener() for listener in _replica_listeners]
+    tmp_path = f"{replica_path}.tmp"
+    source = sqlite3.connect(SQLITE_DB_PATH)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        # 副本使用回滚日志，避免替换文件后残留的WAL被误用
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, replica_path)
+
+    # 丢弃副本上的旧连接，之后的新连接读取新文件
+    if _read_engines is not None and _read_engines[0] is not _engine:
+        for engine in _read_engines:
+            if engine.url.get_backend_name() == 'sqlite':
+                engine.dispose()
+        for factory in _async_read_session_factories or []:
+            factory.kw['bind'].sync_engine.dispose(close=False)
+    for callback in on_refreshed:
+        if callback is not None:
+            callback()
+    return True
+
+def start_replica_refresher():
+    """启动后台线程，按 SQLITE_REPLICA_REFRESH_SECONDS 周期刷新本地副本"""
+    global _replica_refresher
+    interval = int(os.getenv('SQLITE_REPLICA_REFRESH_SECONDS', '60'))
+    if not get_local_replica_path() or interval <= 0 or _replica_refresher is not None:
+        return None
+
+    def _refresh_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                refresh_sqlite_replica()
+            except Exception as e:
+                print(f"⚠️  本地只读副本刷新失败: {e}")
+
+    _replica_refresher = threading.Thread(target=_refresh_loop, name="sqlite-replica-refresher", daemon=True)
+    _replica_refresher.start()
+    print(f"✅ 本地只读副本每 {interval} 秒刷新一次: {get_local_replica_path()}")
+    return _replica_refresher
+
+def dispose_engine():
+    """释放连接池并重置单例（用于进程fork后或切换配置）"""
+    global _engine, _session_factory, _async_engine, _async_session_factory
+    global _read_engines, _read_session_factories, _async_read_session_factories
+    with _engine_lock:
+        for engine in _read_engines or []:
+            if engine is not _engine:
+                engine.dispose()
+        for factory in _async_read_session_factories or []:
+            factory.kw['bind'].sync_engine.dispose(close=False)
+        if _engine is not None:
+            _engine.dispose()
+        if _async_engine is not None:
+            # 异步连接需在事件循环中关闭，这里只丢弃连接池
+            _async_engine.sync_engine.dispose(close=False)
+        _engine = None
+        _session_factory = None
+        _async_engine = None
+        _async_session_factory = None
+        _read_engines = None
+        _read_session_factories = None
+        _async_read_session_factories = None
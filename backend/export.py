@@ -0,0 +1,181 @@
+"""
+流式导出：在只读库上用服务端游标分块读取，逐块输出CSV或NDJSON，内存占用与表大小无关
+Excel 报表使用 openpyxl 只写模式逐行写入临时文件
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from sqlalchemy import select
+
+from database import get_read_session
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance
+
+# 每次从游标读取的行数
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '1000'))
+# Excel 临时文件目录
+EXPORT_DIR = os.getenv('EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'medical_exports'))
+# 单个工作表的最大数据行数（Excel上限1048576行，含表头）
+XLSX_MAX_ROWS = 1048575
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 可导出的数据表：接口路径名 -> 表
+EXPORT_TABLES = {
+    'customers': Customer.__table__,
+    'consultants': Consultant.__table__,
+    'products': MedicalProduct.__table__,
+    'consumption-records': ConsumptionRecord.__table__,
+    'write-off-records': WriteOffRecord.__table__,
+    'unspent-balances': UnspentBalance.__table__,
+}
+
+def table_query(name):
+    """按主键顺序导出整张表的查询"""
+    table = EXPORT_TABLES[name]
+    return select(table).order_by(*table.primary_key.columns)
+
+def open_export(stmt):
+    """执行查询，返回 (列名, 按块产出行的生成器)；查询出错时直接抛出，便于在响应开始前报错"""
+    session = get_read_session()
+    try:
+        result = session.execute(stmt, execution_options={'stream_results': True, 'yield_per': EXPORT_CHUNK_SIZE})
+    except Exception:
+        session.close()
+        raise
+    columns = list(result.keys())
+
+    def chunks():
+        try:
+            for partition in result.partitions():
+                yield partition
+        finally:
+            result.close()
+            session.close()
+
+    return columns, chunks()
+
+def _plain(value):
+    """转换为可JSON序列化的值"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return _plain(value)
+
+def csv_stream(columns, chunks):
+    """逐块输出CSV（带BOM，Excel可直接打开中文）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    for rows in chunks:
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate(0)
+    # 空结果时仍输出表头
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def ndjson_stream(columns, chunks):
+    """逐块输出NDJSON，每行一个JSON对象"""
+    for rows in chunks:
+        lines = [
+            json.dumps({column: _plain(value) for column, value in zip(columns, row)}, ensure_ascii=False)
+            for row in rows
+        ]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+# 导出格式 -> (MIME类型, 文件扩展名, 输出函数)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv', csv_stream),
+    'ndjson': ('application/x-ndjson', 'ndjson', ndjson_stream),
+}
+
+def export_filename(name, fmt):
+    extension = 'xlsx' if fmt == 'xlsx' else EXPORT_FORMATS[fmt][1]
+    return f"{name.replace('-', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+def _xlsx_value(value):
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, Decimal):
+        value = float(value)
+    if isinstance(value, str):
+        # 去掉Excel不允许的控制字符
+        value = ILLEGAL_CHARACTERS_RE.sub('', value)
+    return value
+
+def write_xlsx(path, sheets, progress=None):
+    """以只写模式写入Excel；sheets 为 (工作表名, 列名, 行块迭代器)，超出行数上限时自动分表"""
+    workbook = Workbook(write_only=True)
+    for title, columns, chunks in sheets:
+        part = 1
+        sheet = workbook.create_sheet(title=title[:31])
+        sheet.append(list(columns))
+        written = 0
+        for rows in chunks:
+            for row in rows:
+                if written == XLSX_MAX_ROWS:
+                    part += 1
+                    suffix = f'_{part}'
+                    sheet = workbook.create_sheet(title=title[:31 - len(suffix)] + suffix)
+                    sheet.append(list(columns))
+                    written = 0
+                sheet.append([_xlsx_value(value) for value in row])
+                written += 1
+            if progress:
+                progress(len(rows))
+    workbook.save(path)
+    return path
+
+def new_export_path(name):
+    """生成Excel临时文件路径"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{name.replace('-', '_')}_", suffix='.xlsx', dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+def export_table_xlsx(name, progress=None):
+    """整表导出为Excel，返回 {path, filename, media_type}"""
+    path = new_export_path(name)
+    columns, chunks = open_export(table_query(name))
+    write_xlsx(path, [(name, columns, chunks)], progress)
+    return {'path': path, 'filename': export_filename(name, 'xlsx'), 'media_type': XLSX_MEDIA_TYPE}
+
+def _analysis_sheet(result):
+    """分析结果的 data 列表转换为 (列名, [行])"""
+    columns = []
+    for item in result.get('data', []):
+        for key in item:
+            if key not in columns:
+                columns.append(key)
+    rows = [[item.get(column) for column in columns] for item in result.get('data', [])]
+    return columns, rows
+
+def export_analyses_xlsx(analyses, timings=None, progress=None):
+    """分析结果导出为Excel：第一个工作表为各分析摘要，其后每个分析一个工作表"""
+    timings = timings or {}
+    path = new_export_path('analysis')
+    overview = [
+        [result.get('title'), result.get('description'), result.get('summary'), timings.get(name)]
+        for name, result in analyses.items()
+    ]
+    sheets = [('分析摘要', ['分析', '说明', '结论', '耗时(ms)'], [overview])]
+    for name, result in analyses.items():
+        columns, rows = _analysis_sheet(result)
+        sheets.append((result.get('title') or name, columns, [rows]))
+    write_xlsx(path, sheets, progress)
+    return {'path': path, 'filename': export_filename('analysis', 'xlsx'), 'media_type': XLSX_MEDIA_TYPE}
@@ -0,0 +1,190 @@
+"""
+十大增长点分析：各项指标均由聚合SQL计算，只返回评估后的增长机会
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func
+
+from models import Customer, MedicalProduct, UnspentBalance, CustomerStats, DailyRevenueRollup
+from analysis import use_session, run_async
+from cache import cached_analysis
+from customer_stats import new_customer_counts
+
+PRIORITY_ORDER = {'高': 1, '中': 2, '低': 3}
+
+# 不随数据变化的长期增长机会
+STATIC_OPPORTUNITIES = [
+    {
+        'category': '营销策略',
+        'opportunity': '季节性营销活动',
+        'description': '根据医美行业特点，制定季节性营销计划',
+        'potential_value': 100000,
+        'priority': '中',
+        'action': '策划节假日和季节性营销活动'
+    },
+    {
+        'category': '客户推荐',
+        'opportunity': '客户推荐奖励计划',
+        'description': '通过现有客户推荐新客户',
+        'potential_value': 80000,
+        'priority': '低',
+        'action': '制定客户推荐奖励机制'
+    },
+    {
+        'category': '数字化',
+        'opportunity': '数字化营销渠道拓展',
+        'description': '利用社交媒体和线上平台拓展客户',
+        'potential_value': 60000,
+        'priority': '低',
+        'action': '建立线上营销体系，提升品牌知名度'
+    },
+]
+
+def _growth_indicators(session, inactive_months=6):
+    """用聚合查询计算各项增长指标"""
+    cutoff_date = datetime.now() - timedelta(days=inactive_months*30)
+    inactive_count = session.query(func.count(Customer.customer_id)).filter(
+        Customer.last_visit_date < cutoff_date
+    ).scalar()
+
+    high_value_vip_count = session.query(func.count(Customer.customer_id)).join(
+        CustomerStats, CustomerStats.customer_id == Customer.customer_id
+    ).filter(
+        Customer.membership_level.in_(['黄金', '钻石']),
+        CustomerStats.total_consumption > 10000
+    ).scalar()
+
+    total_new, total_reopened = new_customer_counts(session)
+
+    balance_count, balance_total = session.query(
+        func.count(UnspentBalance.balance_id),
+        func.coalesce(func.sum(UnspentBalance.remaining_amount), 0)
+    ).filter(UnspentBalance.remaining_amount > 5000).one()
+
+    dept_amount = func.sum(DailyRevenueRollup.total_amount)
+    weakest_department = session.query(DailyRevenueRollup.department).group_by(
+        DailyRevenueRollup.department
+    ).order_by(dept_amount.asc()).limit(1).scalar()
+
+    product_revenue = func.sum(DailyRevenueRollup.total_amount)
+    best_product = session.query(MedicalProduct.product_name).join(
+        DailyRevenueRollup, DailyRevenueRollup.product_id == MedicalProduct.product_id
+    ).group_by(MedicalProduct.product_id).order_by(product_revenue.desc()).limit(1).scalar()
+
+    silver_count = session.query(func.count(Customer.customer_id)).filter(
+        Customer.membership_level == '白银'
+    ).scalar()
+
+    return {
+        'inactive_count': inactive_count,
+        'high_value_vip_count': high_value_vip_count,
+        'reopen_rate': round(total_reopened / total_new * 100, 2) if total_new else 0,
+        'has_new_customers': total_new > 0,
+        'balance_count': balance_count,
+        'balance_total': float(balance_total),
+        'weakest_department': weakest_department,
+        'best_product': best_product,
+        'silver_count': silver_count,
+    }
+
+@cached_analysis('customers', 'consumption_records', 'customer_stats', 'unspent_balances',
+                 'medical_products', 'daily_revenue_rollups')
+def analyze_growth_opportunities(session=None):
+    """分析十大增长机会"""
+    with use_session(session) as session:
+        indicators = _growth_indicators(session)
+
+    opportunities = []
+
+    # 1. 不活跃客户召回
+    if indicators['inactive_count']:
+        opportunities.append({
+            'category': '客户召回',
+            'opportunity': '不活跃客户召回',
+            'description': f'有{indicators["inactive_count"]}位客户6个月以上未到店',
+            'potential_value': indicators['inactive_count'] * 2000,  # 假设每位客户平均消费2000元
+            'priority': '高',
+            'action': '制定客户回访计划，提供专属优惠'
+        })
+
+    # 2. VIP客户深度开发
+    opportunities.append({
+        'category': 'VIP开发',
+        'opportunity': '高价值VIP客户深度开发',
+        'description': f'有{indicators["high_value_vip_count"]}位VIP客户消费超过1万元',
+        'potential_value': indicators['high_value_vip_count'] * 5000,
+        'priority': '高',
+        'action': '提供个性化服务，推荐高端项目'
+    })
+
+    # 3. 新客转化率提升（二开率低于50%时）
+    if indicators['has_new_customers'] and indicators['reopen_rate'] < 50:
+        opportunities.append({
+            'category': '新客转化',
+            'opportunity': '提升新客二开率',
+            'description': f'当前新客二开率为{indicators["reopen_rate"]}%，有较大提升空间',
+            'potential_value': 50000,  # 假设提升10%可带来5万元收入
+            'priority': '中',
+            'action': '优化新客体验，制定二次消费激励政策'
+        })
+
+    # 4. 未划扣余额激活
+    if indicators['balance_count']:
+        opportunities.append({
+            'category': '余额激活',
+            'opportunity': '激活未划扣余额',
+            'description': f'有{indicators["balance_count"]}位客户未划扣余额总计{indicators["balance_total"]:.0f}元',
+            'potential_value': indicators['balance_total'] * 0.3,  # 假设30%的余额会被使用
+            'priority': '高',
+            'action': '主动联系客户，推荐相关项目'
+        })
+
+    # 5. 科室业绩优化（业绩最低的科室）
+    if indicators['weakest_department']:
+        opportunities.append({
+            'category': '科室优化',
+            'opportunity': f'{indicators["weakest_department"]}科室业绩提升',
+            'description': f'{indicators["weakest_department"]}科室业绩较低，有提升空间',
+            'potential_value': 30000,
+            'priority': '中',
+            'action': '加强科室推广，培训咨询师技能'
+        })
+
+    # 6. 产品组合销售（销售额最高的产品）
+    if indicators['best_product']:
+        opportunities.append({
+            'category': '产品策略',
+            'opportunity': f'{indicators["best_product"]}产品组合销售',
+            'description': f'{indicators["best_product"]}销售表现优秀，可开发相关产品',
+            'potential_value': 40000,
+            'priority': '中',
+            'action': '开发配套产品，制定组合销售方案'
+        })
+
+    # 7. 会员等级升级
+    opportunities.append({
+        'category': '会员升级',
+        'opportunity': '白银会员升级计划',
+        'description': f'有{indicators["silver_count"]}位白银会员可升级为黄金会员',
+        'potential_value': indicators['silver_count'] * 3000,
+        'priority': '中',
+        'action': '制定会员升级激励政策'
+    })
+
+    # 8-10. 营销策略、客户推荐、数字化
+    opportunities.extend(dict(item) for item in STATIC_OPPORTUNITIES)
+
+    # 按优先级、潜在价值排序
+    opportunities.sort(key=lambda x: (PRIORITY_ORDER[x['priority']], -x['potential_value']))
+    total_potential = sum(op['potential_value'] for op in opportunities)
+
+    return {
+        'title': '十大增长点分析',
+        'description': f'发现 {len(opportunities)} 个增长机会',
+        'data': opportunities,
+        'summary': f'总潜在价值{total_potential:.2f}元，高优先级机会{sum(1 for op in opportunities if op["priority"] == "高")}个'
+    }
+
+async def analyze_growth_opportunities_async():
+    """异步分析十大增长机会"""
+    return await run_async(analyze_growth_opportunities)
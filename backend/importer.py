@@ -0,0 +1,262 @@
+"""
+批量导入：流式读取Excel（openpyxl只读模式）或CSV，按批校验后写入
+顾客按手机号去重并upsert，产品按品项名称去重；消费/划扣记录与批量接口共用校验和写入逻辑
+"""
+
+import csv
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from openpyxl import load_workbook
+from sqlalchemy import select, update, insert, bindparam
+
+from database import get_session
+from customer_search import index_customers
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord
+from schemas import CustomerCreate, MedicalProductCreate, ConsumptionRecordCreate, WriteOffRecordCreate
+from bulk import (
+    BULK_CHUNK_SIZE, WRITE_ERRORS, CONSUMPTION_FOREIGN_KEYS, WRITE_OFF_FOREIGN_KEYS,
+    validate_rows, check_foreign_keys, insert_rows, refresh_after_consumption, refresh_after_write_off
+)
+
+# 导入结果中最多保留的错误行数
+IMPORT_MAX_ERRORS = int(os.getenv('IMPORT_MAX_ERRORS', '1000'))
+IMPORT_EXTENSIONS = ('.xlsx', '.csv')
+
+def upsert_customers(session, rows, columns):
+    """按手机号upsert顾客，已有顾客只更新文件中出现的列（MySQL: ON DUPLICATE KEY UPDATE；SQLite: ON CONFLICT）"""
+    values = [row for _, row in rows]
+    table = Customer.__table__
+    update_columns = [key for key in values[0] if key != 'phone' and key in columns]
+    if session.get_bind().dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in update_columns})
+    else:
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.phone],
+            set_={key: stmt.excluded[key] for key in update_columns}
+        )
+    session.execute(stmt, values)
+    index_customers(session, session.scalars(
+        select(Customer.customer_id).where(Customer.phone.in_([row['phone'] for row in values]))
+    ).all())
+
+def upsert_products(session, rows, columns):
+    """按品项名称更新已有产品（只更新文件中出现的列），其余新建（产品表无唯一约束，先查后写）"""
+    values = [row for _, row in rows]
+    existing = dict(session.execute(
+        select(MedicalProduct.product_name, MedicalProduct.product_id)
+        .where(MedicalProduct.product_name.in_([row['product_name'] for row in values]))
+    ).all())
+    updates = [dict(row, b_product_id=existing[row['product_name']]) for row in values if row['product_name'] in existing]
+    inserts = [row for row in values if row['product_name'] not in existing]
+    table = MedicalProduct.__table__
+    if updates:
+        session.execute(
+            update(table).where(table.c.product_id == bindparam('b_product_id'))
+            .values({key: bindparam(key) for key in values[0] if key in columns}),
+            updates
+        )
+    if inserts:
+        session.execute(insert(table), inserts)
+
+def insert_consumptions(session, rows, columns):
+    insert_rows(session, ConsumptionRecord, rows, refresh_after_consumption)
+
+def insert_write_offs(session, rows, columns):
+    insert_rows(session, WriteOffRecord, rows, refresh_after_write_off)
+
+# 可导入的数据：接口路径名 -> 配置
+IMPORT_ENTITIES = {
+    'customers': {
+        'schema': CustomerCreate,
+        'model': Customer,
+        'foreign_keys': {'consultant_id': Consultant.consultant_id},
+        'dedupe_key': 'phone',
+        'writer': upsert_customers,
+        'tables': ('customers',),
+    },
+    'products': {
+        'schema': MedicalProductCreate,
+        'model': MedicalProduct,
+        'foreign_keys': {},
+        'dedupe_key': 'product_name',
+        'writer': upsert_products,
+        'tables': ('medical_products',),
+    },
+    'consumption-records': {
+        'schema': ConsumptionRecordCreate,
+        'model': ConsumptionRecord,
+        'foreign_keys': CONSUMPTION_FOREIGN_KEYS,
+        'dedupe_key': None,
+        'writer': insert_consumptions,
+        'tables': ('consumption_records', 'customer_stats', 'daily_revenue_rollups'),
+    },
+    'write-off-records': {
+        'schema': WriteOffRecordCreate,
+        'model': WriteOffRecord,
+        'foreign_keys': WRITE_OFF_FOREIGN_KEYS,
+        'dedupe_key': None,
+        'writer': insert_write_offs,
+        'tables': ('write_off_records', 'customer_stats'),
+    },
+}
+
+def _column_aliases(schema, model):
+    """表头可用字段名或列注释（中文列名）"""
+    aliases = {name: name for name in schema.model_fields}
+    for column in model.__table__.columns:
+        if column.comment and column.key in schema.model_fields:
+            aliases.setdefault(column.comment, column.key)
+    return aliases
+
+def _cell(value, annotation):
+    """单元格取值规范化：空值丢弃，Excel日期时间转日期，数字列按需转字符串，JSON文本解析"""
+    if isinstance(value, str):
+        value = value.strip()
+        if value == '':
+            return None
+        if value.startswith('{'):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+    if isinstance(value, datetime):
+        return value.date()
+    if annotation is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        # 手机号等在Excel中常被存成数字
+        return str(int(value)) if float(value).is_integer() else str(value)
+    return value
+
+def _iter_xlsx(path):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        yield sheet.max_row - 1 if sheet.max_row else None
+        yield header
+        for values in rows:
+            yield values
+    finally:
+        workbook.close()
+
+def _iter_csv(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        yield None
+        yield next(reader, None) or ()
+        for values in reader:
+            yield values
+
+def read_rows(path, schema, model):
+    """流式读取文件，返回 (数据行数或None, 表头中的字段, 产出 (行号, {字段: 值}) 的迭代器)；首行为表头"""
+    iterator = _iter_xlsx(path) if path.lower().endswith('.xlsx') else _iter_csv(path)
+    total = next(iterator)
+    header = next(iterator)
+    aliases = _column_aliases(schema, model)
+    fields = [aliases.get(str(name).strip()) if name is not None else None for name in header]
+    annotations = {name: field.annotation for name, field in schema.model_fields.items()}
+
+    def rows():
+        for number, values in enumerate(iterator, start=2):
+            row = {}
+            for field, value in zip(fields, values):
+                if field is None:
+                    continue
+                value = _cell(value, annotations[field])
+                if value is not None:
+                    row[field] = value
+            if row:
+                yield number, row
+
+    return total, {field for field in fields if field}, rows()
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _dedupe(rows, key):
+    """同一批内按去重键保留最后一行，返回 (保留的行, 合并的行数)"""
+    latest = {}
+    for index, row in rows:
+        latest[row[key]] = (index, row)
+    kept = sorted(latest.values(), key=lambda item: item[0])
+    return kept, len(rows) - len(kept)
+
+def _write_batch(session, writer, rows, columns):
+    """一批数据在一个事务中写入；失败时逐行写入以定位错误行"""
+    try:
+        writer(session, rows, columns)
+        session.commit()
+        return len(rows), []
+    except WRITE_ERRORS:
+        session.rollback()
+    written, errors = 0, []
+    for index, row in rows:
+        try:
+            writer(session, [(index, row)], columns)
+            session.commit()
+            written += 1
+        except WRITE_ERRORS as e:
+            session.rollback()
+            errors.append({'index': index, 'error': str(getattr(e, 'orig', None) or e)})
+    return written, errors
+
+def save_upload(fileobj, filename):
+    """将上传文件保存到临时文件，返回路径"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    fd, path = tempfile.mkstemp(prefix='import_', suffix=extension)
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(fileobj, f)
+    return path
+
+def run_import(job, entity, path, changed=None):
+    """后台导入任务：按批校验、去重、写入，进度按已处理行数汇报；changed(*tables) 在每批写入后调用"""
+    spec = IMPORT_ENTITIES[entity]
+    summary = {'entity': entity, 'processed': 0, 'written': 0, 'merged': 0, 'failed': 0, 'errors': []}
+
+    def record_errors(errors):
+        summary['failed'] += len(errors)
+        room = IMPORT_MAX_ERRORS - len(summary['errors'])
+        summary['errors'].extend(errors[:max(room, 0)])
+
+    session = get_session()
+    try:
+        total, columns, rows = read_rows(path, spec['schema'], spec['model'])
+        job.total = total
+        for batch in _batches(rows, BULK_CHUNK_SIZE):
+            valid, invalid = validate_rows(batch, spec['schema'], spec['model'])
+            record_errors(invalid)
+            if valid and spec['dedupe_key']:
+                valid, merged = _dedupe(valid, spec['dedupe_key'])
+                summary['merged'] += merged
+            if valid and spec['foreign_keys']:
+                valid, invalid = check_foreign_keys(session, valid, spec['foreign_keys'])
+                record_errors(invalid)
+            if valid:
+                written, errors = _write_batch(session, spec['writer'], valid, columns)
+                summary['written'] += written
+                record_errors(errors)
+                if written and changed:
+                    changed(*spec['tables'])
+            summary['processed'] += len(batch)
+            job.advance(len(batch))
+        # 空行不计入处理行数，结束时以实际处理数为准
+        job.total = summary['processed']
+    finally:
+        session.close()
+        os.remove(path)
+    summary['errors'].sort(key=lambda err: err['index'])
+    return summary
@@ -0,0 +1,177 @@
+"""
+规则意图：常见问题用正则识别并提取参数（N、年份、科室、金额、月数），直接使用预置的参数化SQL，不调用大模型
+只有整句匹配时才使用规则（问题带有额外条件时交给大模型），未识别的问题仍走缓存/相似问题/大模型
+预置SQL只读汇总表或走已有索引：累计消费取自 customer_stats，科室年度消费取自 daily_revenue_rollups（按日期前缀索引），
+余额条件与 ix_unspent_balances_remaining_amount 表达式一致，不活跃顾客走 ix_customers_last_visit_date
+"""
+
+import re
+from datetime import date, timedelta
+
+from sql_similarity import canonical_question, strip_filler
+
+# 单次返回的最大顾客数
+MAX_TOP_N = 1000
+
+_CN_DIGITS = {'零': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_UNITS = {'十': 10, '百': 100, '千': 1000}
+# 只转换紧跟量词的中文数字，避免误改“一下”“一般”等词
+_CN_NUMBER = re.compile(r'[零一二两三四五六七八九十百千]+(?=位|名|个|天|年|元|万)')
+
+def chinese_number(text):
+    """中文数字 -> 整数：十五=15，二十=20，一百二十=120，二零二四=2024"""
+    if not any(ch in _CN_UNITS for ch in text):
+        return int(''.join(str(_CN_DIGITS[ch]) for ch in text))
+    total, digit = 0, 0
+    for ch in text:
+        if ch in _CN_DIGITS:
+            digit = _CN_DIGITS[ch]
+        else:
+            total += (digit or 1) * _CN_UNITS[ch]
+            digit = 0
+    return total + digit
+
+def intent_text(question):
+    """用于规则匹配的文本：中文数字转阿拉伯数字，统一同义词，去掉虚词（及“有哪些”句末剩下的“有”）"""
+    text = _CN_NUMBER.sub(lambda match: str(chinese_number(match.group())), question or '')
+    text = strip_filler(canonical_question(text))
+    return text[:-1] if text.endswith('有') else text
+
+def _year(groups):
+    if groups.get('year'):
+        return int(groups['year'])
+    offset = {'今年': 0, '去年': 1, '前年': 2}[groups['relative_year']]
+    return date.today().year - offset
+
+def _amount(groups):
+    amount = float(groups['amount'])
+    amount *= {'万': 10000, '千': 1000}.get(groups.get('unit') or '', 1)
+    return int(amount) if amount.is_integer() else amount
+
+class Intent:
+    """一个规则意图：任一正则整句匹配后由 build 根据命名分组生成 (SQL, 参数)；build 返回 None 表示参数无效"""
+
+    def __init__(self, name, patterns, build):
+        self.name = name
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        self.build = build
+
+    def match(self, text):
+        for pattern in self.patterns:
+            found = pattern.fullmatch(text)
+            if found:
+                return self.build(found.groupdict())
+        return None
+
+TOP_CUSTOMERS_SQL = """
+SELECT c.customer_id, c.name, c.phone, c.membership_level, s.total_consumption
+FROM customer_stats s
+JOIN customers c ON c.customer_id = s.customer_id
+ORDER BY s.total_consumption DESC
+LIMIT :n
+""".strip()
+
+def _top_customers(groups):
+    n = int(groups['n'])
+    if not 0 < n <= MAX_TOP_N:
+        return None
+    return TOP_CUSTOMERS_SQL, {'n': n}
+
+CONSULTANT_CUSTOMERS_SQL = """
+SELECT co.consultant_id, co.name, co.department, COUNT(c.customer_id) AS customer_count
+FROM consultants co
+LEFT JOIN customers c ON c.consultant_id = co.consultant_id
+GROUP BY co.consultant_id, co.name, co.department
+ORDER BY customer_count DESC
+""".strip()
+
+def _consultant_customers(groups):
+    return CONSULTANT_CUSTOMERS_SQL, {}
+
+DEPARTMENT_YEAR_SQL = """
+SELECT r.department, SUM(r.record_count) AS record_count, SUM(r.total_amount) AS total_amount
+FROM daily_revenue_rollups r
+WHERE r.rollup_date >= :start_date AND r.rollup_date < :end_date{department_filter}
+GROUP BY r.department
+ORDER BY total_amount DESC
+""".strip()
+
+def _department_year(groups):
+    year = _year(groups)
+    params = {'start_date': f'{year:04d}-01-01', 'end_date': f'{year + 1:04d}-01-01'}
+    department_filter = ''
+    if groups.get('department'):
+        params['department'] = groups['department']
+        department_filter = ' AND r.department = :department'
+    return DEPARTMENT_YEAR_SQL.format(department_filter=department_filter), params
+
+HIGH_BALANCE_SQL = """
+SELECT c.customer_id, c.name, c.phone, p.product_name, b.total_amount - b.spent_amount AS remaining_amount
+FROM unspent_balances b
+JOIN customers c ON c.customer_id = b.customer_id
+JOIN medical_products p ON p.product_id = b.product_id
+WHERE b.total_amount - b.spent_amount > :threshold
+ORDER BY remaining_amount DESC
+""".strip()
+
+def _high_balance(groups):
+    return HIGH_BALANCE_SQL, {'threshold': _amount(groups)}
+
+INACTIVE_CUSTOMERS_SQL = """
+SELECT c.customer_id, c.name, c.phone, c.last_visit_date, c.membership_level,
+       COALESCE(s.total_consumption, 0) AS total_consumption
+FROM customers c
+LEFT JOIN customer_stats s ON s.customer_id = c.customer_id
+WHERE c.last_visit_date < :cutoff_date
+ORDER BY c.last_visit_date
+""".strip()
+
+def _inactive_customers(groups):
+    months = int(groups['months'])
+    if months <= 0:
+        return None
+    # 与不活跃顾客分析一致，每月按30天计
+    return INACTIVE_CUSTOMERS_SQL, {'cutoff_date': (date.today() - timedelta(days=months * 30)).isoformat()}
+
+_YEAR = r'(?:(?P<year>\d{4})年|(?P<relative_year>今年|去年|前年))'
+_DEPARTMENT = r'(?P<department>皮肤科|无创科|整形外科|综合)'
+_REVENUE = r'总?(?:消费|业绩|收入|营业额|销售额|营收)总?'
+# 金额条件须带“超过”或“以上”
+_AMOUNT = r'(?=超过|[\d.]+(?:万|千)?元?以上)(?:超过)?(?P<amount>\d+(?:\.\d+)?)(?P<unit>万|千)?元?(?:以上)?'
+
+INTENTS = [
+    Intent('top_customers', [
+        r'(?:累计)?消费(?:最高|排名|排行)?(?:前|top)(?P<n>\d+)位?顾客',
+        r'(?:累计)?消费最高(?P<n>\d+)位顾客',
+        r'(?:前|top)(?P<n>\d+)位?(?:累计)?消费最高顾客',
+        r'顾客(?:累计)?消费(?:最高|排名|排行)?(?:前|top)(?P<n>\d+)位?',
+    ], _top_customers),
+    Intent('consultant_customers', [
+        r'(?:按|每个)?咨询师(?:名下)?(?:分别)?(?:负责|服务|有|拥有)?(?:多少|几)(?:个|位|名)?顾客(?:数)?',
+        r'(?:按|每个)?咨询师(?:名下)?(?:负责|服务)?顾客(?:数|数量|人数|数目)(?:排名|排行)?',
+    ], _consultant_customers),
+    Intent('department_year', [
+        r'(?:按|每个)(?:科室|部门)' + _YEAR + _REVENUE,
+        _YEAR + r'(?:按|每个)(?:科室|部门)' + _REVENUE,
+        _DEPARTMENT + _YEAR + _REVENUE,
+        _YEAR + _DEPARTMENT + _REVENUE,
+    ], _department_year),
+    Intent('high_balance', [
+        r'(?:未划扣)?余额' + _AMOUNT + r'有?顾客',
+        r'顾客(?:未划扣)?余额' + _AMOUNT,
+    ], _high_balance),
+    Intent('inactive_customers', [
+        r'(?:超过|最近|近)?(?P<months>\d+)个?月(?:以上)?(?:没有|没|未)(?:到店|来店|光顾)(?:过)?顾客',
+        r'(?:超过|最近|近)?(?P<months>\d+)个?月(?:以上)?不活跃顾客',
+    ], _inactive_customers),
+]
+
+def match_intent(question):
+    """返回 (意图名, SQL, 参数)；问题不属于任何规则意图时返回 None"""
+    text = intent_text(question)
+    for intent in INTENTS:
+        built = intent.match(text)
+        if built is not None:
+            sql, params = built
+            return intent.name, sql, params
+    return None
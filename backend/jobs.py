@@ -0,0 +1,97 @@
+"""
+后台任务登记：大文件导出/导入放到线程池执行，通过任务ID查询进度和结果
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# 同时执行的后台任务数
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '2'))
+# 已结束任务的保留时间（秒），过期后删除任务及其结果文件
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', '3600'))
+
+class Job:
+    """一个后台任务的状态"""
+
+    def __init__(self, kind):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'pending'
+        self.progress = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def advance(self, count=1):
+        """汇报处理进度（已处理行数）"""
+        self.progress += count
+
+    def to_dict(self):
+        result = self.result
+        if isinstance(result, dict):
+            # 结果文件的服务器路径不对外暴露
+            result = {k: v for k, v in result.items() if k != 'path'}
+        return {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'result': result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobRegistry:
+    """线程安全的任务登记表"""
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, ttl=JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, kind, func, *args):
+        """提交任务，func(job, *args) 的返回值作为任务结果"""
+        self.purge_expired()
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        job.status = 'running'
+        try:
+            job.result = func(job, *args)
+            job.status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            job.status = 'failed'
+            print(f"❌ 后台任务 {job.kind} 失败: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def purge_expired(self):
+        """删除过期的已结束任务及其结果文件"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished_at and now - job.finished_at > self.ttl]
+            for job in expired:
+                del self._jobs[job.job_id]
+        for job in expired:
+            path = job.result.get('path') if isinstance(job.result, dict) else None
+            if path and os.path.exists(path):
+                os.remove(path)
+
+job_registry = JobRegistry()
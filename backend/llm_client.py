@@ -0,0 +1,383 @@
+"""
+大模型客户端：单次调用超时与整体截止时间、并发上限、带随机抖动的重试、熔断器、延迟统计
+后端可替换（LLM_BACKEND）：
+  dashscope  阿里百炼（默认）
+  http       OpenAI 兼容的 chat/completions 接口，如本地桩服务 llm_stub.py
+  replay     从 JSONL 文件按提示词回放响应（每行 {"prompt": ..., "response": ...}），用于测试和基准
+设置 LLM_RECORD_FILE 后，成功的响应按回放文件格式追加记录
+"""
+
+import http.client
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import dashscope
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_MODEL = os.getenv('LLM_MODEL', 'qwen-max')
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'dashscope')
+LLM_HTTP_URL = os.getenv('LLM_HTTP_URL', 'http://127.0.0.1:8001/v1/chat/completions')
+LLM_HTTP_API_KEY = os.getenv('LLM_HTTP_API_KEY')
+LLM_REPLAY_FILE = os.getenv('LLM_REPLAY_FILE', 'llm_replay.jsonl')
+LLM_RECORD_FILE = os.getenv('LLM_RECORD_FILE')
+# 单次请求超时与含重试的整体截止时间（秒）
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', '60'))
+# 同时进行的请求数上限
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+# 阿里百炼调用线程数：超时后放弃等待的调用仍占用线程直到SDK超时返回，线程池大于并发上限留出余量，全部占用时拒绝新请求
+LLM_DASHSCOPE_WORKERS = int(os.getenv('LLM_DASHSCOPE_WORKERS', str(LLM_MAX_CONCURRENCY * 2)))
+# 失败后的重试次数与退避基数（秒，指数退避 + 全抖动）
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+# 连续失败次数达到阈值后熔断，熔断持续秒数后放行一次试探请求
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+
+# 延迟统计保留的最近调用数
+LATENCY_WINDOW = 1000
+
+class LLMError(Exception):
+    """大模型调用失败；retryable 表示可重试（超时、限流、服务端错误）"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+class LLMTimeout(LLMError):
+    """请求超时或超过整体截止时间"""
+
+    def __init__(self, message):
+        super().__init__(message, retryable=True)
+
+class CircuitOpenError(LLMError):
+    """熔断中，请求被直接拒绝"""
+
+def _retryable_status(status):
+    return status == 429 or status >= 500
+
+class LLMBackend(ABC):
+    """后端接口：complete 返回模型输出的文本，失败时抛出 LLMError"""
+    name = 'base'
+
+    @abstractmethod
+    def complete(self, messages, timeout, **options):
+        """发送消息并返回模型输出的文本，超过 timeout 秒时抛出 LLMTimeout"""
+
+class DashScopeBackend(LLMBackend):
+    """阿里百炼：SDK 的 HTTP 请求带 request_timeout；调用在专用线程池中执行并按超时放弃等待，
+    线程全部被未结束的调用占用时直接拒绝，不排队
+    """
+    name = 'dashscope'
+
+    def __init__(self, model=LLM_MODEL, max_workers=LLM_DASHSCOPE_WORKERS):
+        self.model = model
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dashscope')
+        # 线程池中尚未结束的调用数（包括已放弃等待的）
+        self._workers = threading.BoundedSemaphore(max_workers)
+
+    def _call(self, messages, options):
+        try:
+            return dashscope.Generation.call(model=self.model, messages=messages, **options)
+        finally:
+            self._workers.release()
+
+    def complete(self, messages, timeout, **options):
+        api_key = os.getenv('DASHSCOPE_API_KEY')
+        if not api_key:
+            raise LLMError("未设置 DASHSCOPE_API_KEY 环境变量")
+        dashscope.api_key = api_key
+
+        if not self._workers.acquire(blocking=False):
+            raise LLMError("大模型调用线程已全部占用（之前的调用尚未结束），请稍后重试")
+        options = dict(options, request_timeout=max(1, math.ceil(timeout)))
+        try:
+            future = self._executor.submit(self._call, messages, options)
+        except RuntimeError as e:
+            self._workers.release()
+            raise LLMError(str(e))
+        try:
+            response = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # 已在运行的调用无法取消，由 request_timeout 结束
+            raise LLMTimeout(f"请求超时（{timeout:.1f}秒）")
+        except Exception as e:
+            # 网络异常等
+            raise LLMError(str(e), retryable=True)
+
+        if response is None:
+            raise LLMError("API响应为空", retryable=True)
+        status = getattr(response, 'status_code', None)
+        if status != 200:
+            raise LLMError(getattr(response, 'message', None) or '未知错误',
+                           retryable=status is None or _retryable_status(status))
+        output = getattr(response, 'output', None)
+        if output is None:
+            raise LLMError("API响应中没有output字段")
+        # 阿里百炼API返回的内容在text字段中
+        if getattr(output, 'text', None) is None:
+            raise LLMError("API响应中没有text字段")
+        return output.text
+
+class HTTPBackend(LLMBackend):
+    """OpenAI 兼容的 chat/completions 接口"""
+    name = 'http'
+
+    def __init__(self, url=LLM_HTTP_URL, model=LLM_MODEL, api_key=LLM_HTTP_API_KEY):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+
+    def complete(self, messages, timeout, **options):
+        body = json.dumps({'model': self.model, 'messages': messages, **options}).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f'Bearer {self.api_key}'
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                payload = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            raise LLMError(f"HTTP {e.code}: {e.reason}", retryable=_retryable_status(e.code))
+        except TimeoutError:
+            raise LLMTimeout(f"请求超时（{timeout:.1f}秒）")
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, TimeoutError):
+                raise LLMTimeout(f"请求超时（{timeout:.1f}秒）")
+            raise LLMError(f"连接失败: {e.reason}", retryable=True)
+        except (OSError, http.client.HTTPException) as e:
+            # 读取响应时连接被重置、响应不完整等
+            raise LLMError(f"网络错误: {e!r}", retryable=True)
+        except ValueError as e:
+            raise LLMError(f"响应不是有效的JSON: {e}")
+        try:
+            return payload['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("响应中没有 choices[0].message.content")
+
+def _prompt_key(messages):
+    """回放文件的键：最后一条用户消息"""
+    return next((m['content'] for m in reversed(messages) if m.get('role') == 'user'), '')
+
+class ReplayBackend(LLMBackend):
+    """按提示词回放 JSONL 文件中的响应，不访问网络"""
+    name = 'replay'
+
+    def __init__(self, path=LLM_REPLAY_FILE):
+        self.path = path
+        self.responses = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry['prompt']] = entry['response']
+
+    def complete(self, messages, timeout, **options):
+        key = _prompt_key(messages)
+        if key not in self.responses:
+            raise LLMError(f"回放文件 {self.path} 中没有该提示词的响应")
+        return self.responses[key]
+
+class RecordingBackend(LLMBackend):
+    """包装其他后端，把成功的响应追加写入回放文件"""
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.name = backend.name
+        self._lock = threading.Lock()
+
+    def complete(self, messages, timeout, **options):
+        text = self.backend.complete(messages, timeout, **options)
+        line = json.dumps({'prompt': _prompt_key(messages), 'response': text}, ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+        except OSError as e:
+            # 记录失败不影响本次调用
+            print(f"⚠️  写入回放文件 {self.path} 失败: {e}")
+        return text
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开；reset 秒后半开，放行一次试探请求，成功则关闭，失败则重新打开"""
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, reset=LLM_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset else 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return
+            if state == 'open' or self._probing:
+                raise CircuitOpenError("大模型服务连续失败，已熔断，请稍后重试")
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release(self):
+        """试探请求因非服务故障结束时，允许下一次试探"""
+        with self._lock:
+            self._probing = False
+
+def _percentile(values, percent):
+    """最近秩百分位数（毫秒）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return round(ordered[index] * 1000, 1)
+
+class LLMClient:
+    """带超时、并发上限、重试、熔断和延迟统计的大模型客户端，线程安全"""
+
+    def __init__(self, backend, timeout=LLM_TIMEOUT, deadline=LLM_DEADLINE, max_concurrency=LLM_MAX_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES, backoff=LLM_RETRY_BACKOFF, breaker=None):
+        self.backend = backend
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'calls': 0, 'succeeded': 0, 'failed': 0, 'timeouts': 0, 'retries': 0,
+                         'rejected': 0, 'in_flight': 0}
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self.counters[name] += delta
+
+    def complete(self, messages, **options):
+        """返回模型输出文本；失败、超时或熔断时抛出 LLMError"""
+        started = time.monotonic()
+        deadline = started + self.deadline
+        self._count('calls')
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self._count('rejected')
+            raise
+        if not self._slots.acquire(timeout=self.deadline):
+            self.breaker.release()
+            self._count('rejected')
+            raise LLMTimeout("等待可用的大模型请求名额超时")
+        self._count('in_flight')
+        failed = True
+        try:
+            text = self._complete_with_retries(messages, deadline, options)
+            failed = False
+        except LLMError as e:
+            if isinstance(e, LLMTimeout):
+                self._count('timeouts')
+            if e.retryable:
+                self.breaker.record_failure()
+            raise
+        finally:
+            self._count('in_flight', -1)
+            self._slots.release()
+            if failed:
+                self._count('failed')
+                # 不可重试的失败或后端未转换的异常不计入熔断，但必须结束试探，否则半开状态会一直拒绝请求
+                self.breaker.release()
+        self.breaker.record_success()
+        with self._lock:
+            self.counters['succeeded'] += 1
+            self._latencies.append(time.monotonic() - started)
+        return text
+
+    def _complete_with_retries(self, messages, deadline, options):
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMTimeout(f"超过整体截止时间（{self.deadline:.1f}秒）")
+            try:
+                return self.backend.complete(messages, timeout=min(self.timeout, remaining), **options)
+            except LLMError as e:
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                # 指数退避 + 全抖动，且不超过剩余时间
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                self._count('retries')
+                time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            latencies = list(self._latencies)
+        return {
+            'backend': self.backend.name,
+            'model': LLM_MODEL,
+            'circuit': self.breaker.state,
+            'consecutive_failures': self.breaker.failures,
+            **counters,
+            'latency_ms': {
+                'count': len(latencies),
+                'p50': _percentile(latencies, 50),
+                'p95': _percentile(latencies, 95),
+                'p99': _percentile(latencies, 99),
+                'max': round(max(latencies) * 1000, 1) if latencies else None,
+            },
+            'config': {
+                'timeout': self.timeout,
+                'deadline': self.deadline,
+                'max_concurrency': self.max_concurrency,
+                'max_retries': self.max_retries,
+                'breaker_threshold': self.breaker.threshold,
+                'breaker_reset': self.breaker.reset,
+            },
+        }
+
+BACKENDS = {
+    'dashscope': DashScopeBackend,
+    'http': HTTPBackend,
+    'replay': ReplayBackend,
+}
+
+def create_backend(name=LLM_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"LLM_BACKEND 只能为 {'/'.join(BACKENDS)}")
+    backend = BACKENDS[name]()
+    if LLM_RECORD_FILE and name != 'replay':
+        backend = RecordingBackend(backend, LLM_RECORD_FILE)
+    return backend
+
+llm_client = LLMClient(create_backend())
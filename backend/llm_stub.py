@@ -0,0 +1,89 @@
+"""
+本地大模型桩服务：OpenAI 兼容的 POST /v1/chat/completions，用于测试和基准（配合 LLM_BACKEND=http）
+响应取自回放文件（按最后一条用户消息匹配），未匹配时返回固定SQL；可模拟延迟和服务端错误
+用法: python llm_stub.py [--port 8001] [--replay llm_replay.jsonl] [--delay 0.2] [--jitter 0.1] [--error-rate 0.1]
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_client import ReplayBackend, _prompt_key
+
+DEFAULT_SQL = "SELECT COUNT(*) AS customer_count FROM customers"
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'LLMStub/1.0'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时断开
+            pass
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'invalid json'}})
+            return
+
+        options = self.server.options
+        time.sleep(max(0.0, options.delay + random.uniform(-options.jitter, options.jitter)))
+        if random.random() < options.error_rate:
+            self._send_json(503, {'error': {'message': 'simulated failure'}})
+            return
+
+        messages = request.get('messages') or []
+        content = self.server.responses.get(_prompt_key(messages), DEFAULT_SQL)
+        self._send_json(200, {
+            'id': f'stub-{time.time_ns()}',
+            'object': 'chat.completion',
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        })
+
+    def log_message(self, format, *args):
+        if not self.server.options.quiet:
+            super().log_message(format, *args)
+
+def make_server(options):
+    server = ThreadingHTTPServer((options.host, options.port), StubHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.responses = ReplayBackend(options.replay).responses if options.replay else {}
+    return server
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='本地大模型桩服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--replay', help='回放文件（JSONL，每行 {"prompt": ..., "response": ...}）')
+    parser.add_argument('--delay', type=float, default=0.0, help='每个请求的延迟秒数')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的随机波动秒数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回503的概率')
+    parser.add_argument('--quiet', action='store_true', help='不输出请求日志')
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    options = parse_args()
+    server = make_server(options)
+    print(f"✅ 大模型桩服务已启动: http://{options.host}:{options.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
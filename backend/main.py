@@ -1,11 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from datetime import date
+import asyncio
+import os
+import threading
 import uvicorn
 
-from database import get_session
-from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance
+from database import get_async_session, get_engine, get_read_engines, start_replica_refresher, add_replica_listener, get_local_replica_path
+from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance, CustomerStats, init_db
 from schemas import (
     CustomerCreate, CustomerUpdate, Customer as CustomerSchema,
     ConsultantCreate, ConsultantUpdate, Consultant as ConsultantSchema,
@@ -13,12 +20,36 @@ from schemas import (
     ConsumptionRecordCreate, ConsumptionRecordUpdate, ConsumptionRecord as ConsumptionRecordSchema,
     WriteOffRecordCreate, WriteOffRecordUpdate, WriteOffRecord as WriteOffRecordSchema,
     UnspentBalanceCreate, UnspentBalanceUpdate, UnspentBalance as UnspentBalanceSchema,
+    CustomerStats as CustomerStatsSchema,
+    CustomerSummary, ConsumptionRecordSummary, WriteOffRecordSummary, UnspentBalanceSummary,
     NaturalLanguageQuery, QueryResult, AnalysisResult
 )
-from text2sql import natural_language_query
+from customer_stats import apply_consumption, apply_write_off, apply_balance
+from rollups import apply_consumption_to_rollups
+from analytics_engine import mark_stale as mark_analytics_stale
+from cache import analysis_cache, invalidate_tables
+from text2sql import natural_language_query_async, open_natural_language_export
+from sql_cache import sql_cache
+from llm_client import llm_client
+from growth import analyze_growth_opportunities_async
+from dashboard import dashboard_stats_async, stats_etag
+from pagination import KeysetPaginator, CursorError
+from projection import Projection, ProjectionError
+from customer_search import filter_customers, index_customers
+from export import (
+    EXPORT_TABLES, EXPORT_FORMATS, table_query, open_export, export_filename,
+    export_table_xlsx, export_analyses_xlsx
+)
+from jobs import job_registry
+from importer import IMPORT_ENTITIES, IMPORT_EXTENSIONS, save_upload, run_import
+from bulk import (
+    BulkPayloadError, read_bulk_payload, bulk_insert, CONSUMPTION_FOREIGN_KEYS, WRITE_OFF_FOREIGN_KEYS,
+    refresh_after_consumption, refresh_after_write_off
+)
 from analysis import (
-    analyze_inactive_customers, analyze_new_customer_reopen, analyze_vip_consumption,
-    analyze_unspent_balance, analyze_department_performance, analyze_product_performance
+    analyze_inactive_customers_async, analyze_new_customer_reopen_async, analyze_vip_consumption_async,
+    analyze_unspent_balance_async, analyze_department_performance_async, analyze_product_performance_async,
+    run_analyses_async
 )
 
 app = FastAPI(
@@ -34,15 +65,132 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# 启动时创建连接池，并输出实际生效的数据库配置
+@app.on_event("startup")
+def init_engine():
+    get_engine()
+    # 建表/补建索引/初始化顾客汇总表（均为幂等操作）
+    init_db()
+    get_read_engines()
+    start_replica_refresher()
+
+# 本地只读副本尚未包含其写入的表：副本落后于主库期间重新计算的结果可能来自旧数据
+_replica_pending_tables = set()
+_replica_pending_lock = threading.Lock()
+
+def data_changed(*tables):
+    """写入提交后使依赖这些表的分析缓存失效，并通知内存分析引擎刷新"""
+    invalidate_tables(*tables)
+    mark_analytics_stale(*tables)
+    if get_local_replica_path():
+        with _replica_pending_lock:
+            _replica_pending_tables.update(tables)
+
+def replica_refreshing():
+    """本地副本开始复制：此前写入的表在新副本生效后再次失效，丢弃期间从旧副本算出的结果"""
+    with _replica_pending_lock:
+        tables = tuple(_replica_pending_tables)
+        _replica_pending_tables.clear()
+    if not tables:
+        return None
+
+    def refreshed():
+        invalidate_tables(*tables)
+        mark_analytics_stale(*tables)
+    return refreshed
+
+add_replica_listener(replica_refreshing)
+
 # 依赖注入
-def get_db():
-    db = get_session()
-    try:
+async def get_db():
+    async with get_async_session() as db:
         yield db
-    finally:
-        db.close()
+
+async def load_customer(db: AsyncSession, customer_id: int):
+    """按ID重新加载顾客（total_consumption 随查询一并计算）"""
+    result = await db.execute(
+        select(Customer)
+        .filter(Customer.customer_id == customer_id)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
+# 列表接口的键集分页（可选排序键均为非空列）
+customer_pages = KeysetPaginator(Customer.customer_id, register_date=Customer.register_date)
+consumption_pages = KeysetPaginator(ConsumptionRecord.record_id, consume_date=ConsumptionRecord.consume_date)
+write_off_pages = KeysetPaginator(WriteOffRecord.write_off_id, write_off_date=WriteOffRecord.write_off_date)
+balance_pages = KeysetPaginator(UnspentBalance.balance_id)
+
+# 列表接口的字段投影（fields= / view=summary）
+customer_fields = Projection(Customer, CustomerSchema, CustomerSummary, python_fields={'last_visit_days': ('last_visit_date',)})
+consumption_fields = Projection(ConsumptionRecord, ConsumptionRecordSchema, ConsumptionRecordSummary)
+write_off_fields = Projection(WriteOffRecord, WriteOffRecordSchema, WriteOffRecordSummary)
+balance_fields = Projection(UnspentBalance, UnspentBalanceSchema, UnspentBalanceSummary)
+
+def list_query(model, projection, paginator, fields, view):
+    """返回 (列表查询, Fieldset)；未指定投影时查询完整ORM对象，Fieldset 为 None"""
+    try:
+        fieldset = projection.fieldset(fields, view)
+    except ProjectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fieldset is None:
+        return select(model), None
+    return fieldset.select(*paginator.sort_columns.values()), fieldset
+
+async def fetch_page(db, response, stmt, paginator, skip, limit, cursor, sort, order, fieldset=None):
+    """传 skip 时沿用偏移分页；否则按游标分页，并在 X-Next-Cursor 响应头返回下一页游标
+    指定了投影字段时直接返回JSON，不经过响应模型"""
+    next_cursor = None
+    if skip:
+        if cursor:
+            raise HTTPException(status_code=400, detail="skip 与 cursor 不能同时使用")
+        result = await db.execute(stmt.offset(skip).limit(limit))
+        rows = result.all() if fieldset else result.scalars().all()
+    else:
+        try:
+            stmt, page = paginator.paginate(stmt, limit, cursor, sort, order)
+        except CursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        result = await db.execute(stmt)
+        rows, next_cursor = page(result.all() if fieldset else result.scalars().all())
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    if fieldset:
+        return JSONResponse(fieldset.render(rows), headers=headers)
+    response.headers.update(headers)
+    return rows
+
+def stream_export(columns, chunks, fmt, name):
+    """以附件形式流式返回导出数据"""
+    media_type, _, render = EXPORT_FORMATS[fmt]
+    return StreamingResponse(
+        render(columns, chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(name, fmt)}"'},
+    )
+
+def check_export_format(fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}")
+
+def file_download(result):
+    """返回生成好的导出文件，发送完成后删除临时文件"""
+    return FileResponse(
+        result['path'],
+        media_type=result['media_type'],
+        filename=result['filename'],
+        background=BackgroundTask(os.remove, result['path']),
+    )
+
+def job_accepted(job):
+    """后台任务已提交，通过 /api/jobs/{job_id} 查询进度"""
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+def parse_analysis_names(names):
+    """逗号分隔的分析项名称"""
+    return [name.strip() for name in names.split(',') if name.strip()] if names else None
 
 # 健康检查
 @app.get("/")
@@ -53,68 +201,228 @@ async def root():
 @app.post("/api/query", response_model=QueryResult)
 async def natural_language_query_api(query: NaturalLanguageQuery):
     """自然语言查询接口"""
-    result = natural_language_query(query.query)
+    result = await natural_language_query_async(query.query)
     return QueryResult(**result)
 
+@app.get("/api/query/export")
+async def export_query(query: str, format: str = "csv"):
+    """流式导出自然语言查询的完整结果（CSV/NDJSON）"""
+    check_export_format(format)
+    loop = asyncio.get_running_loop()
+    try:
+        columns, chunks = await loop.run_in_executor(None, open_natural_language_export, query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return stream_export(columns, chunks, format, "query_result")
+
+@app.get("/api/query/cache/stats")
+async def get_query_cache_stats():
+    """Text2SQL 缓存统计（进程内缓存与持久化缓存）"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, sql_cache.stats)
+
+@app.delete("/api/query/cache")
+async def purge_query_cache(expired_only: bool = False):
+    """清除 Text2SQL 缓存；expired_only=true 时只清除过期条目"""
+    loop = asyncio.get_running_loop()
+    removed = await loop.run_in_executor(None, sql_cache.purge, expired_only)
+    return {"message": "SQL缓存已清除", "removed": removed}
+
+@app.get("/api/llm/metrics")
+async def get_llm_metrics():
+    """大模型客户端统计：调用/失败/超时/重试/熔断次数、熔断状态与延迟分位数"""
+    return llm_client.stats()
+
+# 数据导出API
+@app.get("/api/export/{entity}")
+async def export_entity(entity: str, format: str = "csv", background: bool = False):
+    """导出整张数据表：CSV/NDJSON 流式返回；xlsx 生成Excel文件，background=true 时作为后台任务"""
+    if entity not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"不支持导出: {entity}")
+    loop = asyncio.get_running_loop()
+    if format == "xlsx":
+        if background:
+            return job_accepted(job_registry.submit('export', lambda job: export_table_xlsx(entity, job.advance)))
+        return file_download(await loop.run_in_executor(None, export_table_xlsx, entity))
+    check_export_format(format)
+    columns, chunks = await loop.run_in_executor(None, open_export, table_query(entity))
+    return stream_export(columns, chunks, format, entity)
+
 # 分析API
 @app.get("/api/analysis/inactive-customers")
 async def get_inactive_customers_analysis(months: int = 6):
     """获取不活跃顾客分析"""
-    return analyze_inactive_customers(months)
+    return await analyze_inactive_customers_async(months)
 
 @app.get("/api/analysis/new-customer-reopen")
 async def get_new_customer_reopen_analysis():
     """获取新客二开率分析"""
-    return analyze_new_customer_reopen()
+    return await analyze_new_customer_reopen_async()
 
 @app.get("/api/analysis/vip-consumption")
 async def get_vip_consumption_analysis():
     """获取VIP顾客消费分析"""
-    return analyze_vip_consumption()
+    return await analyze_vip_consumption_async()
 
 @app.get("/api/analysis/unspent-balance")
 async def get_unspent_balance_analysis():
     """获取未划扣余额分析"""
-    return analyze_unspent_balance()
+    return await analyze_unspent_balance_async()
 
 @app.get("/api/analysis/department-performance")
-async def get_department_performance_analysis():
-    """获取科室业绩分析"""
-    return analyze_department_performance()
+async def get_department_performance_analysis(start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """获取科室业绩分析（可选日期范围）"""
+    return await analyze_department_performance_async(start_date, end_date)
 
 @app.get("/api/analysis/product-performance")
-async def get_product_performance_analysis():
-    """获取产品表现分析"""
-    return analyze_product_performance()
+async def get_product_performance_analysis(start_date: Optional[date] = None, end_date: Optional[date] = None):
+    """获取产品表现分析（可选日期范围）"""
+    return await analyze_product_performance_async(start_date, end_date)
+
+@app.get("/api/analysis/growth-opportunities")
+async def get_growth_opportunities():
+    """获取十大增长点分析"""
+    return await analyze_growth_opportunities_async()
+
+@app.get("/api/analysis/all")
+async def get_all_analysis(
+    names: Optional[str] = None,
+    months: int = 6,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """并发获取多个分析结果（names 为逗号分隔的分析项，默认全部），附带各分析耗时"""
+    try:
+        return await run_analyses_async(parse_analysis_names(names), months, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/analysis/export")
+async def export_analysis(
+    names: Optional[str] = None,
+    months: int = 6,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    background: bool = False,
+):
+    """导出分析结果为Excel（摘要表 + 每个分析一个工作表）"""
+    try:
+        analyses = await run_analyses_async(parse_analysis_names(names), months, start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    results, timings = analyses['results'], analyses['timings']
+    if background:
+        return job_accepted(job_registry.submit(
+            'analysis_export', lambda job: export_analyses_xlsx(results, timings, job.advance)
+        ))
+    loop = asyncio.get_running_loop()
+    return file_download(await loop.run_in_executor(None, export_analyses_xlsx, results, timings))
+
+# 数据导入API
+@app.post("/api/import/{entity}")
+async def import_entity(entity: str, file: UploadFile = File(...)):
+    """从Excel/CSV批量导入（后台任务），通过 /api/jobs/{job_id} 查询进度和逐行错误"""
+    if entity not in IMPORT_ENTITIES:
+        raise HTTPException(status_code=404, detail=f"不支持导入: {entity}")
+    if not (file.filename or '').lower().endswith(IMPORT_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"仅支持 {'/'.join(IMPORT_EXTENSIONS)} 文件")
+    loop = asyncio.get_running_loop()
+    path = await loop.run_in_executor(None, save_upload, file.file, file.filename)
+    return job_accepted(job_registry.submit('import', run_import, entity, path, data_changed))
+
+# 后台任务API
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询后台任务状态和进度"""
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/download")
+async def download_job_result(job_id: str):
+    """下载后台导出任务生成的文件"""
+    job = job_registry.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if job.status != 'done' or not isinstance(job.result, dict) or 'path' not in job.result:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成（当前状态: {job.status}）")
+    return FileResponse(job.result['path'], media_type=job.result['media_type'], filename=job.result['filename'])
+
+# 仪表板统计API
+@app.get("/api/stats")
+async def get_stats(request: Request):
+    """各表记录数和金额合计；支持 If-None-Match 条件请求，数据未变化时返回304"""
+    stats = await dashboard_stats_async()
+    etag = stats_etag(stats)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(stats, headers=headers)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """分析结果缓存命中统计"""
+    return analysis_cache.stats()
+
+@app.delete("/api/cache")
+async def clear_cache():
+    """清空分析结果缓存"""
+    analysis_cache.clear()
+    return {"message": "缓存已清空"}
 
 # 顾客管理API
 @app.get("/api/customers", response_model=List[CustomerSchema])
-async def get_customers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """获取顾客列表"""
-    customers = db.query(Customer).offset(skip).limit(limit).all()
-    return customers
+async def get_customers(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    name: Optional[str] = None,
+    phone: Optional[str] = None,
+    membership_level: Optional[str] = None,
+    consultant_id: Optional[int] = None,
+    last_visit_from: Optional[date] = None,
+    last_visit_to: Optional[date] = None,
+    health_tag: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """获取顾客列表（支持 cursor 游标分页；name 为姓名子串，phone 为手机号前缀，health_tag 为健康标签子串；
+    fields 为逗号分隔的返回字段，view=summary 返回精简字段）"""
+    stmt, fieldset = list_query(Customer, customer_fields, customer_pages, fields, view)
+    stmt = filter_customers(
+        stmt, name=name, phone=phone, membership_level=membership_level, consultant_id=consultant_id,
+        last_visit_from=last_visit_from, last_visit_to=last_visit_to, health_tag=health_tag
+    )
+    return await fetch_page(db, response, stmt, customer_pages, skip, limit, cursor, sort, order, fieldset)
 
 @app.get("/api/customers/{customer_id}", response_model=CustomerSchema)
-async def get_customer(customer_id: int, db: Session = Depends(get_db)):
+async def get_customer(customer_id: int, db: AsyncSession = Depends(get_db)):
     """获取单个顾客信息"""
-    customer = db.query(Customer).filter(Customer.customer_id == customer_id).first()
+    customer = await load_customer(db, customer_id)
     if customer is None:
         raise HTTPException(status_code=404, detail="顾客不存在")
     return customer
 
 @app.post("/api/customers", response_model=CustomerSchema)
-async def create_customer(customer: CustomerCreate, db: Session = Depends(get_db)):
+async def create_customer(customer: CustomerCreate, db: AsyncSession = Depends(get_db)):
     """创建新顾客"""
     db_customer = Customer(**customer.dict())
     db.add(db_customer)
-    db.commit()
-    db.refresh(db_customer)
-    return db_customer
+    await db.flush()
+    await db.run_sync(index_customers, [db_customer.customer_id])
+    await db.commit()
+    data_changed('customers')
+    return await load_customer(db, db_customer.customer_id)
 
 @app.put("/api/customers/{customer_id}", response_model=CustomerSchema)
-async def update_customer(customer_id: int, customer: CustomerUpdate, db: Session = Depends(get_db)):
+async def update_customer(customer_id: int, customer: CustomerUpdate, db: AsyncSession = Depends(get_db)):
     """更新顾客信息"""
-    db_customer = db.query(Customer).filter(Customer.customer_id == customer_id).first()
+    db_customer = await db.get(Customer, customer_id)
     if db_customer is None:
         raise HTTPException(status_code=404, detail="顾客不存在")
     
@@ -122,99 +430,187 @@ async def update_customer(customer_id: int, customer: CustomerUpdate, db: Sessio
     for field, value in update_data.items():
         setattr(db_customer, field, value)
     
-    db.commit()
-    db.refresh(db_customer)
-    return db_customer
+    await db.flush()
+    if 'name' in update_data or 'health_tags' in update_data:
+        await db.run_sync(index_customers, [customer_id])
+    await db.commit()
+    data_changed('customers')
+    return await load_customer(db, customer_id)
 
 @app.delete("/api/customers/{customer_id}")
-async def delete_customer(customer_id: int, db: Session = Depends(get_db)):
+async def delete_customer(customer_id: int, db: AsyncSession = Depends(get_db)):
     """删除顾客"""
-    customer = db.query(Customer).filter(Customer.customer_id == customer_id).first()
+    customer = await db.get(Customer, customer_id)
     if customer is None:
         raise HTTPException(status_code=404, detail="顾客不存在")
     
-    db.delete(customer)
-    db.commit()
+    await db.execute(delete(CustomerStats).where(CustomerStats.customer_id == customer_id))
+    await db.delete(customer)
+    await db.flush()
+    await db.run_sync(index_customers, [customer_id])
+    await db.commit()
+    data_changed('customers', 'customer_stats')
     return {"message": "顾客删除成功"}
 
+@app.get("/api/customers/{customer_id}/stats", response_model=CustomerStatsSchema)
+async def get_customer_stats(customer_id: int, db: AsyncSession = Depends(get_db)):
+    """获取顾客汇总数据（累计消费、到店次数、未划扣余额等）"""
+    stats = await db.get(CustomerStats, customer_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="顾客汇总数据不存在")
+    return stats
+
 # 咨询师管理API
 @app.get("/api/consultants", response_model=List[ConsultantSchema])
-async def get_consultants(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_consultants(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     """获取咨询师列表"""
-    consultants = db.query(Consultant).offset(skip).limit(limit).all()
-    return consultants
+    result = await db.execute(select(Consultant).offset(skip).limit(limit))
+    return result.scalars().all()
 
 @app.post("/api/consultants", response_model=ConsultantSchema)
-async def create_consultant(consultant: ConsultantCreate, db: Session = Depends(get_db)):
+async def create_consultant(consultant: ConsultantCreate, db: AsyncSession = Depends(get_db)):
     """创建新咨询师"""
     db_consultant = Consultant(**consultant.dict())
     db.add(db_consultant)
-    db.commit()
-    db.refresh(db_consultant)
+    await db.commit()
+    data_changed('consultants')
+    await db.refresh(db_consultant)
     return db_consultant
 
 # 产品管理API
 @app.get("/api/products", response_model=List[MedicalProductSchema])
-async def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def get_products(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     """获取产品列表"""
-    products = db.query(MedicalProduct).offset(skip).limit(limit).all()
-    return products
+    result = await db.execute(select(MedicalProduct).offset(skip).limit(limit))
+    return result.scalars().all()
 
 @app.post("/api/products", response_model=MedicalProductSchema)
-async def create_product(product: MedicalProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: MedicalProductCreate, db: AsyncSession = Depends(get_db)):
     """创建新产品"""
     db_product = MedicalProduct(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.commit()
+    data_changed('medical_products')
+    await db.refresh(db_product)
     return db_product
 
 # 消费记录管理API
 @app.get("/api/consumption-records", response_model=List[ConsumptionRecordSchema])
-async def get_consumption_records(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """获取消费记录列表"""
-    records = db.query(ConsumptionRecord).offset(skip).limit(limit).all()
-    return records
+async def get_consumption_records(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """获取消费记录列表（支持 cursor 游标分页；fields 为逗号分隔的返回字段，view=summary 返回精简字段）"""
+    stmt, fieldset = list_query(ConsumptionRecord, consumption_fields, consumption_pages, fields, view)
+    return await fetch_page(db, response, stmt, consumption_pages, skip, limit, cursor, sort, order, fieldset)
 
 @app.post("/api/consumption-records", response_model=ConsumptionRecordSchema)
-async def create_consumption_record(record: ConsumptionRecordCreate, db: Session = Depends(get_db)):
+async def create_consumption_record(record: ConsumptionRecordCreate, db: AsyncSession = Depends(get_db)):
     """创建新消费记录"""
     db_record = ConsumptionRecord(**record.dict())
     db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
+    await db.flush()
+    # 与消费记录同一事务更新顾客汇总
+    await db.run_sync(apply_consumption, db_record)
+    await db.run_sync(apply_consumption_to_rollups, db_record)
+    await db.commit()
+    data_changed('consumption_records', 'customer_stats', 'daily_revenue_rollups')
+    await db.refresh(db_record)
     return db_record
 
+@app.post("/api/consumption-records/bulk")
+async def bulk_create_consumption_records(request: Request, db: AsyncSession = Depends(get_db)):
+    """批量创建消费记录（JSON数组或NDJSON），返回逐行错误"""
+    try:
+        items, errors = await read_bulk_payload(request)
+    except BulkPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await bulk_insert(
+        db, items, errors, ConsumptionRecordCreate, ConsumptionRecord,
+        CONSUMPTION_FOREIGN_KEYS, refresh_after_consumption
+    )
+    if result['inserted']:
+        data_changed('consumption_records', 'customer_stats', 'daily_revenue_rollups')
+    return result
+
 # 划扣记录管理API
 @app.get("/api/write-off-records", response_model=List[WriteOffRecordSchema])
-async def get_write_off_records(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """获取划扣记录列表"""
-    records = db.query(WriteOffRecord).offset(skip).limit(limit).all()
-    return records
+async def get_write_off_records(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """获取划扣记录列表（支持 cursor 游标分页；fields 为逗号分隔的返回字段，view=summary 返回精简字段）"""
+    stmt, fieldset = list_query(WriteOffRecord, write_off_fields, write_off_pages, fields, view)
+    return await fetch_page(db, response, stmt, write_off_pages, skip, limit, cursor, sort, order, fieldset)
 
 @app.post("/api/write-off-records", response_model=WriteOffRecordSchema)
-async def create_write_off_record(record: WriteOffRecordCreate, db: Session = Depends(get_db)):
+async def create_write_off_record(record: WriteOffRecordCreate, db: AsyncSession = Depends(get_db)):
     """创建新划扣记录"""
     db_record = WriteOffRecord(**record.dict())
     db.add(db_record)
-    db.commit()
-    db.refresh(db_record)
+    await db.flush()
+    await db.run_sync(apply_write_off, db_record)
+    await db.commit()
+    data_changed('write_off_records', 'customer_stats')
+    await db.refresh(db_record)
     return db_record
 
+@app.post("/api/write-off-records/bulk")
+async def bulk_create_write_off_records(request: Request, db: AsyncSession = Depends(get_db)):
+    """批量创建划扣记录（JSON数组或NDJSON），返回逐行错误"""
+    try:
+        items, errors = await read_bulk_payload(request)
+    except BulkPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await bulk_insert(
+        db, items, errors, WriteOffRecordCreate, WriteOffRecord,
+        WRITE_OFF_FOREIGN_KEYS, refresh_after_write_off
+    )
+    if result['inserted']:
+        data_changed('write_off_records', 'customer_stats')
+    return result
+
 # 未划扣余额管理API
 @app.get("/api/unspent-balances", response_model=List[UnspentBalanceSchema])
-async def get_unspent_balances(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """获取未划扣余额列表"""
-    balances = db.query(UnspentBalance).offset(skip).limit(limit).all()
-    return balances
+async def get_unspent_balances(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """获取未划扣余额列表（支持 cursor 游标分页；fields 为逗号分隔的返回字段，view=summary 返回精简字段）"""
+    stmt, fieldset = list_query(UnspentBalance, balance_fields, balance_pages, fields, view)
+    return await fetch_page(db, response, stmt, balance_pages, skip, limit, cursor, sort, order, fieldset)
 
 @app.post("/api/unspent-balances", response_model=UnspentBalanceSchema)
-async def create_unspent_balance(balance: UnspentBalanceCreate, db: Session = Depends(get_db)):
+async def create_unspent_balance(balance: UnspentBalanceCreate, db: AsyncSession = Depends(get_db)):
     """创建新未划扣余额记录"""
     db_balance = UnspentBalance(**balance.dict())
     db.add(db_balance)
-    db.commit()
-    db.refresh(db_balance)
+    await db.flush()
+    await db.run_sync(apply_balance, db_balance)
+    await db.commit()
+    data_changed('unspent_balances', 'customer_stats')
+    await db.refresh(db_balance)
     return db_balance
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+"""
+数据库迁移：为已有数据库补建索引，并用 EXPLAIN QUERY PLAN 校验分析查询的索引使用情况
+用法: python migrations.py [--check]
+"""
+
+import sys
+from sqlalchemy import event, inspect, text
+
+from database import get_engine, get_session
+from models import Base
+
+# 分析查询中需要避免全表扫描的大表（含汇总表），只允许扫描覆盖索引
+HOT_TABLES = ('customers', 'consumption_records', 'unspent_balances', 'write_off_records',
+              'customer_stats', 'daily_revenue_rollups')
+
+# 已不被任何查询使用的旧索引，升级时删除
+OBSOLETE_INDEXES = {
+    'consumption_records': (
+        'ix_consumption_records_is_new_customer_customer_id',
+        'ix_consumption_records_department_consume_date',
+        'ix_consumption_records_product_id_consume_date',
+    ),
+}
+
+def _existing_index_names(engine, inspector, table_name):
+    """已存在的索引名（SQLite表达式索引无法反射，直接查 sqlite_master）"""
+    if engine.url.get_backend_name() == 'sqlite':
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                {'table': table_name}
+            )
+            return {row[0] for row in rows}
+    return {idx['name'] for idx in inspector.get_indexes(table_name)}
+
+def upgrade_indexes(engine=None):
+    """为已有表补建模型中声明但数据库中缺失的索引，并删除已废弃的索引"""
+    engine = engine or get_engine()
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    created = []
+    dropped = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = _existing_index_names(engine, inspector, table.name)
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            try:
+                index.create(bind=engine)
+                created.append(index.name)
+                print(f"✅ 创建索引 {index.name}")
+            except Exception as e:
+                print(f"⚠️  创建索引 {index.name} 失败: {e}")
+        for name in OBSOLETE_INDEXES.get(table.name, ()):
+            if name not in existing_indexes:
+                continue
+            # MySQL 的 DROP INDEX 需要指定表名
+            on_table = '' if engine.url.get_backend_name() == 'sqlite' else f' ON {table.name}'
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"DROP INDEX {name}{on_table}"))
+                dropped.append(name)
+                print(f"✅ 删除废弃索引 {name}")
+            except Exception as e:
+                print(f"⚠️  删除索引 {name} 失败: {e}")
+
+    if not created and not dropped:
+        print("✅ 索引已是最新")
+    return created
+
+def _analysis_functions():
+    """需要校验的分析函数及其参数"""
+    import analysis
+    return [
+        ('analyze_inactive_customers', analysis.analyze_inactive_customers, {'months': 6}),
+        ('analyze_new_customer_reopen', analysis.analyze_new_customer_reopen, {}),
+        ('analyze_vip_consumption', analysis.analyze_vip_consumption, {}),
+        ('analyze_unspent_balance', analysis.analyze_unspent_balance, {}),
+        ('analyze_department_performance', analysis.analyze_department_performance, {}),
+        ('analyze_product_performance', analysis.analyze_product_performance, {}),
+    ]
+
+def _is_full_scan(detail):
+    """判断执行计划的一步是否为大表全表扫描（扫描表本身，或扫描非覆盖索引后回表）"""
+    words = detail.split()
+    if len(words) < 2 or words[0] != 'SCAN':
+        return False
+    return words[1] in HOT_TABLES and 'COVERING' not in words
+
+def explain_analysis_queries():
+    """运行每个分析函数，捕获其SQL并输出 EXPLAIN QUERY PLAN（仅SQLite）"""
+    engine = get_engine()
+    if engine.url.get_backend_name() != 'sqlite':
+        print("⚠️  EXPLAIN QUERY PLAN 校验仅支持SQLite")
+        return {}
+
+    report = {}
+    for name, analysis_func, kwargs in _analysis_functions():
+        statements = {}
+
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            statements.setdefault(statement, parameters)
+
+        session = get_session()
+        event.listen(engine, "before_cursor_execute", _capture)
+        try:
+            # 绕过结果缓存，保证每次都实际执行SQL
+            getattr(analysis_func, '__wrapped__', analysis_func)(session=session, **kwargs)
+        finally:
+            event.remove(engine, "before_cursor_execute", _capture)
+            session.close()
+
+        plans = []
+        with engine.connect() as conn:
+            for statement, parameters in statements.items():
+                rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+                details = [row[-1] for row in rows]
+                plans.append({
+                    'sql': statement,
+                    'plan': details,
+                    'full_scans': [d for d in details if _is_full_scan(d)],
+                })
+        report[name] = plans
+    return report
+
+def check_index_usage():
+    """校验所有分析查询都走索引（大表只允许覆盖索引扫描），返回是否通过"""
+    report = explain_analysis_queries()
+    ok = True
+    for name, plans in report.items():
+        full_scans = [scan for plan in plans for scan in plan['full_scans']]
+        if full_scans:
+            ok = False
+            print(f"❌ {name}: {'; '.join(full_scans)}")
+        else:
+            print(f"✅ {name}: {len(plans)} 条查询均使用索引")
+        for plan in plans:
+            for detail in plan['plan']:
+                print(f"      {detail}")
+    return ok
+
+if __name__ == "__main__":
+    upgrade_indexes()
+    if '--check' in sys.argv:
+        sys.exit(0 if check_index_usage() else 1)
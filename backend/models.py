@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, Enum, Boolean, ForeignKey, JSON, text
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy import create_engine, Column, Integer, String, Date, Float, Enum, Boolean, ForeignKey, JSON, Index, UniqueConstraint, text, select, func
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker, column_property
 from sqlalchemy.ext.hybrid import hybrid_property
 from database import get_engine
 
@@ -7,6 +7,18 @@ Base = declarative_base()
 
 class Customer(Base):
     __tablename__ = 'customers'
+    __table_args__ = (
+        # 不活跃顾客分析：last_visit_date 范围过滤
+        Index('ix_customers_last_visit_date', 'last_visit_date'),
+        # VIP分析：按会员等级过滤并按最近到店排序
+        Index('ix_customers_membership_level_last_visit_date', 'membership_level', 'last_visit_date'),
+        # 列表按注册日期游标分页（二级索引隐含主键，可直接按 (register_date, customer_id) 定位）
+        Index('ix_customers_register_date', 'register_date'),
+        # 顾客检索：按专属咨询师筛选
+        Index('ix_customers_consultant_id', 'consultant_id'),
+        # Text2SQL 提示词：表的中文名与问题关键词（见 schema_prompt.py）
+        {'info': {'label': '顾客', 'keywords': ('顾客', '会员', '到店', '注册', '电话', '手机', '健康', '过敏')}},
+    )
     
     customer_id = Column(Integer, primary_key=True, autoincrement=True, comment='顾客编号')
     name = Column(String(100), nullable=False, comment='顾客姓名')
@@ -23,10 +35,6 @@ class Customer(Base):
     balances = relationship("UnspentBalance", back_populates="customer")
     consultant = relationship("Consultant", back_populates="customers")
     
-    @hybrid_property
-    def total_consumption(self):
-        return sum([c.amount for c in self.consumptions])
-    
     @hybrid_property
     def last_visit_days(self):
         from datetime import date
@@ -34,6 +42,7 @@ class Customer(Base):
 
 class Consultant(Base):
     __tablename__ = 'consultants'
+    __table_args__ = {'info': {'label': '咨询师', 'keywords': ('咨询师', '医生', '专家')}}
     
     consultant_id = Column(Integer, primary_key=True, autoincrement=True, comment='咨询师编号')
     name = Column(String(50), nullable=False, comment='咨询师姓名')
@@ -46,6 +55,7 @@ class Consultant(Base):
 
 class MedicalProduct(Base):
     __tablename__ = 'medical_products'
+    __table_args__ = {'info': {'label': '医疗产品', 'keywords': ('产品', '价格', '单价', '定价')}}
     
     product_id = Column(Integer, primary_key=True, autoincrement=True, comment='品项编号')
     product_name = Column(String(100), nullable=False, comment='品项名称')
@@ -60,6 +70,15 @@ class MedicalProduct(Base):
 
 class ConsumptionRecord(Base):
     __tablename__ = 'consumption_records'
+    __table_args__ = (
+        # 单个顾客的消费汇总（覆盖 amount，避免回表）；科室/产品分析改由日汇总表计算，不再为其建索引
+        Index('ix_consumption_records_customer_id_consume_date', 'customer_id', 'consume_date', 'amount'),
+        # 按日期范围重算日汇总、列表按消费日期游标分页
+        Index('ix_consumption_records_consume_date', 'consume_date'),
+        {'info': {'label': '消费记录', 'keywords': (
+            '消费', '购买', '业绩', '收入', '营业额', '营收', '销售', '支付', '付款', '新客', '老客', '二开', '复购', '活动', '营销'
+        )}},
+    )
     
     record_id = Column(Integer, primary_key=True, autoincrement=True, comment='记录ID')
     customer_id = Column(Integer, ForeignKey('customers.customer_id'), nullable=False, comment='顾客编号')
@@ -81,6 +100,13 @@ class ConsumptionRecord(Base):
 
 class WriteOffRecord(Base):
     __tablename__ = 'write_off_records'
+    __table_args__ = (
+        Index('ix_write_off_records_customer_id_write_off_date', 'customer_id', 'write_off_date'),
+        Index('ix_write_off_records_consume_record_id', 'consume_record_id'),
+        # 列表按划扣日期游标分页
+        Index('ix_write_off_records_write_off_date', 'write_off_date'),
+        {'info': {'label': '划扣记录', 'keywords': ('划扣', '消耗', '套餐')}},
+    )
     
     write_off_id = Column(Integer, primary_key=True, autoincrement=True, comment='划扣ID')
     customer_id = Column(Integer, ForeignKey('customers.customer_id'), nullable=False, comment='顾客编号')
@@ -101,6 +127,11 @@ class WriteOffRecord(Base):
 
 class UnspentBalance(Base):
     __tablename__ = 'unspent_balances'
+    __table_args__ = (
+        Index('ix_unspent_balances_customer_id_product_id', 'customer_id', 'product_id'),
+        Index('ix_unspent_balances_product_id', 'product_id'),
+        {'info': {'label': '未划扣余额', 'keywords': ('余额', '剩余', '有效期', '过期')}},
+    )
     
     balance_id = Column(Integer, primary_key=True, autoincrement=True, comment='余额ID')
     customer_id = Column(Integer, ForeignKey('customers.customer_id'), nullable=False, comment='顾客编号')
@@ -119,8 +150,84 @@ class UnspentBalance(Base):
     customer = relationship("Customer", back_populates="balances")
     product = relationship("MedicalProduct", back_populates="balances")
 
+# 高余额分析按 remaining_amount 过滤和排序，使用表达式索引（SQLite）
+Index(
+    'ix_unspent_balances_remaining_amount',
+    UnspentBalance.total_amount - UnspentBalance.spent_amount
+).ddl_if(dialect='sqlite')
+
+class CustomerStats(Base):
+    """顾客汇总表：在写入消费/划扣记录和未划扣余额时维护，可通过 customer_stats.rebuild_customer_stats 批量重建"""
+    __tablename__ = 'customer_stats'
+    __table_args__ = (
+        # 消费最高的前N位顾客：按索引倒序取前N行
+        Index('ix_customer_stats_total_consumption', 'total_consumption'),
+        # 新客二开率：只读新客范围内的索引条目，一次统计新客数和二开数
+        Index('ix_customer_stats_new_visit_count_returning_visit_count', 'new_visit_count', 'returning_visit_count'),
+        # 汇总表不提供给 Text2SQL
+        {'info': {'text2sql': False}},
+    )
+    
+    customer_id = Column(Integer, ForeignKey('customers.customer_id'), primary_key=True, comment='顾客编号')
+    total_consumption = Column(Float, nullable=False, default=0, comment='累计消费金额')
+    visit_count = Column(Integer, nullable=False, default=0, comment='消费次数')
+    new_visit_count = Column(Integer, nullable=False, default=0, comment='新客消费次数')
+    returning_visit_count = Column(Integer, nullable=False, default=0, comment='老客消费次数')
+    first_consume_date = Column(Date, comment='首次消费日期')
+    last_consume_date = Column(Date, comment='最近消费日期')
+    total_write_off = Column(Float, nullable=False, default=0, comment='累计划扣金额')
+    outstanding_balance = Column(Float, nullable=False, default=0, comment='未划扣余额')
+    
+    # 新客且已二次消费（二开）
+    @hybrid_property
+    def is_returning(self):
+        return (self.new_visit_count > 0) & (self.returning_visit_count > 0)
+
+class DailyRevenueRollup(Base):
+    """日汇总表：按 日期×科室×品项×咨询师×支付方式 汇总消费记录，由 rollups.py 维护"""
+    __tablename__ = 'daily_revenue_rollups'
+    __table_args__ = (
+        UniqueConstraint('rollup_date', 'department', 'product_id', 'consultant_id', 'payment_method',
+                         name='uq_daily_revenue_rollups_grain'),
+        # 科室业绩、产品表现：按科室/品项顺序扫描覆盖索引分组汇总，不回表、不建临时B树
+        Index('ix_daily_revenue_rollups_department_rollup_date', 'department', 'rollup_date', 'record_count', 'total_amount'),
+        Index('ix_daily_revenue_rollups_product_id_rollup_date', 'product_id', 'rollup_date', 'record_count', 'total_amount'),
+        {'info': {'text2sql': False}},
+    )
+    
+    rollup_id = Column(Integer, primary_key=True, autoincrement=True, comment='汇总ID')
+    rollup_date = Column(Date, nullable=False, comment='消费日期')
+    department = Column(Enum('皮肤科', '无创科', '整形外科', '综合'), nullable=False, comment='科室分类')
+    product_id = Column(Integer, ForeignKey('medical_products.product_id'), nullable=False, comment='品项编号')
+    consultant_id = Column(Integer, ForeignKey('consultants.consultant_id'), nullable=False, comment='所属咨询')
+    payment_method = Column(String(10), nullable=False, comment='支付方式')
+    record_count = Column(Integer, nullable=False, default=0, comment='消费笔数')
+    total_amount = Column(Float, nullable=False, default=0, comment='消费金额合计')
+    total_quantity = Column(Integer, nullable=False, default=0, comment='购买数量合计')
+
+# 顾客累计消费：从汇总表按主键取值，随顾客查询一起计算，
+# 不再逐个加载顾客的全部消费记录
+Customer.total_consumption = column_property(
+    func.coalesce(
+        select(CustomerStats.total_consumption)
+        .where(CustomerStats.customer_id == Customer.customer_id)
+        .correlate_except(CustomerStats)
+        .scalar_subquery(),
+        0
+    )
+)
+
 def init_db():
     """初始化数据库"""
+    from migrations import upgrade_indexes
+    from customer_stats import ensure_customer_stats
+    from rollups import ensure_daily_rollups
+    from customer_search import ensure_customer_search
     engine = get_engine()
     Base.metadata.create_all(engine)
+    # create_all 不会为已存在的表补建索引
+    upgrade_indexes(engine)
+    ensure_customer_stats()
+    ensure_daily_rollups()
+    ensure_customer_search()
     print("数据库初始化完成！") 
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""
+键集（游标）分页：按 (排序键, 主键) 定位下一页，深分页与首页开销相同
+游标为 base64 编码的不透明字符串，包含排序键、方向及上一页最后一行的键值
+"""
+
+import base64
+import json
+from datetime import date
+from sqlalchemy import and_, or_
+
+class CursorError(ValueError):
+    """游标或排序参数无效"""
+
+def encode_cursor(sort, order, values):
+    payload = json.dumps(
+        {'s': sort, 'o': order, 'v': values},
+        default=lambda value: value.isoformat() if isinstance(value, date) else str(value),
+        separators=(',', ':'),
+    )
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """返回 (排序键, 方向, 键值列表)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return payload['s'], payload['o'], list(payload['v'])
+    except (ValueError, KeyError, TypeError):
+        raise CursorError("无效的分页游标")
+
+def _from_json(column, value):
+    """将游标中的键值还原为列对应的Python类型"""
+    if value is not None and column.type.python_type is date and isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+class KeysetPaginator:
+    """按 (排序键, 主键) 分页；排序键需为非空列"""
+
+    def __init__(self, pk_column, **sort_columns):
+        self.pk_column = pk_column
+        self.sort_columns = {pk_column.key: pk_column, **sort_columns}
+
+    def _resolve(self, cursor, sort, order):
+        if order is not None and order not in ('asc', 'desc'):
+            raise CursorError("order 只能为 asc 或 desc")
+        if sort is not None and sort not in self.sort_columns:
+            raise CursorError(f"不支持的排序字段: {sort}，可选: {', '.join(self.sort_columns)}")
+        if not cursor:
+            return sort or self.pk_column.key, order or 'asc', None
+
+        cursor_sort, cursor_order, values = decode_cursor(cursor)
+        if cursor_sort not in self.sort_columns or cursor_order not in ('asc', 'desc'):
+            raise CursorError("无效的分页游标")
+        if (sort is not None and sort != cursor_sort) or (order is not None and order != cursor_order):
+            raise CursorError("分页游标与排序参数不一致")
+        expected = 1 if self.sort_columns[cursor_sort] is self.pk_column else 2
+        if len(values) != expected:
+            raise CursorError("无效的分页游标")
+        return cursor_sort, cursor_order, values
+
+    def paginate(self, stmt, limit, cursor=None, sort=None, order=None):
+        """返回 (分页查询, page)；page(rows) 返回 (本页数据, 下一页游标或None)"""
+        if limit < 1:
+            raise CursorError("limit 必须大于0")
+        sort, order, after = self._resolve(cursor, sort, order)
+        column = self.sort_columns[sort]
+        pk = self.pk_column
+        descending = order == 'desc'
+
+        def beyond(col, value):
+            return col < value if descending else col > value
+
+        if after is not None:
+            if column is pk:
+                stmt = stmt.where(beyond(pk, after[0]))
+            else:
+                sort_value = _from_json(column, after[0])
+                stmt = stmt.where(or_(
+                    beyond(column, sort_value),
+                    and_(column == sort_value, beyond(pk, after[1])),
+                ))
+
+        keys = [column] if column is pk else [column, pk]
+        stmt = stmt.order_by(*[key.desc() if descending else key.asc() for key in keys])
+        # 多取一行判断是否还有下一页
+        stmt = stmt.limit(limit + 1)
+
+        def page(rows):
+            rows = list(rows)
+            if len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, encode_cursor(sort, order, [getattr(last, key.key) for key in keys])
+
+        return stmt, page
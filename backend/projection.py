@@ -0,0 +1,89 @@
+"""
+列表字段投影：fields= 指定返回字段，或 view=summary 使用精简字段
+只查询所需的列（不加载ORM对象、不计算未请求的字段），结果按完整响应模型中对应字段的类型序列化，
+与完整对象的JSON表示一致（如金额为字符串、日期为ISO格式）
+"""
+
+from typing import List
+
+from pydantic import TypeAdapter, create_model
+from sqlalchemy import select
+
+VIEWS = ('full', 'summary')
+
+class ProjectionError(ValueError):
+    """fields 或 view 参数无效"""
+
+class Projection:
+    """一个列表接口可投影的字段：可选字段取自完整响应模型，精简字段取自 summary 模型
+    python_fields 为无法用SQL表达、需由依赖列在Python中计算的混合属性，值为依赖的列名"""
+
+    def __init__(self, model, schema, summary, python_fields=None):
+        self.model = model
+        self.schema = schema
+        self.fields = list(schema.model_fields)
+        self.summary = list(summary.model_fields)
+        self.python_fields = python_fields or {}
+        self._adapters = {}
+
+    def adapter(self, names):
+        """只含指定字段（类型取自完整响应模型）的行列表序列化器，按字段组合缓存"""
+        key = tuple(names)
+        adapter = self._adapters.get(key)
+        if adapter is None:
+            row_model = create_model(
+                f'{self.schema.__name__}Projection',
+                **{name: (self.schema.model_fields[name].annotation, None) for name in names},
+            )
+            adapter = self._adapters[key] = TypeAdapter(List[row_model])
+        return adapter
+
+    def fieldset(self, fields=None, view=None):
+        """解析请求参数，返回 Fieldset；未指定投影时返回 None（返回完整对象）"""
+        if view is not None and view not in VIEWS:
+            raise ProjectionError(f"view 只能为 {'/'.join(VIEWS)}")
+        if fields:
+            names = list(dict.fromkeys(name.strip() for name in fields.split(',') if name.strip()))
+            unknown = [name for name in names if name not in self.fields]
+            if unknown:
+                raise ProjectionError(f"不支持的字段: {', '.join(unknown)}，可选: {', '.join(self.fields)}")
+            if names:
+                return Fieldset(self, names)
+        if view == 'summary':
+            return Fieldset(self, self.summary)
+        return None
+
+class Fieldset:
+    """一次请求实际查询和返回的字段"""
+
+    def __init__(self, projection, names):
+        self.projection = projection
+        self.names = names
+
+    def select(self, *key_columns):
+        """只选择所需列的查询；key_columns（分页用的主键、排序键）始终查询但仅在请求时返回"""
+        model = self.projection.model
+        columns = {}
+        for name in self.names:
+            if name in self.projection.python_fields:
+                for dependency in self.projection.python_fields[name]:
+                    columns.setdefault(dependency, getattr(model, dependency))
+            else:
+                columns[name] = getattr(model, name)
+        for column in key_columns:
+            columns.setdefault(column.key, column)
+        return select(*[expr.label(name) for name, expr in columns.items()])
+
+    def render(self, rows):
+        """行 -> 可直接序列化的字典列表（字段顺序与请求一致，取值与完整响应的JSON表示一致）"""
+        model = self.projection.model
+        computed = {
+            name: model.__mapper__.all_orm_descriptors[name].fget
+            for name in self.names if name in self.projection.python_fields
+        }
+        values = [
+            {name: computed[name](row) if name in computed else getattr(row, name) for name in self.names}
+            for row in rows
+        ]
+        adapter = self.projection.adapter(self.names)
+        return adapter.dump_python(adapter.validate_python(values), mode='json')
@@ -0,0 +1,118 @@
+"""
+日汇总表维护：按 日期×科室×品项×咨询师×支付方式 汇总消费记录
+写入消费记录时增量更新；新的日期通过 refresh_daily_rollups 补齐
+用法: python rollups.py [--full]
+"""
+
+import sys
+from sqlalchemy import select, insert, update, delete, func, and_
+
+from database import get_session
+from models import ConsumptionRecord, DailyRevenueRollup
+
+# 支付方式为空的记录在汇总表中的取值
+UNKNOWN_PAYMENT_METHOD = '未知'
+
+def _payment_method(value):
+    return value or UNKNOWN_PAYMENT_METHOD
+
+def apply_consumption_to_rollups(session, record):
+    """消费记录写入后增量更新对应的日汇总行（需在同一事务中、记录flush之后调用）"""
+    quantity = record.quantity if record.quantity is not None else 1
+    result = session.execute(
+        update(DailyRevenueRollup)
+        .where(and_(
+            DailyRevenueRollup.rollup_date == record.consume_date,
+            DailyRevenueRollup.department == record.department,
+            DailyRevenueRollup.product_id == record.product_id,
+            DailyRevenueRollup.consultant_id == record.consultant_id,
+            DailyRevenueRollup.payment_method == _payment_method(record.payment_method),
+        ))
+        .values(
+            record_count=DailyRevenueRollup.record_count + 1,
+            total_amount=DailyRevenueRollup.total_amount + float(record.amount),
+            total_quantity=DailyRevenueRollup.total_quantity + quantity,
+        )
+    )
+    # 该日尚无对应汇总行时从明细重算当天（已包含本条记录）
+    if result.rowcount == 0:
+        refresh_daily_rollups(session, record.consume_date, record.consume_date)
+
+def refresh_daily_rollups(session, start_date=None, end_date=None, days=None):
+    """重算 [start_date, end_date] 范围内（或 days 指定日期）的日汇总（不提交事务）
+
+    start_date 与 days 均为空时从已汇总的最后一天开始（最后一天可能只汇总了一部分），
+    汇总表为空时全量计算。返回重算的天数。
+    """
+    if start_date is None and days is None:
+        start_date = session.query(func.max(DailyRevenueRollup.rollup_date)).scalar()
+
+    payment_method = func.coalesce(ConsumptionRecord.payment_method, UNKNOWN_PAYMENT_METHOD)
+    rows = select(
+        ConsumptionRecord.consume_date,
+        ConsumptionRecord.department,
+        ConsumptionRecord.product_id,
+        ConsumptionRecord.consultant_id,
+        payment_method,
+        func.count(ConsumptionRecord.record_id),
+        func.sum(ConsumptionRecord.amount),
+        func.sum(func.coalesce(ConsumptionRecord.quantity, 1)),
+    ).group_by(
+        ConsumptionRecord.consume_date,
+        ConsumptionRecord.department,
+        ConsumptionRecord.product_id,
+        ConsumptionRecord.consultant_id,
+        payment_method,
+    )
+    rollup_delete = delete(DailyRevenueRollup)
+    day_count = select(func.count(func.distinct(ConsumptionRecord.consume_date)))
+    if start_date is not None:
+        rows = rows.where(ConsumptionRecord.consume_date >= start_date)
+        rollup_delete = rollup_delete.where(DailyRevenueRollup.rollup_date >= start_date)
+        day_count = day_count.where(ConsumptionRecord.consume_date >= start_date)
+    if end_date is not None:
+        rows = rows.where(ConsumptionRecord.consume_date <= end_date)
+        rollup_delete = rollup_delete.where(DailyRevenueRollup.rollup_date <= end_date)
+        day_count = day_count.where(ConsumptionRecord.consume_date <= end_date)
+    if days is not None:
+        days = list(days)
+        rows = rows.where(ConsumptionRecord.consume_date.in_(days))
+        rollup_delete = rollup_delete.where(DailyRevenueRollup.rollup_date.in_(days))
+        day_count = day_count.where(ConsumptionRecord.consume_date.in_(days))
+
+    session.execute(rollup_delete)
+    session.execute(insert(DailyRevenueRollup).from_select([
+        DailyRevenueRollup.rollup_date,
+        DailyRevenueRollup.department,
+        DailyRevenueRollup.product_id,
+        DailyRevenueRollup.consultant_id,
+        DailyRevenueRollup.payment_method,
+        DailyRevenueRollup.record_count,
+        DailyRevenueRollup.total_amount,
+        DailyRevenueRollup.total_quantity,
+    ], rows))
+    return session.execute(day_count).scalar()
+
+def ensure_daily_rollups():
+    """补齐汇总表中缺少的新日期"""
+    session = get_session()
+    try:
+        last_rolled = session.query(func.max(DailyRevenueRollup.rollup_date)).scalar()
+        last_consumed = session.query(func.max(ConsumptionRecord.consume_date)).scalar()
+        if last_consumed is not None and (last_rolled is None or last_consumed > last_rolled):
+            days = refresh_daily_rollups(session)
+            session.commit()
+            print(f"✅ 日汇总表已刷新 {days} 天")
+    finally:
+        session.close()
+
+if __name__ == "__main__":
+    session = get_session()
+    try:
+        if '--full' in sys.argv:
+            session.execute(delete(DailyRevenueRollup))
+        days = refresh_daily_rollups(session)
+        session.commit()
+        print(f"✅ 日汇总表已刷新 {days} 天")
+    finally:
+        session.close()
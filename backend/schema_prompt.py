@@ -0,0 +1,136 @@
+"""
+Text2SQL 表结构提示词：启动时由 Base.metadata 生成（字段类型、枚举取值、注释、外键关系、可用SQL表达的计算字段），
+与模型定义始终一致；每个问题只带入与之相关的表，减少提示词长度
+表的中文名和问题关键词取自表的 info（label / keywords），info 中 text2sql 为 False 的表（汇总表等）不提供给大模型
+"""
+
+import hashlib
+from collections import deque
+
+from sqlalchemy import Enum
+from sqlalchemy.ext.hybrid import hybrid_property
+
+from sql_similarity import canonical_question
+
+def _column_line(column):
+    """字段说明：名称 类型 [主键/外键] 注释"""
+    if isinstance(column.type, Enum):
+        type_text = '枚举(' + ', '.join(f"'{value}'" for value in column.type.enums) + ')'
+    else:
+        type_text = str(column.type)
+    notes = []
+    if column.primary_key:
+        notes.append('主键')
+    for fk in column.foreign_keys:
+        notes.append(f'外键 -> {fk.target_fullname}')
+    if column.comment:
+        notes.append(column.comment)
+    return f"  - {column.name} {type_text}" + (f"，{'，'.join(notes)}" if notes else '')
+
+class SchemaPrompt:
+    """由元数据生成的表结构说明；tables 为提供给大模型的表（声明顺序）"""
+
+    def __init__(self, base):
+        metadata = base.metadata
+        self.tables = [table for table in metadata.tables.values() if table.info.get('text2sql', True)]
+        names = {table.name for table in self.tables}
+        computed = self._computed_fields(base)
+
+        self.docs = {}
+        self.keywords = {}
+        self._rendered = {}
+        for table in self.tables:
+            label = table.info.get('label')
+            lines = [f"表: {table.name}" + (f"（{label}）" if label else ''), "字段:"]
+            lines.extend(_column_line(column) for column in table.columns)
+            for name, expression in computed.get(table.name, []):
+                lines.append(f"  - {name} = {expression}（计算字段，不是数据库列，查询时直接写表达式）")
+            self.docs[table.name] = '\n'.join(lines)
+            self.keywords[table.name] = tuple(table.info.get('keywords', ()))
+
+        # 外键关系（只保留提供给大模型的表之间的关系），以及用于补齐关联路径的邻接表
+        self.relations = []
+        self.neighbors = {name: set() for name in names}
+        for table in self.tables:
+            for fk in table.foreign_keys:
+                target = fk.column.table.name
+                if target not in names:
+                    continue
+                self.relations.append((table.name, target, f"{table.name}.{fk.parent.name} -> {fk.target_fullname}（多对一）"))
+                self.neighbors[table.name].add(target)
+                self.neighbors[target].add(table.name)
+
+        self.full = self.render(tuple(table.name for table in self.tables))
+        # 表结构与关键词的版本标识，任一变化后依赖它的缓存失效
+        fingerprint = self.full + repr(sorted(self.keywords.items()))
+        self.hash = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _computed_fields(base):
+        """表名 -> [(字段名, SQL表达式)]；只在Python中计算的混合属性（无法生成SQL）跳过"""
+        computed = {}
+        for mapper in base.registry.mappers:
+            for name, descriptor in mapper.all_orm_descriptors.items():
+                if not isinstance(descriptor, hybrid_property):
+                    continue
+                try:
+                    expression = getattr(mapper.class_, name).expression
+                    sql = str(expression.compile(compile_kwargs={'literal_binds': True}))
+                except Exception:
+                    continue
+                sql = sql.replace(f"{mapper.local_table.name}.", '')
+                computed.setdefault(mapper.local_table.name, []).append((name, sql))
+        return computed
+
+    def render(self, table_names):
+        """指定表的结构说明及其间的外键关系（按表组合缓存）"""
+        prompt = self._rendered.get(table_names)
+        if prompt is None:
+            selected = set(table_names)
+            parts = [self.docs[table.name] for table in self.tables if table.name in selected]
+            relations = [text for source, target, text in self.relations if source in selected and target in selected]
+            if relations:
+                parts.append("关系说明:\n" + '\n'.join(f"  - {text}" for text in relations))
+            prompt = self._rendered[table_names] = '\n\n'.join(parts)
+        return prompt
+
+    def _connect(self, selected):
+        """补齐选中表之间的外键关联路径（逐个以最短路径连接到已选集合）"""
+        ordered = [table.name for table in self.tables if table.name in selected]
+        connected = {ordered[0]}
+        for name in ordered[1:]:
+            if name in connected:
+                continue
+            # 从已连接集合出发广度优先搜索到 name 的最短路径
+            previous = {start: None for start in connected}
+            queue = deque(connected)
+            while queue:
+                current = queue.popleft()
+                if current == name:
+                    break
+                for neighbor in sorted(self.neighbors[current]):
+                    if neighbor not in previous:
+                        previous[neighbor] = current
+                        queue.append(neighbor)
+            if name not in previous:
+                connected.add(name)
+                continue
+            node = name
+            while node is not None:
+                connected.add(node)
+                node = previous[node]
+        return connected
+
+    def select_tables(self, question, literal_tables=()):
+        """问题涉及的表：命中关键词或字面值（枚举值、产品名等）的表，及其间的关联表；都未命中时返回全部表"""
+        text = canonical_question(question)
+        selected = {name for name, words in self.keywords.items() if any(word in text for word in words)}
+        selected.update(name for name in literal_tables if name in self.docs)
+        if not selected:
+            return tuple(table.name for table in self.tables)
+        connected = self._connect(selected)
+        return tuple(table.name for table in self.tables if table.name in connected)
+
+    def for_question(self, question, literal_tables=()):
+        """问题对应的表结构提示词"""
+        return self.render(self.select_tables(question, literal_tables))
@@ -32,6 +32,30 @@ class Customer(CustomerBase):
     class Config:
         from_attributes = True
 
+# 列表精简字段（view=summary），不含健康标签和需要额外计算的字段
+class CustomerSummary(BaseModel):
+    customer_id: int
+    name: str
+    phone: str
+    membership_level: str
+    consultant_id: int
+    last_visit_date: Optional[date] = None
+
+class CustomerStats(BaseModel):
+    customer_id: int
+    total_consumption: Decimal = Field(0, description="累计消费金额")
+    visit_count: int = Field(0, description="消费次数")
+    new_visit_count: int = Field(0, description="新客消费次数")
+    returning_visit_count: int = Field(0, description="老客消费次数")
+    first_consume_date: Optional[date] = Field(None, description="首次消费日期")
+    last_consume_date: Optional[date] = Field(None, description="最近消费日期")
+    total_write_off: Decimal = Field(0, description="累计划扣金额")
+    outstanding_balance: Decimal = Field(0, description="未划扣余额")
+    is_returning: bool = Field(False, description="是否二开")
+    
+    class Config:
+        from_attributes = True
+
 # 咨询师模型
 class ConsultantBase(BaseModel):
     name: str = Field(..., description="咨询师姓名")
@@ -105,6 +129,16 @@ class ConsumptionRecord(ConsumptionRecordBase):
     class Config:
         from_attributes = True
 
+class ConsumptionRecordSummary(BaseModel):
+    record_id: int
+    customer_id: int
+    consume_date: date
+    amount: Decimal
+    department: str
+    product_id: int
+    is_new_customer: bool
+    payment_method: str
+
 # 划扣记录模型
 class WriteOffRecordBase(BaseModel):
     customer_id: int = Field(..., description="顾客编号")
@@ -135,6 +169,15 @@ class WriteOffRecord(WriteOffRecordBase):
     class Config:
         from_attributes = True
 
+class WriteOffRecordSummary(BaseModel):
+    write_off_id: int
+    customer_id: int
+    write_off_date: date
+    amount: Decimal
+    department: str
+    product_id: int
+    write_off_type: str
+
 # 未划扣余额模型
 class UnspentBalanceBase(BaseModel):
     customer_id: int = Field(..., description="顾客编号")
@@ -160,6 +203,14 @@ class UnspentBalance(UnspentBalanceBase):
     class Config:
         from_attributes = True
 
+class UnspentBalanceSummary(BaseModel):
+    balance_id: int
+    customer_id: int
+    product_id: int
+    total_amount: Decimal
+    spent_amount: Decimal
+    remaining_amount: Optional[Decimal] = None
+
 # 分析结果模型
 class AnalysisResult(BaseModel):
     title: str
@@ -176,4 +227,8 @@ class QueryResult(BaseModel):
     success: bool
     data: Optional[List[Dict[str, Any]]] = None
     error: Optional[str] = None
-    sql: Optional[str] = None 
\ No newline at end of file
+    sql: Optional[str] = None
+    source: Optional[str] = Field(None, description="SQL来源: rule（规则意图）/ llm（大模型生成）/ cache（缓存命中）/ similar（复用相似问题的SQL）")
+    match_score: Optional[float] = Field(None, description="复用SQL时与已回答问题的相似度")
+    intent: Optional[str] = Field(None, description="命中的规则意图")
+    params: Optional[Dict[str, Any]] = Field(None, description="规则意图SQL的绑定参数")
\ No newline at end of file
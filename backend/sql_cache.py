@@ -0,0 +1,145 @@
+"""
+Text2SQL 缓存：规范化后的问题 + 表结构提示词哈希 -> 生成的SQL
+一级为进程内 TTL+LRU 缓存，二级为持久化的SQLite表（重启后仍可命中）；均有过期时间，可手动清除
+表结构或提示词变化后哈希随之变化，旧条目不再命中，过期后被清除
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from cache import TTLCache
+
+# 持久化缓存文件，默认位于项目根目录
+TEXT2SQL_CACHE_DB = os.getenv(
+    'TEXT2SQL_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'text2sql_cache.db')
+)
+# 缓存条目过期秒数（默认7天）与进程内缓存最大条目数
+TEXT2SQL_CACHE_TTL = int(os.getenv('TEXT2SQL_CACHE_TTL', str(7 * 24 * 3600)))
+TEXT2SQL_CACHE_SIZE = int(os.getenv('TEXT2SQL_CACHE_SIZE', '1024'))
+
+# 问题末尾可忽略的标点
+TRAILING_PUNCTUATION = '?？。.!！;；,，'
+
+def normalize_question(question):
+    """规范化问题：全角转半角、小写、去掉空白和句末标点"""
+    text = unicodedata.normalize('NFKC', question or '').lower()
+    text = re.sub(r'\s+', '', text)
+    return text.rstrip(TRAILING_PUNCTUATION)
+
+class SQLCache:
+    """两级SQL缓存，线程安全"""
+
+    def __init__(self, path=TEXT2SQL_CACHE_DB, ttl=TEXT2SQL_CACHE_TTL, maxsize=TEXT2SQL_CACHE_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._conn = None
+        self._lock = threading.Lock()
+        self.persistent_hits = 0
+        self.misses = 0
+        # 每次清除后递增，依赖缓存内容的索引据此重建
+        self.version = 0
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS text2sql_cache (
+                    question TEXT NOT NULL,
+                    schema_hash TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    original_question TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_hit_at REAL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (question, schema_hash)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, question, schema_hash):
+        """返回缓存的SQL，未命中或已过期时返回 None"""
+        key = (normalize_question(question), schema_hash)
+        found, sql = self.memory.get(key)
+        if found:
+            return sql
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT sql FROM text2sql_cache WHERE question = ? AND schema_hash = ? AND created_at > ?",
+                (key[0], schema_hash, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute(
+                "UPDATE text2sql_cache SET hits = hits + 1, last_hit_at = ? WHERE question = ? AND schema_hash = ?",
+                (now, key[0], schema_hash)
+            )
+            conn.commit()
+            self.persistent_hits += 1
+        self.memory.set(key, row[0])
+        return row[0]
+
+    def set(self, question, schema_hash, sql):
+        """写入两级缓存（应只缓存执行成功的SQL）"""
+        key = (normalize_question(question), schema_hash)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                """INSERT OR REPLACE INTO text2sql_cache (question, schema_hash, sql, original_question, created_at, hits)
+                   VALUES (?, ?, ?, ?, ?, 0)""",
+                (key[0], schema_hash, sql, question, time.time())
+            )
+            conn.commit()
+        self.memory.set(key, sql)
+
+    def entries(self, schema_hash):
+        """未过期的条目 [(原问题, SQL, 写入时间)]"""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT original_question, sql, created_at FROM text2sql_cache WHERE schema_hash = ? AND created_at > ?",
+                (schema_hash, time.time() - self.ttl)
+            ).fetchall()
+
+    def purge(self, expired_only=False):
+        """清除持久化缓存中的过期条目（或全部条目），并清空进程内缓存；返回清除的持久化条目数"""
+        with self._lock:
+            conn = self._connection()
+            if expired_only:
+                cursor = conn.execute("DELETE FROM text2sql_cache WHERE created_at <= ?", (time.time() - self.ttl,))
+            else:
+                cursor = conn.execute("DELETE FROM text2sql_cache")
+            conn.commit()
+            self.version += 1
+        self.memory.clear()
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            entries, expired = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(created_at <= ?), 0) FROM text2sql_cache",
+                (time.time() - self.ttl,)
+            ).fetchone()
+        return {
+            'memory': self.memory.stats(),
+            'persistent': {
+                'path': self.path,
+                'entries': entries,
+                'expired': expired,
+                'hits': self.persistent_hits,
+                'misses': self.misses,
+            },
+        }
+
+sql_cache = SQLCache()
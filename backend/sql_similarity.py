@@ -0,0 +1,224 @@
+"""
+相似问题复用：字符 n-gram TF-IDF 向量 + 余弦相似度，在已回答过的问题中查找最相近的问题并复用其SQL
+相似度只用于排序候选；复用前还要求两个问题去掉同义词差异、虚词和字面值后的"骨架"（有序字符串）相同，
+避免"有消费/没有消费"、"顾客数量最多的科室/科室数量最多的顾客"这类字面相近但含义不同的问题误用SQL
+两个问题的数字、枚举值、产品名等字面值不同时，在SQL中做对应替换（如 前10位 -> 前20位 对应 LIMIT 10 -> LIMIT 20）；
+数字只替换 LIMIT 或比较运算中唯一出现的一处，无法确定替换位置时不复用
+"""
+
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from sql_cache import normalize_question
+
+# 同义词统一为同一写法（先替换较长的词）
+SYNONYMS = {
+    '客户': '顾客', '客人': '顾客', '用户': '顾客',
+    '品项': '产品', '项目': '产品',
+    '核销': '划扣',
+    '顾问': '咨询师',
+    '大于': '超过', '高于': '超过', '多于': '超过',
+    '小于': '低于', '少于': '低于',
+    '最多': '最高', '最大': '最高',
+    '最少': '最低', '最小': '最低',
+    '总额': '总', '总计': '总', '合计': '总', '总和': '总',
+    '各个': '每个', '各': '每个',
+}
+# 不影响SQL含义的虚词和动词
+FILLER_WORDS = (
+    '帮我', '告诉我', '请', '一下', '查询', '统计', '计算', '找出', '列出', '显示', '查找', '查看', '给出',
+    '所有', '全部', '哪些', '金额', '情况', '信息', '数据', '记录', '的', '了',
+)
+# 前N位/名/个 统一写法
+_TOP_N = re.compile(r'前(\d+)(?:名|个|位)')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+# 数字作为参数出现的位置：LIMIT 之后或比较运算符两侧
+_BINDING_BEFORE = re.compile(r'(?:\bLIMIT|[<>=])\s*$', re.IGNORECASE)
+_BINDING_AFTER = re.compile(r'\s*(?:[<>=]|!=)')
+
+def _replace_words(text, mapping):
+    for word in sorted(mapping, key=len, reverse=True):
+        text = text.replace(word, mapping[word])
+    return text
+
+def canonical_question(question):
+    """规范化问题并统一同义词"""
+    text = _replace_words(normalize_question(question), SYNONYMS)
+    return _TOP_N.sub(r'前\1位', text)
+
+class Vocabulary:
+    """可替换的字面值：值 -> 所属类别集合（同一类别的值之间才能互相替换）"""
+
+    def __init__(self, categories):
+        self.categories = defaultdict(set)
+        for category, values in categories.items():
+            for value in values:
+                if value:
+                    self.categories[value].add(category)
+        words = sorted(self.categories, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(word) for word in words)) if words else None
+
+    def extract(self, text):
+        """返回 (字面值列表 [(类别集合, 值)], 去掉字面值后的文本)"""
+        literals = []
+
+        def take(kind):
+            def replace(match):
+                literals.append((kind(match.group()), match.group()))
+                return ' '
+            return replace
+
+        if self.pattern is not None:
+            text = self.pattern.sub(take(lambda value: frozenset(self.categories[value])), text)
+        text = _NUMBER.sub(take(lambda value: frozenset(['number'])), text)
+        return literals, text
+
+def strip_filler(text):
+    """去掉不影响SQL含义的虚词"""
+    for word in FILLER_WORDS:
+        text = text.replace(word, '')
+    return text
+
+def skeleton(text):
+    """去掉虚词后的有序文本，字面值位置保留为一个空格"""
+    return re.sub(r' +', ' ', strip_filler(text)).strip()
+
+def _bound_number(sql, number):
+    """数字在SQL中只出现一次且位于 LIMIT 或比较运算中时返回其位置，否则返回 None"""
+    matches = list(re.finditer(r'(?<![\w.])' + re.escape(number) + r'(?![\w.])', sql, re.ASCII))
+    if len(matches) != 1:
+        return None
+    start, end = matches[0].span()
+    if _BINDING_BEFORE.search(sql, 0, start) or _BINDING_AFTER.match(sql, end):
+        return start, end
+    return None
+
+def _pair_literals(old, new):
+    """按类别依次配对两个问题中的字面值，无法一一配对时返回 None"""
+    if len(old) != len(new):
+        return None
+    remaining = list(new)
+    pairs = []
+    for categories, value in old:
+        for index, (new_categories, new_value) in enumerate(remaining):
+            if categories & new_categories:
+                pairs.append((value, new_value))
+                del remaining[index]
+                break
+        else:
+            return None
+    return pairs
+
+def adapt_sql(old_question, sql, new_question, vocabulary):
+    """把为 old_question 生成的SQL改写为适用于 new_question；骨架不一致或字面值无法对应时返回 None"""
+    old_literals, old_rest = vocabulary.extract(canonical_question(old_question))
+    new_literals, new_rest = vocabulary.extract(canonical_question(new_question))
+    if skeleton(old_rest) != skeleton(new_rest):
+        return None
+    pairs = _pair_literals(old_literals, new_literals)
+    if pairs is None:
+        return None
+
+    mapping = {}
+    for old, new in pairs:
+        if old == new:
+            continue
+        # 同一个旧值对应不同新值时无法确定替换
+        if mapping.get(old, new) != new:
+            return None
+        mapping[old] = new
+
+    numbers = {old: new for old, new in mapping.items() if _NUMBER.fullmatch(old)}
+    words = {old: new for old, new in mapping.items() if old not in numbers}
+    if numbers:
+        spans = []
+        for old, new in numbers.items():
+            span = _bound_number(sql, old)
+            if span is None:
+                return None
+            spans.append((span, new))
+        for (start, end), new in sorted(spans, reverse=True):
+            sql = sql[:start] + new + sql[end:]
+    if words:
+        if not all(word in sql for word in words):
+            return None
+        pattern = re.compile('|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True)))
+        sql = pattern.sub(lambda match: words[match.group()], sql)
+    return sql
+
+def char_ngrams(text, sizes=(1, 2, 3)):
+    """去掉虚词、数字统一为#后的字符 n-gram 词频"""
+    text = _NUMBER.sub('#', strip_filler(text))
+    return Counter(text[i:i + n] for n in sizes for i in range(len(text) - n + 1))
+
+class SimilarityIndex:
+    """已回答问题的 TF-IDF 索引（内存），线程安全"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._docs = {}
+        self._df = Counter()
+        self._norms = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, question, sql, created_at=None):
+        key = canonical_question(question)
+        with self._lock:
+            old = self._docs.pop(key, None)
+            if old is not None:
+                self._df.subtract(old['grams'].keys())
+            grams = char_ngrams(key)
+            self._docs[key] = {'question': question, 'sql': sql, 'grams': grams, 'created_at': created_at or time.time()}
+            self._df.update(grams.keys())
+            # 文档频率变化后所有向量长度需重算
+            self._norms = {}
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._df.clear()
+            self._norms = {}
+
+    def _idf(self, gram):
+        return math.log((1 + len(self._docs)) / (1 + self._df.get(gram, 0))) + 1
+
+    def search(self, question, top_k=5):
+        """返回相似度最高的 top_k 个 (分数, 原问题, SQL)"""
+        query = char_ngrams(canonical_question(question))
+        now = time.time()
+        with self._lock:
+            if not self._docs or not query:
+                return []
+            if not self._norms:
+                self._norms = {
+                    key: math.sqrt(sum((tf * self._idf(g)) ** 2 for g, tf in doc['grams'].items()))
+                    for key, doc in self._docs.items()
+                }
+            weights = {gram: tf * self._idf(gram) for gram, tf in query.items()}
+            query_norm = math.sqrt(sum(w * w for w in weights.values()))
+            scored = []
+            for key, doc in self._docs.items():
+                if self.ttl is not None and now - doc['created_at'] > self.ttl:
+                    continue
+                grams = doc['grams']
+                dot = sum(w * grams[g] * self._idf(g) for g, w in weights.items() if g in grams)
+                if dot:
+                    scored.append((dot / (query_norm * self._norms[key]), doc['question'], doc['sql']))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def find(self, question, vocabulary, threshold, top_k=5):
+        """返回 (改写后的SQL, 分数, 匹配的问题)；没有可复用的问题时返回 None"""
+        for score, matched, sql in self.search(question, top_k):
+            if score < threshold:
+                break
+            adapted = adapt_sql(matched, sql, question, vocabulary)
+            if adapted is not None:
+                return adapted, round(score, 4), matched
+        return None
@@ -1,46 +1,39 @@
-from database import get_session
-import dashscope
+from database import get_read_session, get_async_read_session
+from export import open_export
+from models import Base, MedicalProduct, Consultant
+from analysis import use_session
+from cache import table_cache, cached
+from sql_cache import sql_cache
+from sql_similarity import SimilarityIndex, Vocabulary, canonical_question
+from schema_prompt import SchemaPrompt
+from intents import match_intent
+from llm_client import llm_client, LLMError, LLM_MODEL
+import asyncio
+import hashlib
 import os
 import re
+import threading
 from dotenv import load_dotenv
-from sqlalchemy import text
+from sqlalchemy import text, select, Enum
 
 load_dotenv()
-# 设置阿里百炼API密钥
-dashscope.api_key = os.getenv('DASHSCOPE_API_KEY')
 
-def text_to_sql(natural_language_query):
-    """将自然语言查询转换为SQL"""
-    prompt = f"""
+# 相似问题复用：相似度阈值与候选数量
+TEXT2SQL_SIMILARITY_THRESHOLD = float(os.getenv('TEXT2SQL_SIMILARITY_THRESHOLD', '0.45'))
+TEXT2SQL_SIMILARITY_TOP_K = int(os.getenv('TEXT2SQL_SIMILARITY_TOP_K', '5'))
+
+# 字面值词表缓存：只依赖产品和咨询师表，不与分析结果共用缓存
+vocabulary_cache = table_cache(maxsize=1, ttl=int(os.getenv('TEXT2SQL_VOCABULARY_TTL', '3600')))
+
+# 表结构提示词：启动时由模型元数据生成一次，每个问题只带入相关的表
+schema_prompt = SchemaPrompt(Base)
+
+PROMPT_TEMPLATE = """
     你是一个医疗美容数据分析专家，需要将用户的问题转换为SQL查询语句。
     数据库结构如下：
-    
-    表: customers
-    字段: customer_id, name, phone, register_date, last_visit_date, consultant_id, health_tags, membership_level
-    
-    表: consultants
-    字段: consultant_id, name, department
-    
-    表: medical_products
-    字段: product_id, product_name, department, product_type, standard_price
-    
-    表: consumption_records
-    字段: record_id, customer_id, consume_date, amount, department, is_new_customer, consultant_id, product_id, quantity, payment_method
-    
-    表: write_off_records
-    字段: write_off_id, customer_id, write_off_date, amount, department, product_id, quantity, consultant_id, consume_record_id
-    
-    表: unspent_balances
-    字段: balance_id, customer_id, product_id, total_amount, spent_amount, remaining_amount, last_write_off_date, expiration_date
-    
-    关系说明:
-    - customers 和 consumption_records 是一对多关系
-    - customers 和 write_off_records 是一对多关系
-    - medical_products 和 consumption_records 是一对多关系
-    - consumption_records 和 write_off_records 是一对多关系
-    
+    {schema}
     请将以下自然语言查询转换为精确的SQL语句:
-    "{natural_language_query}"
+    "{question}"
     
     注意:
     1. 只返回SQL语句，不要包含其他内容
@@ -49,55 +42,46 @@ def text_to_sql(natural_language_query):
     4. 日期处理请用SQLite语法，如 date('now', '-6 months')，不要用MySQL的DATE_SUB或INTERVAL
     5. customers 表没有 department 字段，department 字段在 consumption_records 或 medical_products 表。
     """
+
+# 表结构/提示词/模型（含后端，桩服务和回放生成的SQL不与真实模型共用缓存）的版本标识，作为SQL缓存键的一部分，任一变化后旧缓存不再命中
+SCHEMA_HASH = hashlib.sha1(
+    f"{llm_client.backend.name}:{LLM_MODEL}\n{PROMPT_TEMPLATE}\n{schema_prompt.hash}".encode('utf-8')
+).hexdigest()[:16]
+
+# 已回答问题的相似度索引，从持久化SQL缓存加载
+similar_index = SimilarityIndex(ttl=sql_cache.ttl)
+_similar_index_version = None
+_similar_index_lock = threading.Lock()
+
+def text_to_sql(natural_language_query):
+    """将自然语言查询转换为SQL"""
+    schema = schema_prompt.for_question(natural_language_query, _literal_tables(natural_language_query))
+    prompt = PROMPT_TEMPLATE.format(schema=schema, question=natural_language_query)
     
     try:
-        # 检查API密钥
-        api_key = os.getenv('DASHSCOPE_API_KEY')
-        if not api_key:
-            return "SQL生成错误: 未设置 DASHSCOPE_API_KEY 环境变量"
-        
-        response = dashscope.Generation.call(
-            model='qwen-max',
-            messages=[
+        sql = llm_client.complete(
+            [
                 {"role": "system", "content": "你是一个专业的SQL工程师，擅长将业务问题转换为精确的SQL查询。"},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.2
-        )
-        
-        # 检查响应是否为空
-        if response is None:
-            return "SQL生成错误: API响应为空"
-        
-        # 检查响应状态
-        if hasattr(response, 'status_code') and response.status_code == 200:
-            if hasattr(response, 'output') and response.output is not None:
-                # 阿里百炼API返回的内容在text字段中
-                if hasattr(response.output, 'text') and response.output.text is not None:
-                    sql = response.output.text.strip()
-                else:
-                    return "SQL生成错误: API响应中没有text字段"
-            else:
-                return "SQL生成错误: API响应中没有output字段"
-        else:
-            error_msg = getattr(response, 'message', '未知错误')
-            return f"SQL生成错误: {error_msg}"
-        
-        # 清理可能存在的代码块标记
-        if sql.startswith("```sql") and sql.endswith("```"):
-            sql = sql[6:-3].strip()
-        elif sql.startswith("```") and sql.endswith("```"):
-            sql = sql[3:-3].strip()
-        
-        return sql
-    except Exception as e:
+        ).strip()
+    except LLMError as e:
         return f"SQL生成错误: {str(e)}"
+    
+    # 清理可能存在的代码块标记
+    if sql.startswith("```sql") and sql.endswith("```"):
+        sql = sql[6:-3].strip()
+    elif sql.startswith("```") and sql.endswith("```"):
+        sql = sql[3:-3].strip()
+    
+    return sql
 
-def execute_sql_query(sql):
-    """执行SQL查询并返回结果"""
-    session = get_session()
+def execute_sql_query(sql, params=None):
+    """执行SQL查询并返回结果（路由到只读库）"""
+    session = get_read_session()
     try:
-        result = session.execute(text(sql))
+        result = session.execute(text(sql), params or {})
         columns = result.keys()
         data = result.fetchall()
         return columns, data
@@ -106,18 +90,146 @@ def execute_sql_query(sql):
     finally:
         session.close()
 
-def natural_language_query(query):
-    """端到端的自然语言查询处理"""
-    sql = text_to_sql(query)
-    
-    if sql.startswith("SQL生成错误"):
-        return {"success": False, "error": sql, "sql": None}
-    
-    columns, data = execute_sql_query(sql)
-    
+async def execute_sql_query_async(sql, params=None):
+    """异步执行SQL查询并返回结果（路由到只读库）"""
+    async with get_async_read_session() as session:
+        try:
+            result = await session.execute(text(sql), params or {})
+            columns = result.keys()
+            data = result.fetchall()
+            return columns, data
+        except Exception as e:
+            return None, f"SQL执行错误: {str(e)}"
+
+@cached(vocabulary_cache, 'medical_products', 'consultants')
+def literal_vocabulary(session=None):
+    """相似问题间可替换的字面值：各枚举列的取值、产品名称、咨询师姓名"""
+    categories = {
+        f"{table.name}.{column.name}": column.type.enums
+        for table in Base.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, Enum)
+    }
+    with use_session(session) as session:
+        categories['medical_products.product_name'] = session.scalars(select(MedicalProduct.product_name)).all()
+        categories['consultants.name'] = session.scalars(select(Consultant.name)).all()
+    return Vocabulary(categories)
+
+def _literal_tables(question):
+    """问题中只属于一张表的字面值（会员等级、支付方式、产品名、咨询师姓名等）所在的表"""
+    literals, _ = literal_vocabulary().extract(canonical_question(question))
+    tables = set()
+    for categories, _ in literals:
+        owners = {category.split('.')[0] for category in categories if '.' in category}
+        if len(owners) == 1:
+            tables.update(owners)
+    return tables
+
+def _load_similar_index():
+    """首次使用或SQL缓存被清除后，从持久化缓存重建相似问题索引"""
+    global _similar_index_version
+    with _similar_index_lock:
+        if _similar_index_version != sql_cache.version:
+            similar_index.clear()
+            for question, sql, created_at in sql_cache.entries(SCHEMA_HASH):
+                similar_index.add(question, sql, created_at)
+            _similar_index_version = sql_cache.version
+
+def generate_sql(query, reuse=True):
+    """返回 (SQL或错误信息, 来源, 匹配度)
+    来源为 cache（缓存命中）、similar（复用相似问题的SQL）或 llm；reuse=False 时直接调用大模型"""
+    if reuse:
+        sql = sql_cache.get(query, SCHEMA_HASH)
+        if sql is not None:
+            return sql, 'cache', 1.0
+        _load_similar_index()
+        match = similar_index.find(query, literal_vocabulary(), TEXT2SQL_SIMILARITY_THRESHOLD, TEXT2SQL_SIMILARITY_TOP_K)
+        if match is not None:
+            sql, score, _ = match
+            return sql, 'similar', score
+    return text_to_sql(query), 'llm', None
+
+def remember_sql(query, sql, source):
+    """执行成功的新SQL（大模型生成或由相似问题改写）写入缓存和相似问题索引"""
+    if source in ('llm', 'similar'):
+        sql_cache.set(query, SCHEMA_HASH, sql)
+        similar_index.add(query, sql)
+
+def _query_result(sql, source, score, columns, data, intent=None, params=None):
+    """查询结果字典；sql 为空表示SQL生成失败"""
+    result = {"sql": sql, "source": source, "match_score": score, "intent": intent, "params": params}
     if isinstance(data, str):  # 错误情况
-        return {"success": False, "error": data, "sql": sql}
-    
+        return {"success": False, "error": data, **result}
     # 转换为字典列表格式
     results = [dict(zip(columns, row)) for row in data]
-    return {"success": True, "data": results, "sql": sql} 
\ No newline at end of file
+    return {"success": True, "data": results, **result}
+
+def _query_pipeline(query):
+    """自然语言查询流程（生成器）：规则意图直接执行预置SQL，其余问题走缓存/相似问题/大模型，复用的SQL执行失败时改由大模型生成
+    需要执行SQL时 yield (sql, 参数)，调用方执行后 send 回 (列名, 数据)，数据为字符串表示执行出错；
+    结束时返回 (sql, 来源, 匹配度, 列名, 数据, 意图, 参数)
+    """
+    intent = match_intent(query)
+    if intent is not None:
+        name, sql, params = intent
+        columns, data = yield sql, params
+        return sql, 'rule', None, columns, data, name, params
+
+    sql, source, score = generate_sql(query)
+    if sql.startswith("SQL生成错误"):
+        return None, source, None, None, sql, None, None
+
+    columns, data = yield sql, None
+    if isinstance(data, str) and source == 'similar':
+        # 改写的SQL执行失败时改由大模型生成
+        sql, source, score = generate_sql(query, reuse=False)
+        if sql.startswith("SQL生成错误"):
+            return None, source, None, None, sql, None, None
+        columns, data = yield sql, None
+
+    if not isinstance(data, str):
+        remember_sql(query, sql, source)
+    return sql, source, score, columns, data, None, None
+
+def _advance(pipeline, value=None):
+    """把执行结果送回流程并运行到下一次执行请求，返回 (是否结束, 执行请求或最终结果)"""
+    try:
+        return False, pipeline.send(value)
+    except StopIteration as done:
+        return True, done.value
+
+def natural_language_query(query):
+    """端到端的自然语言查询处理"""
+    pipeline = _query_pipeline(query)
+    done, value = _advance(pipeline)
+    while not done:
+        done, value = _advance(pipeline, execute_sql_query(*value))
+    return _query_result(*value)
+
+async def natural_language_query_async(query):
+    """异步的端到端自然语言查询：流程中的缓存查找和大模型调用放到线程池，SQL走异步会话"""
+    loop = asyncio.get_running_loop()
+    pipeline = _query_pipeline(query)
+    done, value = await loop.run_in_executor(None, _advance, pipeline)
+    while not done:
+        result = await execute_sql_query_async(*value)
+        done, value = await loop.run_in_executor(None, _advance, pipeline, result)
+    return _query_result(*value)
+
+def _open_export(sql, params=None):
+    """以流式游标执行SQL，返回 (列名, 行块生成器)，执行出错时数据为错误信息"""
+    try:
+        return open_export(text(sql).bindparams(**params) if params else text(sql))
+    except Exception as e:
+        return None, f"SQL执行错误: {str(e)}"
+
+def open_natural_language_export(query):
+    """经自然语言查询流程生成SQL并以流式游标打开结果，返回 (列名, 行块生成器)；失败时抛出 ValueError"""
+    pipeline = _query_pipeline(query)
+    done, value = _advance(pipeline)
+    while not done:
+        done, value = _advance(pipeline, _open_export(*value))
+    _, _, _, columns, chunks, _, _ = value
+    if isinstance(chunks, str):
+        raise ValueError(chunks)
+    return columns, chunks
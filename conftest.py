@@ -0,0 +1,13 @@
+"""
+pytest 公用夹具
+"""
+
+import pytest
+
+from testing import temporary_database
+
+@pytest.fixture
+def temp_db():
+    """在临时SQLite数据库中运行测试，返回临时目录"""
+    with temporary_database() as directory:
+        yield directory
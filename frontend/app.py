@@ -62,49 +62,63 @@ def make_api_request(endpoint, method="GET", data=None):
         st.error(f"API请求错误: {str(e)}")
         return None
 
+def get_dashboard_stats():
+    """获取仪表板统计；带上次的ETag发送条件请求，数据未变化时沿用本地结果"""
+    cached = st.session_state.get('dashboard_stats')
+    headers = {"If-None-Match": cached['etag']} if cached else {}
+    try:
+        response = requests.get(f"{API_BASE_URL}/api/stats", headers=headers)
+        if response.status_code == 304 and cached:
+            return cached['data']
+        response.raise_for_status()
+        data = response.json()
+        st.session_state['dashboard_stats'] = {'etag': response.headers.get('ETag'), 'data': data}
+        return data
+    except requests.exceptions.RequestException as e:
+        st.error(f"API请求错误: {str(e)}")
+        return None
+
 def display_dashboard():
     """显示仪表板"""
     st.markdown('<h1 class="main-header">🏥 医美数据管理系统</h1>', unsafe_allow_html=True)
     
-    # 获取基础统计数据
+    # 获取基础统计数据（一次聚合查询）
+    stats = get_dashboard_stats() or {}
     col1, col2, col3, col4 = st.columns(4)
     
-    # 顾客总数
-    customers = make_api_request("/api/customers")
-    customer_count = len(customers) if customers else 0
-    
     with col1:
-        st.metric("顾客总数", customer_count)
-    
-    # 咨询师总数
-    consultants = make_api_request("/api/consultants")
-    consultant_count = len(consultants) if consultants else 0
+        st.metric("顾客总数", stats.get('customer_count', 0))
     
     with col2:
-        st.metric("咨询师总数", consultant_count)
-    
-    # 产品总数
-    products = make_api_request("/api/products")
-    product_count = len(products) if products else 0
+        st.metric("咨询师总数", stats.get('consultant_count', 0))
     
     with col3:
-        st.metric("产品总数", product_count)
-    
-    # 消费记录总数
-    consumption_records = make_api_request("/api/consumption-records")
-    record_count = len(consumption_records) if consumption_records else 0
+        st.metric("产品总数", stats.get('product_count', 0))
     
     with col4:
-        st.metric("消费记录总数", record_count)
+        st.metric("消费记录总数", stats.get('consumption_record_count', 0))
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.metric("累计消费", f"¥{stats.get('total_consumption', 0):,.0f}")
+    
+    with col2:
+        st.metric("累计划扣", f"¥{stats.get('total_write_off', 0):,.0f}")
+    
+    with col3:
+        st.metric("未划扣余额", f"¥{stats.get('outstanding_balance', 0):,.0f}")
     
     # 快速分析
     st.subheader("📊 快速分析")
     
-    # 获取分析数据
-    inactive_analysis = make_api_request("/api/analysis/inactive-customers")
-    reopen_analysis = make_api_request("/api/analysis/new-customer-reopen")
-    vip_analysis = make_api_request("/api/analysis/vip-consumption")
-    balance_analysis = make_api_request("/api/analysis/unspent-balance")
+    # 一次请求并发获取全部分析数据
+    all_analysis = make_api_request("/api/analysis/all")
+    analysis_results = all_analysis.get('results', {}) if all_analysis else {}
+    inactive_analysis = analysis_results.get('inactive_customers')
+    reopen_analysis = analysis_results.get('new_customer_reopen')
+    vip_analysis = analysis_results.get('vip_consumption')
+    balance_analysis = analysis_results.get('unspent_balance')
     
     col1, col2 = st.columns(2)
     
@@ -129,7 +143,7 @@ def display_dashboard():
     st.subheader("📈 数据可视化")
     
     # 科室业绩分析
-    dept_analysis = make_api_request("/api/analysis/department-performance")
+    dept_analysis = analysis_results.get('department_performance')
     if dept_analysis and dept_analysis.get('data'):
         df_dept = pd.DataFrame(dept_analysis['data'])
         
@@ -155,7 +169,7 @@ def display_dashboard():
             st.plotly_chart(fig_dept_pie, use_container_width=True)
     
     # 产品表现分析
-    product_analysis = make_api_request("/api/analysis/product-performance")
+    product_analysis = analysis_results.get('product_performance')
     if product_analysis and product_analysis.get('data'):
         df_product = pd.DataFrame(product_analysis['data'])
         
@@ -335,6 +349,9 @@ def display_analysis():
                     st.info(result['summary'])
             else:
                 st.error("分析失败，请检查数据连接")
+    
+    # 全部分析结果导出为Excel报表
+    st.link_button(label="📊 下载全部分析报表(Excel)", url=f"{API_BASE_URL}/api/analysis/export")
 
 def main():
     """主函数"""
@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 import pandas as pd
 import json
+from urllib.parse import urlencode
 
 st.set_page_config(page_title="自然语言查询", page_icon="🔍")
 
@@ -77,12 +78,21 @@ if st.button("🚀 执行查询", type="primary"):
             
             if result:
                 if result.get('success'):
-                    st.success("查询执行成功！")
+                    if result.get('source') == 'rule':
+                        st.success("查询执行成功！（⚡ 命中规则意图，未调用大模型）")
+                    elif result.get('source') == 'cache':
+                        st.success("查询执行成功！（⚡ 命中SQL缓存）")
+                    elif result.get('source') == 'similar':
+                        st.success(f"查询执行成功！（⚡ 复用相似问题的SQL，相似度 {result.get('match_score', 0):.2f}）")
+                    else:
+                        st.success("查询执行成功！")
                     
                     # 显示SQL（如果启用）
                     if show_sql and result.get('sql'):
                         with st.expander("📋 生成的SQL"):
                             st.code(result['sql'], language='sql')
+                            if result.get('params'):
+                                st.caption(f"参数: {result['params']}")
                     
                     # 显示结果
                     if result.get('data'):
@@ -97,14 +107,9 @@ if st.button("🚀 执行查询", type="primary"):
                         # 显示数据表格
                         st.dataframe(df, use_container_width=True)
                         
-                        # 下载功能
-                        csv = df.to_csv(index=False)
-                        st.download_button(
-                            label="📥 下载查询结果",
-                            data=csv,
-                            file_name=f"query_result_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
+                        # 下载功能（由后端流式导出完整结果）
+                        export_url = f"{API_BASE_URL}/api/query/export?{urlencode({'query': query, 'format': 'csv'})}"
+                        st.link_button(label="📥 下载查询结果", url=export_url)
                         
                         # 简单的数据可视化
                         if len(df) > 0:
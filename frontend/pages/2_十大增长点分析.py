@@ -29,137 +29,11 @@ def make_api_request(endpoint, method="GET", data=None):
 
 # 增长点分析函数
 def analyze_growth_opportunities():
-    """分析十大增长机会"""
-    opportunities = []
-    
-    # 1. 不活跃客户召回
-    inactive_analysis = make_api_request("/api/analysis/inactive-customers")
-    if inactive_analysis and inactive_analysis.get('data'):
-        inactive_count = len(inactive_analysis['data'])
-        opportunities.append({
-            'category': '客户召回',
-            'opportunity': '不活跃客户召回',
-            'description': f'有{inactive_count}位客户6个月以上未到店',
-            'potential_value': inactive_count * 2000,  # 假设每位客户平均消费2000元
-            'priority': '高',
-            'action': '制定客户回访计划，提供专属优惠'
-        })
-    
-    # 2. VIP客户深度开发
-    vip_analysis = make_api_request("/api/analysis/vip-consumption")
-    if vip_analysis and vip_analysis.get('data'):
-        vip_customers = vip_analysis['data']
-        high_value_vips = [c for c in vip_customers if c.get('total_consumption', 0) > 10000]
-        opportunities.append({
-            'category': 'VIP开发',
-            'opportunity': '高价值VIP客户深度开发',
-            'description': f'有{len(high_value_vips)}位VIP客户消费超过1万元',
-            'potential_value': len(high_value_vips) * 5000,
-            'priority': '高',
-            'action': '提供个性化服务，推荐高端项目'
-        })
-    
-    # 3. 新客转化率提升
-    reopen_analysis = make_api_request("/api/analysis/new-customer-reopen")
-    if reopen_analysis and reopen_analysis.get('data'):
-        reopen_rate = reopen_analysis['data'][0].get('reopen_rate', 0)
-        if reopen_rate < 50:  # 如果二开率低于50%
-            opportunities.append({
-                'category': '新客转化',
-                'opportunity': '提升新客二开率',
-                'description': f'当前新客二开率为{reopen_rate}%，有较大提升空间',
-                'potential_value': 50000,  # 假设提升10%可带来5万元收入
-                'priority': '中',
-                'action': '优化新客体验，制定二次消费激励政策'
-            })
-    
-    # 4. 未划扣余额激活
-    balance_analysis = make_api_request("/api/analysis/unspent-balance")
-    if balance_analysis and balance_analysis.get('data'):
-        total_balance = sum([b.get('remaining_amount', 0) for b in balance_analysis['data']])
-        opportunities.append({
-            'category': '余额激活',
-            'opportunity': '激活未划扣余额',
-            'description': f'有{len(balance_analysis["data"])}位客户未划扣余额总计{total_balance:.0f}元',
-            'potential_value': total_balance * 0.3,  # 假设30%的余额会被使用
-            'priority': '高',
-            'action': '主动联系客户，推荐相关项目'
-        })
-    
-    # 5. 科室业绩优化
-    dept_analysis = make_api_request("/api/analysis/department-performance")
-    if dept_analysis and dept_analysis.get('data'):
-        dept_data = dept_analysis['data']
-        # 找出业绩最低的科室
-        min_dept = min(dept_data, key=lambda x: x.get('total_amount', 0))
-        opportunities.append({
-            'category': '科室优化',
-            'opportunity': f'{min_dept["department"]}科室业绩提升',
-            'description': f'{min_dept["department"]}科室业绩较低，有提升空间',
-            'potential_value': 30000,
-            'priority': '中',
-            'action': '加强科室推广，培训咨询师技能'
-        })
-    
-    # 6. 产品组合销售
-    product_analysis = make_api_request("/api/analysis/product-performance")
-    if product_analysis and product_analysis.get('data'):
-        products = product_analysis['data']
-        # 找出销售最好的产品
-        best_product = max(products, key=lambda x: x.get('total_revenue', 0))
-        opportunities.append({
-            'category': '产品策略',
-            'opportunity': f'{best_product["product_name"]}产品组合销售',
-            'description': f'{best_product["product_name"]}销售表现优秀，可开发相关产品',
-            'potential_value': 40000,
-            'priority': '中',
-            'action': '开发配套产品，制定组合销售方案'
-        })
-    
-    # 7. 会员等级升级
-    customers = make_api_request("/api/customers")
-    if customers:
-        silver_customers = [c for c in customers if c.get('membership_level') == '白银']
-        opportunities.append({
-            'category': '会员升级',
-            'opportunity': '白银会员升级计划',
-            'description': f'有{len(silver_customers)}位白银会员可升级为黄金会员',
-            'potential_value': len(silver_customers) * 3000,
-            'priority': '中',
-            'action': '制定会员升级激励政策'
-        })
-    
-    # 8. 季节性营销
-    opportunities.append({
-        'category': '营销策略',
-        'opportunity': '季节性营销活动',
-        'description': '根据医美行业特点，制定季节性营销计划',
-        'potential_value': 100000,
-        'priority': '中',
-        'action': '策划节假日和季节性营销活动'
-    })
-    
-    # 9. 客户推荐计划
-    opportunities.append({
-        'category': '客户推荐',
-        'opportunity': '客户推荐奖励计划',
-        'description': '通过现有客户推荐新客户',
-        'potential_value': 80000,
-        'priority': '低',
-        'action': '制定客户推荐奖励机制'
-    })
-    
-    # 10. 数字化营销
-    opportunities.append({
-        'category': '数字化',
-        'opportunity': '数字化营销渠道拓展',
-        'description': '利用社交媒体和线上平台拓展客户',
-        'potential_value': 60000,
-        'priority': '低',
-        'action': '建立线上营销体系，提升品牌知名度'
-    })
-    
-    return opportunities
+    """获取十大增长机会（由后端聚合计算）"""
+    growth_analysis = make_api_request("/api/analysis/growth-opportunities")
+    if growth_analysis:
+        return growth_analysis.get('data', [])
+    return []
 
 # 主界面
 st.markdown("""
@@ -3,6 +3,8 @@ import requests
 import pandas as pd
 from datetime import datetime, date, timedelta
 import json
+import time
+from urllib.parse import urlencode
 
 st.set_page_config(page_title="数据管理", page_icon="🗄️")
 
@@ -34,7 +36,7 @@ def make_api_request(endpoint, method="GET", data=None):
 st.sidebar.title("数据管理")
 management_type = st.sidebar.selectbox(
     "选择管理类型",
-    ["顾客管理", "咨询师管理", "产品管理", "消费记录管理", "划扣记录管理", "余额管理"]
+    ["顾客管理", "咨询师管理", "产品管理", "消费记录管理", "划扣记录管理", "余额管理", "批量导入"]
 )
 
 if management_type == "顾客管理":
@@ -79,26 +81,44 @@ if management_type == "顾客管理":
     
     # 顾客列表
     st.subheader("📋 顾客列表")
-    customers = make_api_request("/api/customers")
+    
+    # 搜索和筛选（由后端按索引检索）
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        search_term = st.text_input("搜索顾客姓名或电话", help="输入数字按手机号前缀查找，否则按姓名查找")
+    with col2:
+        membership_filter = st.selectbox("会员等级筛选", ["全部", "普通", "白银", "黄金", "钻石"])
+    with col3:
+        consultant_filter = st.number_input("咨询师ID筛选", min_value=0, value=0, help="0 表示全部")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        last_visit_from = st.date_input("最近到店起始", value=None)
+    with col2:
+        last_visit_to = st.date_input("最近到店截止", value=None)
+    with col3:
+        health_tag = st.text_input("健康标签", placeholder="如：过敏（匹配标签中的文字）")
+    
+    filters = {}
+    if search_term.strip():
+        filters["phone" if search_term.strip().isdigit() else "name"] = search_term.strip()
+    if membership_filter != "全部":
+        filters["membership_level"] = membership_filter
+    if consultant_filter:
+        filters["consultant_id"] = int(consultant_filter)
+    if last_visit_from:
+        filters["last_visit_from"] = last_visit_from.isoformat()
+    if last_visit_to:
+        filters["last_visit_to"] = last_visit_to.isoformat()
+    if health_tag.strip():
+        filters["health_tag"] = health_tag.strip()
+    
+    # 只取表格展示和统计需要的字段
+    fields = "customer_id,name,phone,membership_level,consultant_id,register_date,last_visit_date,total_consumption"
+    customers = make_api_request(f"/api/customers?{urlencode({**filters, 'fields': fields})}")
     
     if customers:
         df = pd.DataFrame(customers)
         
-        # 搜索和筛选
-        col1, col2 = st.columns(2)
-        with col1:
-            search_term = st.text_input("搜索顾客姓名或电话")
-        with col2:
-            membership_filter = st.selectbox("会员等级筛选", ["全部"] + list(df['membership_level'].unique()))
-        
-        # 应用筛选
-        if search_term:
-            df = df[df['name'].str.contains(search_term, na=False) | 
-                   df['phone'].str.contains(search_term, na=False)]
-        
-        if membership_filter != "全部":
-            df = df[df['membership_level'] == membership_filter]
-        
         # 显示数据
         st.dataframe(df, use_container_width=True)
         
@@ -119,14 +139,11 @@ if management_type == "顾客管理":
                 avg_consumption = 0
             st.metric("平均消费", f"¥{avg_consumption:.0f}")
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载顾客数据",
-            data=csv,
-            file_name=f"customers_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载顾客数据", url=f"{API_BASE_URL}/api/export/customers?format=csv")
+        st.link_button(label="📊 下载顾客数据(Excel)", url=f"{API_BASE_URL}/api/export/customers?format=xlsx")
+    elif filters:
+        st.info("没有符合条件的顾客")
     else:
         st.warning("暂无顾客数据")
 
@@ -184,14 +201,9 @@ elif management_type == "咨询师管理":
         with col3:
             st.metric("无创科", len(df[df['department'] == '无创科']))
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载咨询师数据",
-            data=csv,
-            file_name=f"consultants_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载咨询师数据", url=f"{API_BASE_URL}/api/export/consultants?format=csv")
+        st.link_button(label="📊 下载咨询师数据(Excel)", url=f"{API_BASE_URL}/api/export/consultants?format=xlsx")
     else:
         st.warning("暂无咨询师数据")
 
@@ -265,14 +277,9 @@ elif management_type == "产品管理":
             avg_price = df['standard_price'].mean()
             st.metric("平均价格", f"¥{avg_price:.0f}")
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载产品数据",
-            data=csv,
-            file_name=f"products_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载产品数据", url=f"{API_BASE_URL}/api/export/products?format=csv")
+        st.link_button(label="📊 下载产品数据(Excel)", url=f"{API_BASE_URL}/api/export/products?format=xlsx")
     else:
         st.warning("暂无产品数据")
 
@@ -325,7 +332,7 @@ elif management_type == "消费记录管理":
     
     # 消费记录列表
     st.subheader("📋 消费记录列表")
-    consumption_records = make_api_request("/api/consumption-records")
+    consumption_records = make_api_request("/api/consumption-records?view=summary")
     
     if consumption_records:
         df = pd.DataFrame(consumption_records)
@@ -367,14 +374,9 @@ elif management_type == "消费记录管理":
             new_customer_count = len(df[df['is_new_customer'] == True])
             st.metric("新客数", new_customer_count)
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载消费记录",
-            data=csv,
-            file_name=f"consumption_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载消费记录", url=f"{API_BASE_URL}/api/export/consumption-records?format=csv")
+        st.link_button(label="📊 下载消费记录(Excel)", url=f"{API_BASE_URL}/api/export/consumption-records?format=xlsx")
     else:
         st.warning("暂无消费记录数据")
 
@@ -424,7 +426,7 @@ elif management_type == "划扣记录管理":
     
     # 划扣记录列表
     st.subheader("📋 划扣记录列表")
-    write_off_records = make_api_request("/api/write-off-records")
+    write_off_records = make_api_request("/api/write-off-records?view=summary")
     
     if write_off_records:
         df = pd.DataFrame(write_off_records)
@@ -457,14 +459,9 @@ elif management_type == "划扣记录管理":
             avg_amount = df['amount'].mean()
             st.metric("平均划扣金额", f"¥{avg_amount:.0f}")
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载划扣记录",
-            data=csv,
-            file_name=f"write_off_records_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载划扣记录", url=f"{API_BASE_URL}/api/export/write-off-records?format=csv")
+        st.link_button(label="📊 下载划扣记录(Excel)", url=f"{API_BASE_URL}/api/export/write-off-records?format=xlsx")
     else:
         st.warning("暂无划扣记录数据")
 
@@ -508,7 +505,7 @@ elif management_type == "余额管理":
     
     # 余额列表
     st.subheader("📋 余额列表")
-    unspent_balances = make_api_request("/api/unspent-balances")
+    unspent_balances = make_api_request("/api/unspent-balances?view=summary")
     
     if unspent_balances:
         df = pd.DataFrame(unspent_balances)
@@ -542,17 +539,68 @@ elif management_type == "余额管理":
             if not high_balance.empty:
                 st.warning(f"⚠️ 有 {len(high_balance)} 位客户余额超过5000元，建议主动联系")
         
-        # 下载功能
-        csv = df.to_csv(index=False)
-        st.download_button(
-            label="📥 下载余额数据",
-            data=csv,
-            file_name=f"unspent_balances_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
-        )
+        # 下载功能（由后端流式导出全部数据）
+        st.link_button(label="📥 下载余额数据", url=f"{API_BASE_URL}/api/export/unspent-balances?format=csv")
+        st.link_button(label="📊 下载余额数据(Excel)", url=f"{API_BASE_URL}/api/export/unspent-balances?format=xlsx")
     else:
         st.warning("暂无余额数据")
 
+elif management_type == "批量导入":
+    st.header("📤 批量导入")
+    st.info("支持 Excel(.xlsx) 或 CSV 文件，首行为表头，可使用字段名或中文列名；顾客按手机号、产品按品项名称更新已有数据")
+    
+    import_entities = {
+        "顾客": "customers",
+        "产品": "products",
+        "消费记录": "consumption-records",
+        "划扣记录": "write-off-records"
+    }
+    entity_label = st.selectbox("导入数据类型", list(import_entities.keys()))
+    uploaded_file = st.file_uploader("选择文件", type=["xlsx", "csv"])
+    
+    if uploaded_file and st.button("开始导入"):
+        try:
+            response = requests.post(
+                f"{API_BASE_URL}/api/import/{import_entities[entity_label]}",
+                files={"file": (uploaded_file.name, uploaded_file.getvalue())}
+            )
+            response.raise_for_status()
+            job = response.json()
+        except requests.exceptions.RequestException as e:
+            st.error(f"上传失败: {str(e)}")
+            job = None
+        
+        if job:
+            # 轮询后台任务进度
+            progress_bar = st.progress(0.0, text="导入中...")
+            while job["status"] in ("pending", "running"):
+                time.sleep(0.5)
+                job = make_api_request(f"/api/jobs/{job['job_id']}")
+                if not job:
+                    break
+                if job["total"]:
+                    progress_bar.progress(min(job["progress"] / job["total"], 1.0), text=f"已处理 {job['progress']}/{job['total']} 行")
+            
+            if job and job["status"] == "done":
+                progress_bar.progress(1.0, text="导入完成")
+                result = job["result"]
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("处理行数", result["processed"])
+                with col2:
+                    st.metric("成功写入", result["written"])
+                with col3:
+                    st.metric("重复合并", result["merged"])
+                with col4:
+                    st.metric("失败行数", result["failed"])
+                if result["errors"]:
+                    st.warning("以下行未导入（行号对应文件中的行）")
+                    st.dataframe(pd.DataFrame(result["errors"]).rename(columns={"index": "行号", "error": "错误"}), use_container_width=True)
+                else:
+                    st.success("全部数据导入成功！")
+            elif job:
+                st.error(f"导入失败: {job['error']}")
+
 # 数据导入导出功能
 st.sidebar.divider()
 st.sidebar.subheader("📤 数据导入导出")
@@ -13,6 +13,8 @@ sys.path.append('backend')
 
 from models import Customer, Consultant, MedicalProduct, ConsumptionRecord, WriteOffRecord, UnspentBalance
 from database import get_session
+from customer_stats import rebuild_customer_stats
+from rollups import refresh_daily_rollups
 
 def create_sample_data():
     """创建示例数据"""
@@ -187,9 +189,16 @@ def create_sample_data():
     session.commit()
     print("✅ 余额记录更新完成")
     
+    # 7. 重建顾客汇总表
+    print("📈 重建顾客汇总表与日汇总表...")
+    rebuild_customer_stats(session)
+    refresh_daily_rollups(session)
+    session.commit()
+    print("✅ 顾客汇总表与日汇总表重建完成")
+    
     session.close()
     
-    # 7. 生成统计报告
+    # 8. 生成统计报告
     print("\n📊 数据统计报告:")
     print(f"   👨‍⚕️ 咨询师: {len(consultants)} 位")
     print(f"   💊 产品: {len(products)} 个")
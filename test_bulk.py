@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+测试批量写入：部分行无效或写入失败时，其余行照常写入，错误按行号返回
+使用临时SQLite数据库，不改动项目自带的 medical_cosmetics.db
+"""
+
+import json
+import sys
+
+from fastapi.testclient import TestClient
+from testing import run_tests
+from main import app
+
+def _fixtures(client, phone):
+    """创建咨询师、产品和顾客，返回 (顾客ID, 咨询师ID, 产品ID)"""
+    consultant = client.post('/api/consultants', json={'name': '测试咨询师', 'department': '皮肤科'}).json()
+    product = client.post('/api/products', json={
+        'product_name': f'测试品项{phone}', 'department': '皮肤科', 'product_type': '流量品', 'standard_price': 100,
+    }).json()
+    customer = client.post('/api/customers', json={
+        'name': '批量测试', 'phone': phone, 'register_date': '2024-01-01', 'consultant_id': consultant['consultant_id'],
+    }).json()
+    return customer['customer_id'], consultant['consultant_id'], product['product_id']
+
+def _record(customer_id, consultant_id, product_id, **overrides):
+    record = {
+        'customer_id': customer_id, 'consume_date': '2024-05-01', 'amount': 100, 'department': '皮肤科',
+        'is_new_customer': True, 'consultant_id': consultant_id, 'product_id': product_id,
+    }
+    record.update(overrides)
+    return record
+
+def test_bulk_partial_failure(temp_db):
+    """无效行、外键不存在和写入失败的行逐行报错，有效行写入并更新顾客汇总"""
+    print("🔍 测试批量写入的部分失败...")
+    with TestClient(app) as client:
+        customer_id, consultant_id, product_id = _fixtures(client, '19911110001')
+        ids = (customer_id, consultant_id, product_id)
+        missing_amount = _record(*ids)
+        del missing_amount['amount']
+        payload = [
+            _record(*ids, amount=100),
+            missing_amount,
+            _record(*ids, department='牙科'),
+            _record(99999, consultant_id, product_id),
+            # 超出整数范围，写入时整块失败后逐行重试定位到该行
+            _record(*ids, quantity=2 ** 70),
+            _record(*ids, amount=250.5),
+        ]
+        result = client.post('/api/consumption-records/bulk', json=payload).json()
+        assert result['received'] == 6 and result['inserted'] == 2 and result['failed'] == 4, result
+        errors = {error['index']: error['error'] for error in result['errors']}
+        assert sorted(errors) == [1, 2, 3, 4], errors
+        assert 'amount' in errors[1]
+        assert 'department' in errors[2]
+        assert 'customer_id=99999 不存在' in errors[3]
+
+        stats = client.get(f'/api/customers/{customer_id}/stats').json()
+        assert float(stats['total_consumption']) == 350.5, stats
+        records = client.get('/api/consumption-records', params={'customer_id': customer_id}).json()
+        assert sorted(float(r['amount']) for r in records if r['customer_id'] == customer_id) == [100.0, 250.5]
+    print("✅ 批量写入部分失败时逐行报错正常")
+
+def test_bulk_ndjson(temp_db):
+    """NDJSON 中无法解析的行按行号报错，其余行写入；非数组JSON返回400"""
+    print("🔍 测试NDJSON批量写入...")
+    with TestClient(app) as client:
+        ids = _fixtures(client, '19911110002')
+        body = '\n'.join([json.dumps(_record(*ids, amount=10)), '{bad json', '', json.dumps(_record(*ids, amount=20))])
+        result = client.post('/api/consumption-records/bulk', content=body.encode('utf-8'),
+                             headers={'Content-Type': 'application/x-ndjson'}).json()
+        assert result['received'] == 3 and result['inserted'] == 2, result
+        assert [error['index'] for error in result['errors']] == [1]
+        assert 'JSON解析失败' in result['errors'][0]['error']
+
+        response = client.post('/api/consumption-records/bulk', json={'customer_id': ids[0]})
+        assert response.status_code == 400, response.text
+    print("✅ NDJSON批量写入正常")
+
+def main():
+    """主函数"""
+    return run_tests("批量写入", (test_bulk_partial_failure, test_bulk_ndjson))
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+测试流式导出：服务端游标按 EXPORT_CHUNK_SIZE 分块读取，CSV/NDJSON 每块输出一段；Excel 超出行数上限时分表
+使用临时SQLite数据库，不改动项目自带的 medical_cosmetics.db
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+from testing import run_tests
+from main import app
+import export
+from export import open_export, table_query, csv_stream, ndjson_stream, write_xlsx
+
+CONSULTANTS = [{'name': f'导出测试{i}', 'department': '皮肤科'} for i in range(5)]
+
+def _add_consultants(client):
+    for consultant in CONSULTANTS:
+        client.post('/api/consultants', json=consultant).raise_for_status()
+
+def test_export_chunks(temp_db):
+    """游标按块大小分块；CSV首块带BOM和表头，NDJSON每块一段、每行一个对象；空结果只输出表头"""
+    print("🔍 测试流式导出分块...")
+    chunk_size = export.EXPORT_CHUNK_SIZE
+    export.EXPORT_CHUNK_SIZE = 2
+    try:
+        with TestClient(app) as client:
+            _add_consultants(client)
+            columns, chunks = open_export(table_query('consultants'))
+            assert [len(rows) for rows in chunks] == [2, 2, 1]
+
+            parts = list(csv_stream(*open_export(table_query('consultants'))))
+            assert len(parts) == 3, parts
+            assert parts[0].startswith(('\ufeff' + ','.join(columns)).encode('utf-8'))
+            rows = list(csv.reader(io.StringIO(b''.join(parts).decode('utf-8-sig'))))
+            assert rows[0] == columns and [row[columns.index('name')] for row in rows[1:]] == [
+                consultant['name'] for consultant in CONSULTANTS
+            ], rows
+
+            parts = list(ndjson_stream(*open_export(table_query('consultants'))))
+            assert [part.count(b'\n') for part in parts] == [2, 2, 1], parts
+            records = [json.loads(line) for part in parts for line in part.decode('utf-8').splitlines()]
+            assert [record['name'] for record in records] == [consultant['name'] for consultant in CONSULTANTS]
+
+            parts = list(csv_stream(*open_export(table_query('write-off-records'))))
+            assert len(parts) == 1 and parts[0].decode('utf-8-sig').strip() == ','.join(
+                table_query('write-off-records').selected_columns.keys()
+            ), parts
+    finally:
+        export.EXPORT_CHUNK_SIZE = chunk_size
+    print("✅ 流式导出分块正常")
+
+def test_export_endpoint(temp_db):
+    """导出接口以附件返回CSV/NDJSON，不支持的表或格式报错"""
+    print("🔍 测试导出接口...")
+    with TestClient(app) as client:
+        _add_consultants(client)
+        response = client.get('/api/export/consultants', params={'format': 'csv'})
+        assert response.status_code == 200 and response.headers['content-type'].startswith('text/csv')
+        assert 'attachment; filename="consultants_' in response.headers['content-disposition']
+        assert len(response.content.decode('utf-8-sig').splitlines()) == len(CONSULTANTS) + 1
+
+        response = client.get('/api/export/consultants', params={'format': 'ndjson'})
+        assert len(response.text.splitlines()) == len(CONSULTANTS)
+
+        assert client.get('/api/export/unknown').status_code == 404
+        assert client.get('/api/export/consultants', params={'format': 'xml'}).status_code == 400
+    print("✅ 导出接口正常")
+
+def test_xlsx_sheet_split():
+    """超出每表行数上限时续写到带序号的新工作表，每个工作表都有表头，表名不超过31个字符"""
+    print("🔍 测试Excel分表...")
+    max_rows = export.XLSX_MAX_ROWS
+    export.XLSX_MAX_ROWS = 2
+    progress = []
+    path = os.path.join(tempfile.mkdtemp(prefix='medical_test_'), 'split.xlsx')
+    try:
+        title = '消费记录' * 10
+        chunks = iter([[(1, 'a'), (2, 'b'), (3, 'c')], [(4, 'd'), (5, 'e')]])
+        write_xlsx(path, [(title, ['id', 'value'], chunks), ('空表', ['id'], iter([]))], progress.append)
+    finally:
+        export.XLSX_MAX_ROWS = max_rows
+    assert progress == [3, 2], progress
+
+    workbook = load_workbook(path, read_only=True)
+    assert workbook.sheetnames == [title[:31], title[:29] + '_2', title[:29] + '_3', '空表'], workbook.sheetnames
+    sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+    workbook.close()
+    assert sheets == [
+        [('id', 'value'), (1, 'a'), (2, 'b')],
+        [('id', 'value'), (3, 'c'), (4, 'd')],
+        [('id', 'value'), (5, 'e')],
+        [('id',)],
+    ], sheets
+    print("✅ Excel分表正常")
+
+def main():
+    """主函数"""
+    return run_tests("导出", (test_export_chunks, test_export_endpoint, test_xlsx_sheet_split))
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+测试文件导入：顾客按手机号去重并upsert（只更新文件中出现的列），产品按品项名称去重，无效行按行号报错
+使用临时SQLite数据库，不改动项目自带的 medical_cosmetics.db
+"""
+
+import csv
+import os
+import sys
+import tempfile
+from datetime import date
+
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from testing import run_tests
+from database import get_session
+from models import init_db, Consultant, Customer, MedicalProduct
+from importer import run_import
+from jobs import Job
+
+def _consultant_id():
+    session = get_session()
+    try:
+        consultant = Consultant(name='导入测试咨询师', department='皮肤科')
+        session.add(consultant)
+        session.commit()
+        return consultant.consultant_id
+    finally:
+        session.close()
+
+def _write_csv(directory, rows):
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=directory)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8-sig') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+def _import(entity, path):
+    job = Job('import')
+    summary = run_import(job, entity, path)
+    assert job.progress == summary['processed'] and job.total == summary['processed'], (job.to_dict(), summary)
+    return summary
+
+def _customers(phones):
+    session = get_session()
+    try:
+        rows = session.execute(
+            select(Customer.phone, Customer.name, Customer.membership_level, Customer.last_visit_date)
+            .where(Customer.phone.in_(phones))
+        ).all()
+        return {row.phone: row for row in rows}
+    finally:
+        session.close()
+
+def test_customer_upsert_dedupe(temp_db):
+    """同一文件中重复手机号保留最后一行；再次导入时按手机号更新，只改文件中出现的列"""
+    print("🔍 测试顾客导入去重与upsert...")
+    init_db()
+    consultant_id = _consultant_id()
+    # 表头可用字段名或列注释（中文列名）
+    summary = _import('customers', _write_csv(temp_db, [
+        ['顾客姓名', '联系电话', 'register_date', 'last_visit_date', 'consultant_id', 'membership_level'],
+        ['张一', '19922220001', '2024-01-01', '2024-03-01', consultant_id, '普通'],
+        ['李二', '19922220002', '2024-01-02', '2024-03-02', consultant_id, '白银'],
+        ['张一(新)', '19922220001', '2024-01-01', '2024-03-05', consultant_id, '黄金'],
+        ['王三', '19922220003', '', '', consultant_id, '普通'],
+        ['赵四', '19922220004', '2024-01-04', '', consultant_id, '至尊'],
+        [],
+    ]))
+    assert summary['processed'] == 5 and summary['written'] == 2 and summary['merged'] == 1, summary
+    assert [error['index'] for error in summary['errors']] == [5, 6], summary['errors']
+    assert 'register_date' in summary['errors'][0]['error']
+    assert 'membership_level' in summary['errors'][1]['error']
+
+    customers = _customers(['19922220001', '19922220002', '19922220003', '19922220004'])
+    assert sorted(customers) == ['19922220001', '19922220002']
+    assert customers['19922220001'].name == '张一(新)' and customers['19922220001'].membership_level == '黄金'
+
+    # 第二个文件没有 last_visit_date 列：已有顾客的该列保持不变
+    summary = _import('customers', _write_csv(temp_db, [
+        ['name', 'phone', 'register_date', 'consultant_id', 'membership_level'],
+        ['李二', '19922220002', '2024-01-02', consultant_id, '钻石'],
+        ['孙五', '19922220005', '2024-02-01', consultant_id, '普通'],
+        ['周六', '19922220006', '2024-02-02', 99999, '普通'],
+    ]))
+    assert summary['written'] == 2 and summary['failed'] == 1, summary
+    assert 'consultant_id=99999 不存在' in summary['errors'][0]['error']
+    customers = _customers(['19922220002', '19922220005'])
+    assert customers['19922220002'].membership_level == '钻石'
+    assert customers['19922220002'].last_visit_date == date(2024, 3, 2)
+    assert customers['19922220005'].name == '孙五'
+    print("✅ 顾客导入去重与upsert正常")
+
+def test_product_import_xlsx(temp_db):
+    """Excel导入产品：按品项名称更新已有产品，其余新建"""
+    print("🔍 测试产品Excel导入...")
+    init_db()
+    path = os.path.join(temp_db, 'products.xlsx')
+    for rows in (
+        [['导入测试水光', '皮肤科', '流量品', 680], ['导入测试热玛吉', '无创科', '高价款', 12800]],
+        [['导入测试水光', '皮肤科', '利润品', 880], ['导入测试水光', '皮肤科', '利润品', 980], ['导入测试肉毒', '整形外科', '利润品', 2980]],
+    ):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['品项名称', 'department', 'product_type', 'standard_price'])
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+        summary = _import('products', path)
+        assert summary['failed'] == 0, summary
+
+    assert summary['merged'] == 1, summary
+    session = get_session()
+    try:
+        products = session.execute(
+            select(MedicalProduct.product_name, MedicalProduct.product_type, MedicalProduct.standard_price)
+            .where(MedicalProduct.product_name.like('导入测试%'))
+        ).all()
+    finally:
+        session.close()
+    products = {name: (product_type, price) for name, product_type, price in products}
+    assert products == {
+        '导入测试水光': ('利润品', 980), '导入测试热玛吉': ('高价款', 12800), '导入测试肉毒': ('利润品', 2980),
+    }, products
+    print("✅ 产品Excel导入正常")
+
+def main():
+    """主函数"""
+    return run_tests("文件导入", (test_customer_upsert_dedupe, test_product_import_xlsx))
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
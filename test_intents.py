@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试规则意图：常见问题的正则识别与参数提取，带额外条件的问题不走规则
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from intents import match_intent, chinese_number, intent_text, MAX_TOP_N
+
+def _intent(question):
+    matched = match_intent(question)
+    return (matched[0], matched[2]) if matched else None
+
+def test_chinese_number():
+    """中文数字转换"""
+    print("🔍 测试中文数字转换...")
+    cases = {'五': 5, '十': 10, '十五': 15, '二十': 20, '一百二十': 120, '两千': 2000, '二零二四': 2024}
+    for text, expected in cases.items():
+        assert chinese_number(text) == expected, (text, chinese_number(text))
+    # 只转换紧跟量词的中文数字
+    assert intent_text('前十位顾客') == '前10位顾客'
+    assert '一下' not in intent_text('帮我查一下前十位顾客')
+    print("✅ 中文数字转换正常")
+
+def test_top_customers():
+    """消费最高的前N位顾客"""
+    print("🔍 测试消费排名意图...")
+    for question in ['查询消费金额最高的前10位顾客', '消费最高的前10名客户', '累计消费前10的顾客', '前十位消费最高的顾客',
+                     '顾客消费排名前10', '消费top10顾客？']:
+        assert _intent(question) == ('top_customers', {'n': 10}), question
+    assert _intent('消费最高的前3名客户') == ('top_customers', {'n': 3})
+    assert _intent(f'消费最高的前{MAX_TOP_N + 1}位顾客') is None
+    assert _intent('消费最高的前0位顾客') is None
+    # 带额外条件时交给大模型
+    assert _intent('皮肤科消费最高的前10位顾客') is None
+    assert _intent('2024年消费最高的前10位顾客') is None
+    print("✅ 消费排名意图正常")
+
+def test_consultant_customers():
+    """咨询师顾客数"""
+    print("🔍 测试咨询师顾客数意图...")
+    for question in ['每个咨询师负责多少顾客', '各咨询师分别有几位顾客', '咨询师顾客数排名', '按顾问统计客户数量']:
+        assert _intent(question) == ('consultant_customers', {}), question
+    assert _intent('皮肤科咨询师负责多少顾客') is None
+    print("✅ 咨询师顾客数意图正常")
+
+def test_department_year():
+    """科室年度消费，年份支持数字、中文和今年/去年/前年"""
+    print("🔍 测试科室年度消费意图...")
+    expected = {'start_date': '2024-01-01', 'end_date': '2025-01-01'}
+    for question in ['统计每个科室2024年的总消费金额', '各科室2024年总消费', '2024年每个部门的业绩', '按科室二零二四年营收']:
+        assert _intent(question) == ('department_year', expected), question
+    assert _intent('皮肤科2023年的消费') == ('department_year', {
+        'start_date': '2023-01-01', 'end_date': '2024-01-01', 'department': '皮肤科',
+    })
+    last_year = date.today().year - 1
+    assert _intent('去年每个科室的总营业额') == ('department_year', {
+        'start_date': f'{last_year}-01-01', 'end_date': f'{last_year + 1}-01-01',
+    })
+    assert _intent('每个科室2024年新客的总消费') is None
+    print("✅ 科室年度消费意图正常")
+
+def test_high_balance():
+    """未划扣余额超过X的顾客，金额支持万/千单位"""
+    print("🔍 测试高余额意图...")
+    assert _intent('未划扣余额超过5000元的顾客') == ('high_balance', {'threshold': 5000})
+    assert _intent('余额1万以上的客户有哪些') == ('high_balance', {'threshold': 10000})
+    assert _intent('顾客余额超过2.5千') == ('high_balance', {'threshold': 2500})
+    # 金额条件必须带“超过”或“以上”
+    assert _intent('余额5000的顾客') is None
+    print("✅ 高余额意图正常")
+
+def test_inactive_customers():
+    """N个月未到店的顾客，每月按30天计"""
+    print("🔍 测试不活跃顾客意图...")
+    cutoff = (date.today() - timedelta(days=180)).isoformat()
+    for question in ['超过6个月没有到店的顾客', '6个月以上没来店的客户', '六个月不活跃的顾客', '最近6个月未光顾的顾客']:
+        assert _intent(question) == ('inactive_customers', {'cutoff_date': cutoff}), question
+    assert _intent('0个月没有到店的顾客') is None
+    assert _intent('6个月没有到店的黄金会员顾客') is None
+    print("✅ 不活跃顾客意图正常")
+
+def test_unmatched():
+    """不属于任何规则意图的问题返回 None"""
+    print("🔍 测试未识别的问题...")
+    for question in ['', '黄金会员的平均消费', '查询最近6个月有消费的顾客', '每个产品的划扣金额']:
+        assert match_intent(question) is None, question
+    print("✅ 未识别的问题正常")
+
+def main():
+    """主函数"""
+    print("🧪 开始测试规则意图...")
+    print("=" * 50)
+    ok = True
+    for test in (test_chinese_number, test_top_customers, test_consultant_customers, test_department_year,
+                 test_high_balance, test_inactive_customers, test_unmatched):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print("🎉 规则意图测试通过！" if ok else "❌ 规则意图测试失败")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
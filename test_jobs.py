@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+测试后台任务登记：任务状态流转，已结束任务超过保留时间后连同结果文件一起删除
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from testing import run_tests
+from jobs import JobRegistry
+
+def _wait(job, timeout=5):
+    """等待任务结束"""
+    deadline = time.monotonic() + timeout
+    while job.finished_at is None:
+        assert time.monotonic() < deadline, f"任务未在{timeout}秒内结束: {job.to_dict()}"
+        time.sleep(0.01)
+
+def _write_file(job):
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    job.advance(3)
+    return {'path': path, 'filename': 'report.xlsx', 'media_type': 'application/octet-stream'}
+
+def test_job_status():
+    """任务结果和进度可查询，结果文件路径不对外暴露；任务抛出异常时标记为失败"""
+    print("🔍 测试任务状态...")
+    registry = JobRegistry(max_workers=1, ttl=60)
+    job = registry.submit('export', _write_file)
+    _wait(job)
+    info = registry.get(job.job_id).to_dict()
+    assert info['status'] == 'done' and info['progress'] == 3, info
+    assert info['result'] == {'filename': 'report.xlsx', 'media_type': 'application/octet-stream'}, info
+    os.remove(job.result['path'])
+
+    def broken(job):
+        raise RuntimeError('导出失败')
+    job = registry.submit('export', broken)
+    _wait(job)
+    assert job.status == 'failed' and job.error == '导出失败', job.to_dict()
+    print("✅ 任务状态正常")
+
+def test_job_ttl_purge():
+    """已结束任务在保留时间内可查询，过期后删除任务和结果文件；运行中的任务不删除"""
+    print("🔍 测试过期任务清理...")
+    registry = JobRegistry(max_workers=2, ttl=0.2)
+    finished = registry.submit('export', _write_file)
+    _wait(finished)
+    path = finished.result['path']
+
+    release = threading.Event()
+    running = registry.submit('export', lambda job: release.wait(5))
+    try:
+        registry.purge_expired()
+        assert registry.get(finished.job_id) is finished and os.path.exists(path)
+
+        time.sleep(0.3)
+        # 提交新任务时顺带清理过期任务
+        registry.submit('export', lambda job: None)
+        assert registry.get(finished.job_id) is None, "过期任务未删除"
+        assert not os.path.exists(path), "过期任务的结果文件未删除"
+        assert registry.get(running.job_id) is running and running.status == 'running'
+    finally:
+        release.set()
+    _wait(running)
+    print("✅ 过期任务清理正常")
+
+def main():
+    """主函数"""
+    return run_tests("后台任务", (test_job_status, test_job_ttl_purge))
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
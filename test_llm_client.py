@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+测试大模型客户端：对本地桩服务（llm_stub.py）的重试、熔断（打开 → 半开 → 关闭）、整体截止时间，
+后端网络异常的转换，以及回放/记录后端
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from llm_client import (
+    LLMClient, LLMError, LLMTimeout, CircuitOpenError, CircuitBreaker, HTTPBackend, ReplayBackend, RecordingBackend,
+)
+from llm_stub import make_server, parse_args, DEFAULT_SQL
+
+MESSAGES = [{'role': 'user', 'content': '查询顾客数量'}]
+
+class _Stub:
+    """在后台线程运行的桩服务，统计收到的请求数"""
+
+    def __init__(self, *args):
+        self.server = make_server(parse_args(['--port', '0', '--quiet', *args]))
+        self.requests = 0
+        handle = self.server.RequestHandlerClass.do_POST
+
+        def counting(handler):
+            self.requests += 1
+            handle(handler)
+        self.server.RequestHandlerClass = type('CountingHandler', (self.server.RequestHandlerClass,), {'do_POST': counting})
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _client(url, **kwargs):
+    options = dict(timeout=1, deadline=3, max_retries=0, backoff=0.01, breaker=CircuitBreaker(threshold=2, reset=0.2))
+    options.update(kwargs)
+    return LLMClient(HTTPBackend(url=url, model='stub'), **options)
+
+def test_retries():
+    """服务端错误（503）可重试，重试次数用尽后失败；成功后返回桩服务的响应"""
+    print("🔍 测试重试...")
+    with _Stub('--error-rate', '1') as stub:
+        client = _client(stub.url, max_retries=2, breaker=CircuitBreaker(threshold=10))
+        try:
+            client.complete(MESSAGES)
+            assert False, "应抛出 LLMError"
+        except LLMError as e:
+            assert e.retryable and '503' in str(e), e
+        assert stub.requests == 3, stub.requests
+        assert client.counters['retries'] == 2 and client.counters['failed'] == 1, client.counters
+
+        stub.server.options.error_rate = 0
+        assert client.complete(MESSAGES) == DEFAULT_SQL
+        assert client.counters['succeeded'] == 1 and client.breaker.failures == 0
+    print("✅ 重试正常")
+
+def test_circuit_breaker():
+    """连续失败达到阈值后熔断并直接拒绝；半开时只放行一次试探，试探失败重新熔断，成功则关闭"""
+    print("🔍 测试熔断器...")
+    with _Stub('--error-rate', '1') as stub:
+        client = _client(stub.url)
+        for _ in range(2):
+            try:
+                client.complete(MESSAGES)
+            except LLMError:
+                pass
+        assert client.breaker.state == 'open'
+        try:
+            client.complete(MESSAGES)
+            assert False, "熔断中应直接拒绝"
+        except CircuitOpenError:
+            pass
+        assert stub.requests == 2 and client.counters['rejected'] == 1
+
+        # 半开：试探失败后重新熔断
+        time.sleep(0.25)
+        assert client.breaker.state == 'half_open'
+        try:
+            client.complete(MESSAGES)
+        except LLMError as e:
+            assert not isinstance(e, CircuitOpenError), e
+        assert stub.requests == 3 and client.breaker.state == 'open'
+
+        # 半开：试探成功后关闭
+        time.sleep(0.25)
+        stub.server.options.error_rate = 0
+        assert client.complete(MESSAGES) == DEFAULT_SQL
+        assert client.breaker.state == 'closed' and client.breaker.failures == 0
+    print("✅ 熔断器正常")
+
+def test_deadline():
+    """单次请求超时后重试，但整体耗时不超过截止时间"""
+    print("🔍 测试超时与整体截止时间...")
+    with _Stub('--delay', '0.5') as stub:
+        client = _client(stub.url, timeout=0.2, deadline=0.5, max_retries=5, breaker=CircuitBreaker(threshold=10))
+        started = time.monotonic()
+        try:
+            client.complete(MESSAGES)
+            assert False, "应抛出 LLMTimeout"
+        except LLMTimeout:
+            pass
+        elapsed = time.monotonic() - started
+        assert elapsed < 0.8, elapsed
+        assert client.counters['timeouts'] == 1 and client.counters['in_flight'] == 0, client.counters
+    print("✅ 超时与整体截止时间正常")
+
+class _TruncatedHandler(BaseHTTPRequestHandler):
+    """声明的 Content-Length 大于实际发送的字节数后断开连接"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '1000')
+        self.end_headers()
+        self.wfile.write(b'{"choices": [')
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+def test_transport_errors():
+    """响应不完整、连接失败转换为可重试的 LLMError；后端抛出其他异常时半开试探也会结束"""
+    print("🔍 测试网络异常...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TruncatedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = HTTPBackend(url=f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions')
+        try:
+            backend.complete(MESSAGES, timeout=1)
+            assert False, "应抛出 LLMError"
+        except LLMError as e:
+            assert e.retryable, e
+    finally:
+        server.shutdown()
+        server.server_close()
+    try:
+        HTTPBackend(url=f'http://127.0.0.1:{server.server_address[1]}/v1/chat/completions').complete(MESSAGES, timeout=1)
+        assert False, "应抛出 LLMError"
+    except LLMError as e:
+        assert e.retryable, e
+
+    class BrokenBackend(ReplayBackend):
+        def complete(self, messages, timeout, **options):
+            raise RuntimeError('backend bug')
+
+    breaker = CircuitBreaker(threshold=1, reset=0)
+    breaker.record_failure()
+    client = LLMClient(BrokenBackend(path=os.devnull), timeout=1, deadline=1, max_retries=0, breaker=breaker)
+    for _ in range(2):
+        try:
+            client.complete(MESSAGES)
+            assert False, "应抛出 RuntimeError"
+        except RuntimeError:
+            pass
+    assert client.counters['rejected'] == 0 and client.counters['failed'] == 2, client.counters
+    print("✅ 网络异常正常")
+
+def test_replay_and_recording():
+    """记录后端写入回放文件；回放后端与桩服务按最后一条用户消息返回记录的响应"""
+    print("🔍 测试回放与记录...")
+    path = os.path.join(tempfile.mkdtemp(prefix='llm_test_'), 'replay.jsonl')
+    with _Stub() as stub:
+        recording = RecordingBackend(HTTPBackend(url=stub.url), path)
+        assert recording.complete(MESSAGES, timeout=1) == DEFAULT_SQL
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [{'prompt': '查询顾客数量', 'response': DEFAULT_SQL}]
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'prompt': '查询顾客数量', 'response': 'SELECT 42'}, ensure_ascii=False) + '\n')
+    replay = ReplayBackend(path)
+    messages = [{'role': 'system', 'content': '...'}] + MESSAGES
+    assert replay.complete(messages, timeout=1) == 'SELECT 42'
+    try:
+        replay.complete([{'role': 'user', 'content': '未记录的问题'}], timeout=1)
+        assert False, "未记录的提示词应抛出 LLMError"
+    except LLMError as e:
+        assert not e.retryable
+
+    with _Stub('--replay', path) as stub:
+        client = _client(stub.url)
+        assert client.complete(MESSAGES) == 'SELECT 42'
+        assert client.complete([{'role': 'user', 'content': '未记录的问题'}]) == DEFAULT_SQL
+    print("✅ 回放与记录正常")
+
+def main():
+    """主函数"""
+    print("🧪 开始测试大模型客户端...")
+    print("=" * 50)
+    ok = True
+    for test in (test_retries, test_circuit_breaker, test_deadline, test_transport_errors, test_replay_and_recording):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print("🎉 大模型客户端测试通过！" if ok else "❌ 大模型客户端测试失败")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+测试键集分页：游标编码/解码、排序键相同时按主键续页
+"""
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from models import Base, Customer
+from pagination import KeysetPaginator, CursorError, encode_cursor, decode_cursor
+
+# 6位顾客只有3个不同的注册日期，同一日期内的顺序由主键决定
+REGISTER_DATES = [date(2024, 1, 2), date(2024, 1, 1), date(2024, 1, 2), date(2024, 1, 1), date(2024, 1, 3), date(2024, 1, 2)]
+
+def _session():
+    """内存SQLite中的顾客表"""
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine, tables=[Customer.__table__])
+    session = Session(engine)
+    session.add_all([
+        Customer(customer_id=i, name=f'顾客{i}', phone=f'1390000000{i}', register_date=register_date, consultant_id=1)
+        for i, register_date in enumerate(REGISTER_DATES, start=1)
+    ])
+    session.commit()
+    return session
+
+def _walk(session, paginator, limit, sort=None, order=None):
+    """逐页读取全部数据，返回 (顾客ID列表, 页数)"""
+    ids, pages, cursor = [], 0, None
+    while True:
+        stmt, page = paginator.paginate(select(Customer.customer_id, Customer.register_date), limit, cursor=cursor,
+                                        sort=None if cursor else sort, order=None if cursor else order)
+        rows, cursor = page(session.execute(stmt))
+        ids.extend(row.customer_id for row in rows)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+def test_cursor_round_trip():
+    """游标编码后可还原排序键、方向和键值（日期按ISO格式）"""
+    print("🔍 测试游标编码/解码...")
+    cursor = encode_cursor('register_date', 'desc', [date(2024, 1, 2), 7])
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == ('register_date', 'desc', ['2024-01-02', 7])
+
+    for bad in ['not-a-cursor', encode_cursor('register_date', 'asc', [1])[:-3], '']:
+        try:
+            decode_cursor(bad)
+        except CursorError:
+            continue
+        raise AssertionError(f"无效游标未报错: {bad!r}")
+    print("✅ 游标编码/解码正常")
+
+def test_cursor_validation():
+    """游标与排序参数不一致、键值个数不对时报错"""
+    print("🔍 测试游标校验...")
+    paginator = KeysetPaginator(Customer.customer_id, register_date=Customer.register_date)
+    cursor = encode_cursor('register_date', 'asc', ['2024-01-01', 2])
+    cases = [
+        {'cursor': cursor, 'order': 'desc'},
+        {'cursor': cursor, 'sort': 'customer_id'},
+        {'cursor': encode_cursor('register_date', 'asc', ['2024-01-01'])},
+        {'cursor': encode_cursor('name', 'asc', ['a', 1])},
+        {'sort': 'name'},
+        {'order': 'up'},
+    ]
+    for kwargs in cases:
+        try:
+            paginator.paginate(select(Customer), 10, **kwargs)
+        except CursorError:
+            continue
+        raise AssertionError(f"无效参数未报错: {kwargs}")
+    try:
+        paginator.paginate(select(Customer), 0)
+    except CursorError:
+        pass
+    else:
+        raise AssertionError("limit=0 未报错")
+    print("✅ 游标校验正常")
+
+def test_tie_breaker():
+    """排序键相同的行按主键续页，不重复也不遗漏"""
+    print("🔍 测试排序键相同时的续页...")
+    session = _session()
+    paginator = KeysetPaginator(Customer.customer_id, register_date=Customer.register_date)
+    try:
+        expected_asc = [i for _, i in sorted((d, i) for i, d in enumerate(REGISTER_DATES, start=1))]
+        for limit in (1, 2, 4, 10):
+            ids, pages = _walk(session, paginator, limit, sort='register_date')
+            assert ids == expected_asc, (limit, ids)
+            assert pages == max(1, -(-len(REGISTER_DATES) // limit)), (limit, pages)
+            ids, _ = _walk(session, paginator, limit, sort='register_date', order='desc')
+            assert ids == expected_asc[::-1], (limit, ids)
+        ids, _ = _walk(session, paginator, 4)
+        assert ids == list(range(1, len(REGISTER_DATES) + 1))
+    finally:
+        session.close()
+    print("✅ 排序键相同时按主键续页正常")
+
+def main():
+    """主函数"""
+    print("🧪 开始测试键集分页...")
+    print("=" * 50)
+    ok = True
+    for test in (test_cursor_round_trip, test_cursor_validation, test_tie_breaker):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print("🎉 键集分页测试通过！" if ok else "❌ 键集分页测试失败")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
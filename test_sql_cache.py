@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试Text2SQL缓存：缓存键（规范化问题 + 表结构哈希）、持久化命中、过期与清除
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import declarative_base
+
+from sql_cache import SQLCache, normalize_question
+from schema_prompt import SchemaPrompt
+
+SQL = "SELECT COUNT(*) AS customer_count FROM customers"
+
+def _cache(**kwargs):
+    return SQLCache(path=os.path.join(tempfile.mkdtemp(prefix='text2sql_test_'), 'cache.db'), **kwargs)
+
+def _schema_hash(*extra_columns):
+    """由一张测试表生成的表结构哈希"""
+    Base = declarative_base()
+    attributes = {'__tablename__': 'customers', 'customer_id': Column(Integer, primary_key=True),
+                  'name': Column(String(100), comment='顾客姓名')}
+    attributes.update({name: Column(String(20)) for name in extra_columns})
+    type('Customer', (Base,), attributes)
+    return SchemaPrompt(Base).hash
+
+def test_cache_key():
+    """空白、全角、大小写和句末标点不同的问题命中同一条缓存；表结构哈希不同时不命中"""
+    print("🔍 测试缓存键...")
+    assert normalize_question(' 查询 顾客数量？') == normalize_question('查询顾客数量') == '查询顾客数量'
+    assert normalize_question('ＴＯＰ１０顾客!') == 'top10顾客'
+
+    cache = _cache()
+    cache.set('查询 顾客数量？', 'hash-a', SQL)
+    assert cache.get('查询顾客数量', 'hash-a') == SQL
+    assert cache.get('查询顾客数量。', 'hash-a') == SQL
+    assert cache.get('查询顾客数', 'hash-a') is None
+    assert cache.get('查询顾客数量', 'hash-b') is None
+    print("✅ 缓存键正常")
+
+def test_schema_change_invalidates():
+    """表结构不变时哈希稳定，增加字段后哈希变化，旧条目不再命中"""
+    print("🔍 测试表结构变化后缓存失效...")
+    old_hash = _schema_hash()
+    assert old_hash == _schema_hash()
+    new_hash = _schema_hash('phone')
+    assert new_hash != old_hash
+
+    cache = _cache()
+    cache.set('查询顾客数量', old_hash, SQL)
+    assert cache.get('查询顾客数量', new_hash) is None
+    assert cache.get('查询顾客数量', old_hash) == SQL
+    print("✅ 表结构变化后缓存失效正常")
+
+def test_persistent_hit_and_purge():
+    """重启后（新的缓存实例）从持久化表命中；清除后不再命中并递增版本号"""
+    print("🔍 测试持久化命中与清除...")
+    cache = _cache()
+    cache.set('查询顾客数量', 'hash-a', SQL)
+    restarted = SQLCache(path=cache.path)
+    assert restarted.get('查询顾客数量', 'hash-a') == SQL
+    assert restarted.persistent_hits == 1
+    assert restarted.get('查询顾客数量', 'hash-a') == SQL
+    assert restarted.persistent_hits == 1, "第二次应由进程内缓存命中"
+
+    version = restarted.version
+    assert restarted.purge() == 1
+    assert restarted.version == version + 1
+    assert restarted.get('查询顾客数量', 'hash-a') is None
+    assert restarted.stats()['persistent']['entries'] == 0
+    print("✅ 持久化命中与清除正常")
+
+def test_expiry():
+    """过期条目不再命中，expired_only 只清除过期条目"""
+    print("🔍 测试缓存过期...")
+    cache = _cache(ttl=0.3)
+    cache.set('查询顾客数量', 'hash-a', SQL)
+    time.sleep(0.4)
+    cache.set('查询咨询师数量', 'hash-a', "SELECT COUNT(*) FROM consultants")
+    assert cache.get('查询顾客数量', 'hash-a') is None
+    assert cache.stats()['persistent']['expired'] == 1
+    assert cache.purge(expired_only=True) == 1
+    assert [question for question, _, _ in cache.entries('hash-a')] == ['查询咨询师数量']
+    print("✅ 缓存过期正常")
+
+def main():
+    """主函数"""
+    print("🧪 开始测试Text2SQL缓存...")
+    print("=" * 50)
+    ok = True
+    for test in (test_cache_key, test_schema_change_invalidates, test_persistent_hit_and_purge, test_expiry):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print("🎉 Text2SQL缓存测试通过！" if ok else "❌ Text2SQL缓存测试失败")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试相似问题复用：骨架比较、字面值替换（只替换 LIMIT 或比较运算中的数字）、相似度检索
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from sql_similarity import SimilarityIndex, Vocabulary, adapt_sql, canonical_question, skeleton
+
+VOCABULARY = Vocabulary({
+    'customers.membership_level': ['普通', '白银', '黄金', '钻石'],
+    'consumption_records.department': ['皮肤科', '无创科', '整形外科'],
+})
+
+TOP_SQL = "SELECT customer_id, SUM(amount) AS total FROM consumption_records GROUP BY customer_id ORDER BY total DESC LIMIT 10"
+LEVEL_SQL = "SELECT AVG(amount) AS avg_amount FROM consumption_records cr JOIN customers c ON c.customer_id = cr.customer_id WHERE c.membership_level = '黄金'"
+COUNT_SQL = "SELECT customer_id FROM consumption_records GROUP BY customer_id HAVING COUNT(*) > 5"
+
+def _skeleton(question):
+    return skeleton(VOCABULARY.extract(canonical_question(question))[1])
+
+def test_skeleton():
+    """骨架为有序文本：字符相同但顺序或个数不同的问题不视为同一问题"""
+    print("🔍 测试问题骨架...")
+    assert _skeleton('顾客数量最多的科室') != _skeleton('科室数量最多的顾客')
+    assert _skeleton('消费次数大于5的顾客') != _skeleton('消费次数大于5的顾客数')
+    assert _skeleton('有消费的顾客') != _skeleton('没有消费的顾客')
+    # 同义词、虚词和字面值不影响骨架
+    assert _skeleton('查询消费最高的前10位客户') == _skeleton('消费最高前20名顾客')
+    assert _skeleton('黄金会员的平均消费') == _skeleton('统计钻石会员平均消费')
+    print("✅ 问题骨架正常")
+
+def test_adapt_sql():
+    """LIMIT、比较运算中的数字和枚举值按问题替换；无法确定替换位置时不复用"""
+    print("🔍 测试SQL改写...")
+    assert adapt_sql('消费最高的前10位顾客', TOP_SQL, '消费最高的前20位顾客', VOCABULARY) == TOP_SQL.replace('LIMIT 10', 'LIMIT 20')
+    assert adapt_sql('黄金会员的平均消费', LEVEL_SQL, '钻石会员的平均消费', VOCABULARY) == LEVEL_SQL.replace('黄金', '钻石')
+    assert adapt_sql('消费次数超过5的顾客', COUNT_SQL, '消费次数超过8的顾客', VOCABULARY) == COUNT_SQL.replace('> 5', '> 8')
+    # 相同问题原样复用
+    assert adapt_sql('消费最高的前10位顾客', TOP_SQL, '消费最高的前10名客户', VOCABULARY) == TOP_SQL
+
+    # 旧数字在SQL中出现多次
+    sql = "SELECT customer_id FROM consumption_records GROUP BY customer_id HAVING COUNT(*) > 5 LIMIT 5"
+    assert adapt_sql('消费次数超过5的顾客', sql, '消费次数超过8的顾客', VOCABULARY) is None
+    # 数字不在 LIMIT 或比较运算中（日期字面值）
+    sql = "SELECT SUM(amount) FROM consumption_records WHERE consume_date BETWEEN '2024-01-01' AND '2024-12-31'"
+    assert adapt_sql('2024年的总消费', sql, '2023年的总消费', VOCABULARY) is None
+    # 骨架不同、字面值个数或类别对不上
+    assert adapt_sql('消费最高的前10位顾客', TOP_SQL, '消费最低的前10位顾客', VOCABULARY) is None
+    assert adapt_sql('黄金会员的平均消费', LEVEL_SQL, '黄金会员皮肤科的平均消费', VOCABULARY) is None
+    assert adapt_sql('黄金会员的平均消费', LEVEL_SQL, '皮肤科会员的平均消费', VOCABULARY) is None
+    # 问题中的字面值在SQL中找不到
+    assert adapt_sql('黄金会员的平均消费', "SELECT 1", '钻石会员的平均消费', VOCABULARY) is None
+    print("✅ SQL改写正常")
+
+def test_similarity_index():
+    """检索按相似度排序，低于阈值或无法改写的候选不复用"""
+    print("🔍 测试相似问题检索...")
+    index = SimilarityIndex()
+    index.add('消费最高的前10位顾客', TOP_SQL)
+    index.add('黄金会员的平均消费', LEVEL_SQL)
+    index.add('消费次数超过5的顾客', COUNT_SQL)
+    assert len(index) == 3
+
+    results = index.search('钻石会员的平均消费')
+    assert results[0][1] == '黄金会员的平均消费'
+    assert all(a[0] >= b[0] for a, b in zip(results, results[1:]))
+
+    sql, score, matched = index.find('消费最高的前5位顾客', VOCABULARY, threshold=0.3)
+    assert matched == '消费最高的前10位顾客' and sql.endswith('LIMIT 5') and 0.3 <= score <= 1
+    assert index.find('消费最高的前5位顾客', VOCABULARY, threshold=1.01) is None
+    assert index.find('科室消费最高的顾客', VOCABULARY, threshold=0.1) is None
+
+    # 同一问题再次加入时替换原条目
+    index.add('消费最高的前10名客户', TOP_SQL.replace('SUM(amount)', 'SUM(amount) * 1'))
+    assert len(index) == 3
+    index.clear()
+    assert index.search('消费最高的前10位顾客') == []
+    print("✅ 相似问题检索正常")
+
+def main():
+    """主函数"""
+    print("🧪 开始测试相似问题复用...")
+    print("=" * 50)
+    ok = True
+    for test in (test_skeleton, test_adapt_sql, test_similarity_index):
+        try:
+            test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print("🎉 相似问题复用测试通过！" if ok else "❌ 相似问题复用测试失败")
+    return ok
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
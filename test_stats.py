@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+测试仪表板统计接口：ETag 条件请求返回304，写入后统计和ETag随之变化
+使用临时SQLite数据库，不改动项目自带的 medical_cosmetics.db
+"""
+
+import sys
+
+from fastapi.testclient import TestClient
+from testing import run_tests
+from main import app
+
+def test_stats_etag(temp_db):
+    """If-None-Match 与当前ETag一致时返回304且无响应体，不一致时返回200"""
+    print("🔍 测试统计接口的ETag...")
+    with TestClient(app) as client:
+        response = client.get('/api/stats')
+        assert response.status_code == 200, response.text
+        etag = response.headers['etag']
+        assert etag.startswith('W/"') and response.headers['cache-control'] == 'no-cache'
+
+        response = client.get('/api/stats', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and response.content == b'', response.text
+        assert response.headers['etag'] == etag
+
+        # 多个ETag中任一匹配即可
+        response = client.get('/api/stats', headers={'If-None-Match': f'W/"other", {etag}'})
+        assert response.status_code == 304
+
+        response = client.get('/api/stats', headers={'If-None-Match': 'W/"other"'})
+        assert response.status_code == 200 and response.headers['etag'] == etag
+    print("✅ 统计接口ETag正常")
+
+def test_stats_after_writes(temp_db):
+    """新增咨询师、顾客和消费记录后，旧ETag不再返回304，计数和累计消费随之更新"""
+    print("🔍 测试写入后统计更新...")
+    with TestClient(app) as client:
+        before = client.get('/api/stats')
+        etag, stats = before.headers['etag'], before.json()
+
+        consultant = client.post('/api/consultants', json={'name': '统计测试咨询师', 'department': '皮肤科'}).json()
+        response = client.get('/api/stats', headers={'If-None-Match': etag})
+        assert response.status_code == 200, "写入后旧ETag仍返回304"
+        assert response.headers['etag'] != etag
+        assert response.json()['consultant_count'] == stats['consultant_count'] + 1
+        etag = response.headers['etag']
+
+        product = client.post('/api/products', json={
+            'product_name': '统计测试品项', 'department': '皮肤科', 'product_type': '流量品', 'standard_price': 100,
+        }).json()
+        customer = client.post('/api/customers', json={
+            'name': '统计测试', 'phone': '19933330001', 'register_date': '2024-01-01',
+            'consultant_id': consultant['consultant_id'],
+        }).json()
+        client.post('/api/consumption-records', json={
+            'customer_id': customer['customer_id'], 'consume_date': '2024-05-01', 'amount': 1000, 'department': '皮肤科',
+            'is_new_customer': True, 'consultant_id': consultant['consultant_id'], 'product_id': product['product_id'],
+        }).raise_for_status()
+
+        response = client.get('/api/stats', headers={'If-None-Match': etag})
+        assert response.status_code == 200 and response.headers['etag'] != etag
+        after = response.json()
+        assert after['customer_count'] == stats['customer_count'] + 1, after
+        assert after['product_count'] == stats['product_count'] + 1, after
+        assert after['consumption_record_count'] == stats['consumption_record_count'] + 1, after
+        assert after['total_consumption'] == stats['total_consumption'] + 1000, after
+
+        # 数据不再变化时新ETag保持有效
+        response = client.get('/api/stats', headers={'If-None-Match': response.headers['etag']})
+        assert response.status_code == 304
+    print("✅ 写入后统计更新正常")
+
+def main():
+    """主函数"""
+    return run_tests("仪表板统计", (test_stats_etag, test_stats_after_writes))
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,58 @@
+"""
+测试公用工具：临时SQLite数据库，以及直接运行测试文件时的入口
+"""
+
+import inspect
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+# 指向其他数据库（MySQL、读副本）的配置，测试期间移除
+DATABASE_ENV = ('DB_HOST', 'DB_READ_URL', 'DB_READ_REPLICAS', 'SQLITE_READ_REPLICA_PATH')
+
+@contextmanager
+def temporary_database():
+    """切换到临时目录中的新SQLite数据库，退出时恢复原配置并释放连接；返回临时目录
+    不改动项目自带的 medical_cosmetics.db"""
+    import database
+    from models import Base
+    from cache import invalidate_tables
+    from analytics_engine import mark_stale
+
+    directory = tempfile.mkdtemp(prefix='medical_test_')
+    saved_env = {name: os.environ.pop(name) for name in DATABASE_ENV if name in os.environ}
+    saved_path = database.SQLITE_DB_PATH
+    database.dispose_engine()
+    database.SQLITE_DB_PATH = os.path.join(directory, 'medical_cosmetics.db')
+    try:
+        yield directory
+    finally:
+        database.dispose_engine()
+        database.SQLITE_DB_PATH = saved_path
+        os.environ.update(saved_env)
+        # 缓存的分析结果来自临时数据库
+        invalidate_tables(*Base.metadata.tables)
+        mark_stale(*Base.metadata.tables)
+
+def run_tests(title, tests):
+    """依次运行测试函数并打印结果；参数含 temp_db 的测试在临时数据库中运行"""
+    print(f"🧪 开始测试{title}...")
+    print("=" * 50)
+    ok = True
+    for test in tests:
+        try:
+            if 'temp_db' in inspect.signature(test).parameters:
+                with temporary_database() as directory:
+                    test(directory)
+            else:
+                test()
+        except AssertionError as e:
+            print(f"❌ {test.__doc__}失败: {e}")
+            ok = False
+        print()
+    print("=" * 50)
+    print(f"🎉 {title}测试通过！" if ok else f"❌ {title}测试失败")
+    return ok